@@ -0,0 +1,632 @@
+"""
+Module for collecting jobs and job runs from the Jenkins API with asyncio.
+
+This is the async counterpart of the public API of `jenkins.py`, meant to be embedded in an async service. Every
+request is a coroutine on a single shared httpx connection pool instead of a thread, so thousands of requests can be
+in flight at once, e.g. to fan out across every job of several projects with `collect_projects`. Requests go through
+the same adaptive concurrency limiting (`http_client.AdaptiveConcurrencyLimiter`) as the sync collector, and responses
+for completed job runs are shared with it through the Jenkins API response cache (`jenkins.cache`).
+
+Parsing and model building are shared with `jenkins.py`, so both produce exactly the same job runs. Database calls
+are blocking (pymongo) and are run in worker threads with `asyncio.to_thread`.
+
+Requires the optional `httpx` dependency (`pip install cpc-jank-db[async]`).
+
+Example:
+    import asyncio
+    from cpc_jank_db.async_jenkins import AsyncJenkinsClient
+
+    async def main():
+        async with AsyncJenkinsClient(max_concurrency=1000) as client:
+            report = await client.collect_projects([oracle_project_config, CloudInitPipelineConfig.generate_all_configs()])
+            print(report.summary())
+
+    asyncio.run(main())
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from cpc_jank_db import db, extractors, http_client, jenkins, json_stream
+from cpc_jank_db.models import FAILED_TEST_CASE_STATUSES, Job, JobRun, MatrixJobRun, TestJobRun, TestMatrixJobRun
+from cpc_jank_db.sync import SyncConfig, SyncReport, get_jobs_to_sync, skip_jobs_not_needing_sync
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+DEFAULT_MAX_CONCURRENCY = 512
+DEFAULT_MAX_CONNECTIONS = 64
+# number of job runs of a single job collected at the same time, which bounds how many console outputs are in memory
+DEFAULT_MAX_JOB_RUNS_IN_FLIGHT = 32
+# number of jobs collected at the same time by `collect_projects`, which bounds how many jobs hold job run data (and
+# are in the middle of a sync) at once
+DEFAULT_MAX_JOBS_IN_FLIGHT = 16
+
+_RETRY = object()
+
+
+class AsyncJenkinsClient:
+    """
+    Async client for the Jenkins API with the same collection API as `jenkins.py`.
+
+    Requests are retried with exponential backoff like `http_client.JenkinsSession`, and the number of requests in
+    flight is adapted by an AIMD limiter capped at `max_concurrency`. Connections are kept alive in a pool of
+    `max_connections` connections that every request shares.
+    """
+
+    def __init__(
+        self,
+        auth: Optional[Tuple[str, str]] = jenkins.auth,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        timeout: Tuple[float, float] = http_client.DEFAULT_TIMEOUT,
+        max_retries: int = http_client.DEFAULT_MAX_RETRIES,
+        backoff_factor: float = http_client.DEFAULT_BACKOFF_FACTOR,
+        max_backoff: float = http_client.DEFAULT_MAX_BACKOFF,
+        limiter: Optional[http_client.AdaptiveConcurrencyLimiter] = None,
+    ):
+        """
+        Args:
+            auth (Optional[Tuple[str, str]]): The (username, password) basic auth to send with every request.
+                Defaults to the credentials from the .env file.
+            max_concurrency (int): The maximum number of requests in flight at once. The limiter starts at this limit
+                and lowers it while Jenkins responds slowly or asks us to back off.
+            max_connections (int): The maximum number of connections kept open to Jenkins. Requests above this wait
+                for a free connection.
+            timeout (Tuple[float, float]): The (connect, read) timeouts in seconds for every request.
+            max_retries (int): The number of times a request is retried after a retryable failure.
+            backoff_factor (float): The base delay in seconds between retries. Doubles after every attempt.
+            max_backoff (float): The maximum delay in seconds between retries.
+            limiter (Optional[http_client.AdaptiveConcurrencyLimiter]): The limiter every request goes through.
+                Must not be shared with a `JenkinsSession`, whose threads do not wake up requests waiting on the
+                event loop. Defaults to a limiter capped at `max_concurrency` requests in flight.
+        """
+        if httpx is None:
+            raise ImportError("AsyncJenkinsClient requires httpx, install it with: pip install cpc-jank-db[async]")
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.limiter = limiter or http_client.AdaptiveConcurrencyLimiter(
+            initial_limit=max_concurrency, max_limit=max_concurrency
+        )
+        self._limiter_condition = asyncio.Condition()
+        self._client = httpx.AsyncClient(
+            auth=auth,
+            # requests wait for a free connection for as long as it takes instead of timing out
+            timeout=httpx.Timeout(timeout[1], connect=timeout[0], pool=None),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            follow_redirects=True,
+        )
+        self._stats: Dict[str, http_client.EndpointStats] = {}
+
+    async def __aenter__(self) -> "AsyncJenkinsClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self._client.aclose()
+
+    def get_stats(self) -> Dict[str, http_client.EndpointStats]:
+        """Returns a snapshot of the latency stats recorded for each endpoint."""
+        return {endpoint: stats.model_copy() for endpoint, stats in self._stats.items()}
+
+    def get_concurrency_stats(self) -> http_client.ConcurrencyStats:
+        """Returns the current concurrency limit and throttle events of the limiter every request goes through."""
+        return self.limiter.get_stats()
+
+    @asynccontextmanager
+    async def _limiter_slot(self, host: str) -> AsyncIterator[Dict[str, bool]]:
+        """Async version of `AdaptiveConcurrencyLimiter.slot` that waits for a slot without blocking the event loop."""
+        async with self._limiter_condition:
+            await self._limiter_condition.wait_for(lambda: self.limiter.try_acquire(host))
+        outcome = {"throttled": False, "failed": False}
+        start = time.monotonic()
+        try:
+            yield outcome
+        finally:
+            self.limiter.release(
+                host, time.monotonic() - start, throttled=outcome["throttled"], failed=outcome["failed"]
+            )
+            async with self._limiter_condition:
+                self._limiter_condition.notify_all()
+
+    def _record(self, endpoint: str, seconds: float, error: bool = False, retry: bool = False):
+        stats = self._stats.setdefault(endpoint, http_client.EndpointStats())
+        stats.request_count += 1
+        stats.total_seconds += seconds
+        stats.max_seconds = max(stats.max_seconds, seconds)
+        if error:
+            stats.error_count += 1
+        if retry:
+            stats.retry_count += 1
+
+    def _get_backoff_seconds(self, attempt: int, response: Optional["httpx.Response"] = None) -> float:
+        # honor the Retry-After header if jenkins tells us how long to wait
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return min(float(response.headers["Retry-After"]), self.max_backoff)
+        return min(self.backoff_factor * (2**attempt), self.max_backoff)
+
+    async def _get(
+        self,
+        url: str,
+        attempted_action: str,
+        read_response: Callable[["httpx.Response"], Awaitable],
+    ):
+        """
+        Make a GET request, retrying on 5xx/429 responses and connection errors with exponential backoff, and pass
+        the successful response to `read_response` while it is still open.
+
+        Raises:
+            jenkins.JenkinsAPIError: If the request did not succeed after all retries.
+        """
+        response = None
+        host = urlsplit(url).netloc
+        for attempt in range(self.max_retries + 1):
+            will_retry = attempt < self.max_retries
+            try:
+                response, result = await self._send(url, host, attempted_action, will_retry, read_response)
+                if result is not _RETRY:
+                    return result
+            except httpx.TransportError as e:
+                if not will_retry:
+                    raise jenkins.JenkinsAPIError(
+                        url=url, response=response, attempted_action=attempted_action, root_cause=e
+                    )
+                response = None
+            except jenkins.JenkinsAPIError:
+                raise
+            except Exception as e:
+                raise jenkins.JenkinsAPIError(url=url, response=response, attempted_action=attempted_action, root_cause=e)
+            await asyncio.sleep(self._get_backoff_seconds(attempt, response))
+
+    async def _send(
+        self,
+        url: str,
+        host: str,
+        attempted_action: str,
+        will_retry: bool,
+        read_response: Callable[["httpx.Response"], Awaitable],
+    ) -> Tuple["httpx.Response", Any]:
+        """
+        Make a single attempt at a request while holding a slot of the concurrency limiter until the response headers
+        arrive, like `http_client.JenkinsSession._send`. The body is streamed into `read_response` after the slot was
+        released, so large bodies neither hold a slot nor count towards the latency the limiter adapts to.
+
+        Returns:
+            Tuple[httpx.Response, Any]: The response, and what `read_response` read from it or `_RETRY` if the request
+                should be retried.
+        """
+        async with self._limiter_slot(host) as outcome:
+            # time spent waiting for a slot is not part of the latency of the endpoint
+            start = time.monotonic()
+            try:
+                response = await self._client.send(self._client.build_request("GET", url), stream=True)
+            except httpx.TransportError:
+                outcome["failed"] = True
+                self._record(attempted_action, time.monotonic() - start, error=True, retry=will_retry)
+                raise
+            outcome["throttled"] = response.status_code in http_client.THROTTLE_STATUS_CODES
+            retry = response.status_code in http_client.RETRY_STATUS_CODES and will_retry
+            self._record(attempted_action, time.monotonic() - start, error=response.status_code >= 400, retry=retry)
+        try:
+            return response, await self._read_response(url, response, attempted_action, retry, read_response)
+        finally:
+            await response.aclose()
+
+    @staticmethod
+    async def _read_response(
+        url: str,
+        response: "httpx.Response",
+        attempted_action: str,
+        retry: bool,
+        read_response: Callable[["httpx.Response"], Awaitable],
+    ) -> Any:
+        if response.status_code == 200:
+            return await read_response(response)
+        if not retry:
+            raise jenkins.JenkinsAPIError(url=url, response=response, attempted_action=attempted_action)
+        return _RETRY
+
+    async def _fetch_json(self, url: str, attempted_action: str = "fetch data") -> dict:
+        async def read_json(response: "httpx.Response") -> dict:
+            await response.aread()
+            return response.json()
+
+        return await self._get(jenkins._convert_to_api_url(url), attempted_action, read_json)
+
+    async def _fetch_console_output_window(
+        self,
+        url: str,
+        max_chars: int = jenkins.CONSOLE_OUTPUT_MAX_CHARS,
+        line_handlers: Optional[List[Callable]] = None,
+    ) -> str:
+        """Async version of `jenkins._fetch_console_output_window`."""
+
+        async def read_window(response: "httpx.Response") -> str:
+            # a retried request starts from a fresh window so nothing is fed twice
+            window = jenkins.ConsoleOutputWindow(max_chars=max_chars, line_handlers=line_handlers)
+            async for chunk in response.aiter_text(jenkins.CONSOLE_OUTPUT_CHUNK_SIZE):
+                window.feed(chunk)
+            return window.finish()
+
+        return await self._get(jenkins._get_console_text_url(url), "fetch console output", read_window)
+
+    async def _get_job_run_from_api(self, url: str) -> dict:
+        """Async version of `jenkins._get_job_run_from_api`, sharing its cache entries."""
+        api_url = jenkins._append_tree_query_param(jenkins._convert_to_api_url(url), jenkins.JOB_RUN_FIELDS)
+        return await jenkins.cache.get_or_fetch_async(
+            jenkins._get_job_run_from_api,
+            (url,),
+            lambda: self._fetch_json(api_url, attempted_action="fetch job run data"),
+        )
+
+    async def _probe_job_from_api(self, url: str) -> dict:
+        url = jenkins._append_tree_query_param(jenkins._convert_to_api_url(url), jenkins.JOB_PROBE_FIELDS)
+        return await self._fetch_json(url, attempted_action="probe job")
+
+    async def _fetch_test_job_results(self, job_name: str, build_number: int, matrix: bool = False) -> dict:
+        retention = jenkins.TEST_REPORT_RETENTION
+        url = jenkins._get_test_report_url(job_name, build_number, retention, matrix)
+
+        async def read_test_report(response: "httpx.Response") -> dict:
+            # the test report is built as it streams in, see `jenkins._fetch_test_job_results`
+            builder = json_stream.StreamingJSONBuilder(jenkins._get_test_report_converters(retention, matrix=matrix))
+            async for chunk in response.aiter_bytes(jenkins.JSON_STREAM_CHUNK_SIZE):
+                builder.feed(chunk)
+            return builder.finish()
+
+        return await self._get(url, "fetch test job results", read_test_report)
+
+    async def _fetch_job_run_jsons_in_bulk(
+        self, job_name: str, build_numbers: List[int], page_size: int = jenkins.BULK_JOB_RUNS_PAGE_SIZE
+    ) -> Dict[int, dict]:
+        """Async version of `jenkins._fetch_job_run_jsons_in_bulk`."""
+        remaining = set(build_numbers)
+        results = {}
+        if not remaining:
+            return results
+        oldest_build_number = min(remaining)
+        url = jenkins._convert_to_api_url(jenkins._make_url_from_job_name(job_name))
+        start = 0
+        while True:
+            page_url = jenkins._append_tree_query_param(
+                url, ["allBuilds[" + ",".join(jenkins.JOB_RUN_FIELDS) + "]{" + f"{start},{start + page_size}" + "}"]
+            )
+            page = (await self._fetch_json(page_url, "fetch job run data in bulk")).get("allBuilds") or []
+            for data in page:
+                if data["number"] in remaining and data.get("result") is not None:
+                    results[data["number"]] = data
+                    remaining.discard(data["number"])
+                # builds are ordered newest first so there is nothing left to find past the oldest build
+                if not remaining or data["number"] <= oldest_build_number:
+                    return results
+            if len(page) < page_size:
+                return results
+            start += page_size
+
+    async def _fetch_matrix_child_run(self, child_run_url: str) -> dict:
+        job_run_dict = jenkins._parse_job_run_info(await self._get_job_run_from_api(child_run_url))
+        extraction = extractors.ConsoleFieldExtraction()
+        job_run_dict["consoleOutput"] = await self._fetch_console_output_window(
+            job_run_dict["url"], line_handlers=[extraction.handle_line]
+        )
+        job_run_dict["extractedFields"] = extraction.fields
+        return job_run_dict
+
+    async def _fetch_matrix_child_runs(self, matrix_job_run_url: str, child_run_urls: List[str]) -> List[dict]:
+        try:
+            return await asyncio.gather(*(self._fetch_matrix_child_run(url) for url in child_run_urls))
+        except Exception as e:
+            raise Exception(f"Failed to fetch matrix child runs from {matrix_job_run_url}") from e
+
+    async def _fetch_job_run_data(
+        self,
+        job_name: str,
+        build_number: int,
+        job_run_type: Optional[type[JobRun]] = None,
+        job_run_api_json: Optional[dict] = None,
+    ) -> dict:
+        """Async version of `jenkins._fetch_job_run_data`."""
+        if job_run_api_json is None:
+            url = f"{jenkins.JENKINS_API_URL}/job/{job_name}/{build_number}"
+            job_run_api_json = await self._get_job_run_from_api(url)
+        data = {
+            "jobName": job_name,
+            "buildNumber": build_number,
+            "jobRunType": job_run_type,
+            "jobRunApiJson": job_run_api_json,
+        }
+        extraction = extractors.ConsoleFieldExtraction()
+        data["extractedFields"] = extraction.fields
+        fetches = {
+            "consoleOutput": self._fetch_console_output_window(
+                job_run_api_json["url"], line_handlers=[extraction.handle_line]
+            )
+        }
+        if job_run_api_json.get("runs"):
+            if jenkins._has_matrix_test_results(job_run_api_json):
+                fetches["testResultsJson"] = self._fetch_test_job_results(job_name, build_number, matrix=True)
+            fetches["matrixRuns"] = self._fetch_matrix_child_runs(
+                job_run_api_json["url"], jenkins._get_matrix_child_run_urls(job_run_api_json)
+            )
+        elif job_run_type == TestJobRun:
+            fetches["testResultsJson"] = self._fetch_test_job_results(job_name, build_number)
+        results = await asyncio.gather(*fetches.values(), return_exceptions=True)
+        for key, result in zip(fetches, results):
+            data[key] = result
+            if isinstance(result, Exception):
+                # a test job run without test results is still saved, like in `jenkins._fetch_job_run_data`
+                if key != "testResultsJson" or job_run_type != TestJobRun or "matrixRuns" in fetches:
+                    raise result
+                print(f"Failed to fetch test job results for {job_name} (#{build_number})")
+                data[key] = None
+        return data
+
+    async def _fetch_error_texts(self, test_report_url: str) -> Tuple[str, str]:
+        """Async version of `jenkins._get_error_texts`, sharing its cache entries."""
+        url = jenkins._append_tree_query_param(
+            jenkins._convert_to_api_url(test_report_url), ["errorDetails", "errorStackTrace"]
+        )
+
+        async def fetch() -> Tuple[str, str]:
+            data = await self._fetch_json(url, attempted_action="fetch error texts")
+            return data.get("errorDetails"), data.get("errorStackTrace")
+
+        return await jenkins.cache.get_or_fetch_async(jenkins._get_error_texts, (test_report_url,), fetch)
+
+    async def _harvest_error_texts(self, job_run_url: str) -> Dict[str, Dict[str, Tuple[str, str]]]:
+        """Async version of `jenkins._get_harvested_error_texts`, sharing its cache entries."""
+        url = jenkins._convert_to_api_url(job_run_url.removesuffix("/") + "/testReport")
+        url = jenkins._append_tree_query_param(url, jenkins.HARVESTED_ERROR_TEXT_FIELDS)
+
+        async def fetch() -> Dict[str, Dict[str, Tuple[str, str]]]:
+            data = await self._fetch_json(url, attempted_action="fetch failed test case error texts")
+            return jenkins._parse_harvested_error_texts(data)
+
+        return await jenkins.cache.get_or_fetch_async(jenkins._get_harvested_error_texts, (job_run_url,), fetch)
+
+    async def _enrich_job_run(self, job_run: JobRun) -> JobRun:
+        """
+        Async version of `jenkins._enrich_job_run`.
+
+        The error texts of all failed tests are fetched concurrently up front and then handed to the same
+        `fetch_error_texts_for_failed_tests` that the sync collector uses.
+        """
+        if not isinstance(job_run, TestMatrixJobRun):
+            return job_run
+
+        reports = []
+        for test_report in job_run.test_results.matrix_test_reports:
+            failed_test_cases = [
+                case
+                for suite in test_report.test_result.suites
+                for case in suite.cases
+                if case.status in FAILED_TEST_CASE_STATUSES and not case.has_error_texts
+            ]
+            if failed_test_cases:
+                reports.append((test_report, failed_test_cases))
+        harvested = await asyncio.gather(
+            *(self._harvest_error_texts(test_report.url) for test_report, _ in reports), return_exceptions=True
+        )
+        harvested_by_url = dict(zip([test_report.url for test_report, _ in reports], harvested))
+
+        fallback_urls = []
+        for test_report, failed_test_cases in reports:
+            error_texts = harvested_by_url[test_report.url]
+            for case in failed_test_cases:
+                if isinstance(error_texts, Exception) or error_texts.get(case.class_name, {}).get(case.name) is None:
+                    fallback_urls.append(
+                        test_report.generate_test_case_report_url(
+                            test_case_name=case.name, test_case_class=case.class_name
+                        )
+                    )
+        fetched = await asyncio.gather(*(self._fetch_error_texts(url) for url in fallback_urls), return_exceptions=True)
+        fetched_by_url = dict(zip(fallback_urls, fetched))
+
+        def lookup(results: dict, url: str):
+            result = results[url]
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        job_run.fetch_error_texts_for_failed_tests(
+            lambda url: lookup(fetched_by_url, url), lambda url: lookup(harvested_by_url, url)
+        )
+        return job_run
+
+    async def collect_job(self, job_name: str) -> Job:
+        """Async version of `jenkins.collect_job`."""
+        url = jenkins._make_url_from_job_name(job_name) + "api/json"
+        data = await self._fetch_json(
+            jenkins._append_tree_query_param(jenkins._convert_to_api_url(url), jenkins.JOB_FIELDS),
+            attempted_action="fetch job data",
+        )
+        return jenkins._parse_job_object_from_api_json(url, data)
+
+    async def collect_job_run(
+        self,
+        job_name: str,
+        build_number: int,
+        job_run_type: Optional[type[JobRun]] = None,
+        job_run_api_json: Optional[dict] = None,
+    ) -> JobRun | MatrixJobRun | TestMatrixJobRun | TestJobRun:
+        """Async version of `jenkins.collect_job_run`."""
+        data = await self._fetch_job_run_data(job_name, build_number, job_run_type, job_run_api_json)
+        return await self._enrich_job_run(jenkins._build_job_run(data))
+
+    async def _fetch_and_refresh_job(self, job_name: str) -> Job:
+        """Async version of `jenkins._fetch_and_refresh_job`."""
+        job = await asyncio.to_thread(db.get_job_from_db, job_name)
+        if job is not None and job.last_build_number is not None:
+            probe = await self._probe_job_from_api(job.url)
+            if (
+                jenkins._get_build_number(probe, "lastBuild") == job.last_build_number
+                and jenkins._get_build_number(probe, "lastCompletedBuild") == job.last_completed_build_number
+            ):
+                return job
+        new_job = await self.collect_job(job_name)
+        if job is None:
+            job = new_job
+        else:
+            job.description = new_job.description
+            job.build_numbers = new_job.build_numbers
+            job.last_updated = datetime.now()
+            job.last_completed_build_number = new_job.last_completed_build_number
+            job.last_build_number = new_job.last_build_number
+        await asyncio.to_thread(db.save_to_mongo, job)
+        return job
+
+    async def collect_all_job_runs(
+        self,
+        job_name: str,
+        job_run_type: Optional[type[JobRun]] = None,
+        max_job_runs_in_flight: int = DEFAULT_MAX_JOB_RUNS_IN_FLIGHT,
+    ) -> Tuple[Job, List[JobRun]]:
+        """
+        Async version of `jenkins.collect_all_job_runs`.
+
+        Progress is recorded in the same sync journal, so the sync and async collectors can be used interchangeably.
+
+        Args:
+            job_name (str): The name of the job to fetch job runs for.
+            job_run_type (Optional[type[JobRun]]): The type of job run to create (e.g. TestJobRun).
+            max_job_runs_in_flight (int): The number of job runs of this job collected at the same time.
+
+        Returns:
+            Tuple[Job, List[JobRun]]: The updated job and the job runs that were fetched and saved (newest first).
+        """
+        job, fetched_job_runs, _ = await self._collect_all_job_runs(job_name, job_run_type, max_job_runs_in_flight)
+        return job, fetched_job_runs
+
+    async def _collect_all_job_runs(
+        self,
+        job_name: str,
+        job_run_type: Optional[type[JobRun]],
+        max_job_runs_in_flight: int,
+    ) -> Tuple[Job, List[JobRun], List[int]]:
+        """`collect_all_job_runs` that also returns the build numbers that failed to be fetched or saved."""
+        await asyncio.to_thread(db.prepare_db)
+        job = await self._fetch_and_refresh_job(job_name)
+        build_numbers_to_fetch = await asyncio.to_thread(jenkins._get_build_numbers_to_fetch, job_name, job)
+        if not build_numbers_to_fetch:
+            journal = await asyncio.to_thread(db.get_job_sync_journal, job_name)
+            if journal is None or journal.get("lastCompletedBuildNumber") != job.last_completed_build_number:
+                await asyncio.to_thread(db.start_job_sync, job_name, [], job.last_completed_build_number)
+                await asyncio.to_thread(db.finish_job_sync, job_name)
+            print(f"No new job runs to fetch for job: {job_name}")
+            return job, [], []
+
+        await asyncio.to_thread(db.start_job_sync, job_name, build_numbers_to_fetch, job.last_completed_build_number)
+
+        try:
+            job_run_api_jsons = await self._fetch_job_run_jsons_in_bulk(job_name, build_numbers_to_fetch)
+        except Exception as e:
+            print(f"Failed to fetch job run data in bulk for {job_name}, falling back to per build requests: {e}")
+            job_run_api_jsons = {}
+
+        fetched_job_runs: List[JobRun] = []
+        failed_build_numbers: List[int] = []
+
+        def on_error(build_number: int, error: Exception):
+            jenkins._record_job_run_failure(job_name, build_number, error)
+            failed_build_numbers.append(build_number)
+
+        # job runs are saved in batches of `db.SAVE_BATCH_SIZE`, in a worker thread whenever a batch is full
+        save_buffer = jenkins._create_job_run_save_buffer(job_name, fetched_job_runs, on_error)
+        semaphore = asyncio.Semaphore(max_job_runs_in_flight)
+
+        async def collect_and_save(build_number: int):
+            async with semaphore:
+                try:
+                    job_run = await self.collect_job_run(
+                        job_name, build_number, job_run_type, job_run_api_jsons.get(build_number)
+                    )
+                except Exception as e:
+                    await asyncio.to_thread(on_error, build_number, e)
+                    return
+                await asyncio.to_thread(save_buffer.add, job_run)
+
+        await asyncio.gather(*(collect_and_save(build_number) for build_number in build_numbers_to_fetch))
+        await asyncio.to_thread(save_buffer.flush)
+        await asyncio.to_thread(db.finish_job_sync, job_name)
+
+        fetched_job_runs.sort(key=lambda job_run: job_run.build_number, reverse=True)
+        failed_build_numbers.sort(reverse=True)
+        print(f"Fetched {len(fetched_job_runs)} job runs for {job_name} ({len(failed_build_numbers)} failed)")
+        return job, fetched_job_runs, failed_build_numbers
+
+    async def get_all_existing_job_names_from_jenkins(self) -> List[str]:
+        """Async version of `jenkins.get_all_existing_job_names_from_jenkins`."""
+        data = await self._fetch_json(f"{jenkins.JENKINS_API_URL}/api/json", attempted_action="fetch job names")
+        return [job["name"] for job in data["jobs"]]
+
+    async def discover_jobs(
+        self, max_folder_depth: int = jenkins.JOB_DISCOVERY_MAX_FOLDER_DEPTH
+    ) -> Dict[str, jenkins.JobSnapshot]:
+        """Async version of `jenkins.discover_jobs`."""
+        data = await self._fetch_json(jenkins._get_job_discovery_url(max_folder_depth), attempted_action="discover jobs")
+        return jenkins._parse_job_snapshots(data)
+
+    async def collect_projects(
+        self,
+        configs: List[SyncConfig],
+        max_job_runs_in_flight: int = DEFAULT_MAX_JOB_RUNS_IN_FLIGHT,
+        max_jobs_in_flight: int = DEFAULT_MAX_JOBS_IN_FLIGHT,
+    ) -> SyncReport:
+        """
+        Collect every job of the given projects, `max_jobs_in_flight` jobs at the same time.
+
+        Jobs that do not exist in Jenkins or that are already up to date are skipped (see
+        `sync.skip_jobs_not_needing_sync`).
+
+        Args:
+            configs (List[SyncConfig]): ProjectConfigs, PipelineConfigs, CloudInitPipelineConfigs, or lists of
+                CloudInitPipelineConfigs to collect.
+            max_job_runs_in_flight (int): The number of job runs of each job collected at the same time.
+            max_jobs_in_flight (int): The number of jobs collected at the same time.
+
+        Returns:
+            SyncReport: Which builds were synced or failed per job, and which jobs could not be synced at all.
+        """
+        if max_jobs_in_flight < 1:
+            raise ValueError(f"max_jobs_in_flight must be at least 1, not: {max_jobs_in_flight}")
+        report = SyncReport()
+        try:
+            snapshots = await self.discover_jobs()
+        except Exception as e:
+            print(f"Failed to discover jobs, collecting every job: {e}")
+            snapshots = None
+        jobs = get_jobs_to_sync(configs)
+        if snapshots is not None:
+            # looks up the sync journal and the last build of every job in the database
+            jobs = await asyncio.to_thread(skip_jobs_not_needing_sync, jobs, report, snapshots)
+        semaphore = asyncio.Semaphore(max_jobs_in_flight)
+
+        async def collect_job(job_name: str, job_run_type: Optional[type[JobRun]]):
+            async with semaphore:
+                return await self._collect_all_job_runs(job_name, job_run_type, max_job_runs_in_flight)
+
+        results = await asyncio.gather(
+            *(collect_job(job_name, job_run_type) for job_name, job_run_type in jobs.items()),
+            return_exceptions=True,
+        )
+        for job_name, result in zip(jobs, results):
+            if isinstance(result, Exception):
+                print(f"Failed to collect job: {job_name}: {result}")
+                report.failed_jobs[job_name] = f"{type(result).__name__}: {result}"
+                continue
+            _, fetched_job_runs, failed_build_numbers = result
+            if fetched_job_runs:
+                report.synced_build_numbers[job_name] = [job_run.build_number for job_run in fetched_job_runs]
+            if failed_build_numbers:
+                report.failed_build_numbers[job_name] = failed_build_numbers
+        print(report.summary())
+        return report
@@ -0,0 +1,164 @@
+"""
+Module for the on-disk cache of Jenkins API responses.
+
+Completed job runs never change, so anything fetched for them is cached forever. Anything fetched for a job run that
+is still in progress is only cached for a short time so that it is fetched again once the job run completes.
+Entries are compressed and the cache is kept under a byte budget by evicting the least recently used entries.
+
+Example:
+    from cpc_jank_db.cache import JenkinsCache
+
+    cache = JenkinsCache(".jenkins-cache", size_limit=2 * 1024**3)
+
+    @cache.memoize(ttl_for=lambda data: None if data["result"] is not None else 60)
+    def fetch_job_run(url: str) -> dict: ...
+
+    print(cache.get_stats())
+
+Async code (see `async_jenkins`) shares the entries of a memoized function with `get_or_fetch_async`.
+"""
+
+import asyncio
+import functools
+import json
+import threading
+from typing import Any, Awaitable, Callable, Optional
+
+import diskcache
+from pydantic import BaseModel
+
+DEFAULT_DIRECTORY = ".jenkins-cache"
+DEFAULT_SIZE_LIMIT_BYTES = 4 * 1024**3
+DEFAULT_COMPRESS_LEVEL = 6
+IN_PROGRESS_TTL_SECONDS = 300
+
+_MISSING = object()
+
+
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    entry_count: int
+    size_bytes: int
+    size_limit_bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        if self.hits + self.misses == 0:
+            return 0.0
+        return self.hits / (self.hits + self.misses)
+
+
+class JenkinsCache:
+    """
+    Size bounded, compressed, freshness aware cache for Jenkins API responses.
+
+    Cached values must be JSON serializable (tuples are returned as lists).
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_DIRECTORY,
+        size_limit: int = DEFAULT_SIZE_LIMIT_BYTES,
+        compress_level: int = DEFAULT_COMPRESS_LEVEL,
+    ):
+        """
+        Args:
+            directory (str): The directory the cache is stored in.
+            size_limit (int): The maximum size of the cache in bytes. The least recently used entries are evicted
+                once the cache grows past it.
+            compress_level (int): The zlib compression level used for every entry.
+        """
+        self.size_limit = size_limit
+        self._cache = diskcache.Cache(
+            directory,
+            size_limit=size_limit,
+            eviction_policy="least-recently-used",
+            disk=diskcache.JSONDisk,
+            disk_compress_level=compress_level,
+        )
+        self._hits = 0
+        self._misses = 0
+        self._stats_lock = threading.Lock()
+
+    def memoize(self, ttl_for: Optional[Callable[[Any], Optional[float]]] = None):
+        """
+        Decorator that caches the return value of a function by its arguments.
+
+        Args:
+            ttl_for (Optional[Callable[[Any], Optional[float]]]): Callable that takes in the return value of the
+                function and returns how many seconds it may be cached for, or None to cache it forever. If not
+                given, every return value is cached forever.
+        """
+
+        def decorator(func: Callable):
+            name = f"{func.__module__}.{func.__qualname__}"
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = self._get_key(name, args, kwargs)
+                value = self._cache.get(key, default=_MISSING)
+                if value is not _MISSING:
+                    self._record(hit=True)
+                    return value
+                self._record(hit=False)
+                value = func(*args, **kwargs)
+                self._cache.set(key, value, expire=ttl_for(value) if ttl_for else None)
+                return value
+
+            wrapper.cache_name = name
+            wrapper.cache_ttl_for = ttl_for
+            return wrapper
+
+        return decorator
+
+    async def get_or_fetch_async(self, memoized_func: Callable, args: tuple, fetch: Callable[[], Awaitable]) -> Any:
+        """
+        Get the cached return value of a function decorated with `memoize` for the given arguments, or await `fetch`
+        and cache what it returns under the same entry (with the same ttl) if it is not cached.
+
+        The cache is read and written in a worker thread so that the event loop is never blocked by disk access.
+
+        Args:
+            memoized_func (Callable): The memoized function whose cache entries are shared.
+            args (tuple): The positional arguments the memoized function would be called with.
+            fetch (Callable[[], Awaitable]): Coroutine function that fetches the value on a cache miss.
+        """
+        key = self._get_key(memoized_func.cache_name, args, {})
+        value = await asyncio.to_thread(self._cache.get, key, _MISSING)
+        if value is not _MISSING:
+            self._record(hit=True)
+            return value
+        self._record(hit=False)
+        value = await fetch()
+        ttl_for = memoized_func.cache_ttl_for
+        await asyncio.to_thread(self._cache.set, key, value, ttl_for(value) if ttl_for else None)
+        return value
+
+    @staticmethod
+    def _get_key(name: str, args: tuple, kwargs: dict) -> str:
+        return json.dumps([name, args, kwargs], sort_keys=True, default=str)
+
+    def _record(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def get_stats(self) -> CacheStats:
+        with self._stats_lock:
+            hits, misses = self._hits, self._misses
+        return CacheStats(
+            hits=hits,
+            misses=misses,
+            entry_count=len(self._cache),
+            size_bytes=self._cache.volume(),
+            size_limit_bytes=self.size_limit,
+        )
+
+    def clear(self):
+        self._cache.clear()
+        with self._stats_lock:
+            self._hits = 0
+            self._misses = 0
@@ -1,11 +1,11 @@
 # create pydantic model representing the data structure
 from datetime import datetime
-from typing import Dict, List, Literal, Optional, Set
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Set
 
 import pandas as pd
-import re
 from pydantic import BaseModel
 
+from cpc_jank_db.extractors import CLOUD_INIT_VERSION_FIELD, extract_fields
 from cpc_jank_db.models import (
     JobRun,
     MatrixTestReport,
@@ -36,14 +36,26 @@ class TestCaseFailure(BaseModel):
     def get_failed_test_cases(test_job: JobRun) -> List["TestCaseFailure"]:
         raise NotImplementedError
 
+    @classmethod
+    def iter_failed_test_cases(cls, test_job_runs: Iterable[JobRun]) -> Iterator["TestCaseFailure"]:
+        """
+        Yield the failed test cases of every job run, one job run at a time.
+
+        `test_job_runs` can be a lazy iterator (e.g. `db.iter_test_job_runs_for_project`), in which case only one job
+        run is held in memory at a time.
+        """
+        for test_job in test_job_runs:
+            yield from cls.get_failed_test_cases(test_job)
+
     @classmethod
     def compile_failed_test_cases(
-        test_job_runs: List[JobRun],
+        cls,
+        test_job_runs: Iterable[JobRun],
     ) -> List["TestCaseFailure"]:
-        raise NotImplementedError
+        return list(cls.iter_failed_test_cases(test_job_runs))
 
     @classmethod
-    def create_pandas_dataframe_for_failing_tests(cls, test_job_runs: List[JobRun]) -> pd.DataFrame:
+    def create_pandas_dataframe_for_failing_tests(cls, test_job_runs: Iterable[JobRun]) -> pd.DataFrame:
         raise NotImplementedError
 
 
@@ -62,12 +74,28 @@ def parse_cloud_init_version_from_console_output(console_output: Optional[str])
     """
     # for a line like: `cloud-init version: /usr/bin/cloud-init 99.daily-202503112148-3da7eca87~ubuntu20.04.1`
     # we want "99.daily-202503112148-3da7eca87~ubuntu20.04.1" from the above example
-    if not console_output:
-        return None
-    match = re.search(r"cloud-init version: /usr/bin/cloud-init (.+)", console_output)
-    if match:
-        return match.group(1)
-    return None
+    return extract_fields(console_output, [CLOUD_INIT_VERSION_FIELD]).get(CLOUD_INIT_VERSION_FIELD)
+
+
+def get_cloud_init_version(job_run: JobRun) -> Optional[str]:
+    """
+    Get the cloud-init version of a job run.
+
+    The version is extracted from the console output when the job run is collected, and backfilled for job runs
+    collected before that by `db.backfill_extracted_fields`. Otherwise, it is parsed from the console output (if it
+    was loaded) once and remembered on the job run.
+
+    Args:
+        job_run JobRun: The job run
+
+    Returns:
+        str: The cloud-init version if found, otherwise None
+    """
+    if CLOUD_INIT_VERSION_FIELD not in job_run.extracted_fields and job_run.console_output:
+        cloud_init_version = parse_cloud_init_version_from_console_output(job_run.console_output)
+        if cloud_init_version is not None:
+            job_run.extracted_fields[CLOUD_INIT_VERSION_FIELD] = cloud_init_version
+    return job_run.extracted_fields.get(CLOUD_INIT_VERSION_FIELD)
 
 class CloudInitTestCaseFailure(TestCaseFailure):
     image_type: Literal["generic", "minimal"]
@@ -97,7 +125,7 @@ class CloudInitTestCaseFailure(TestCaseFailure):
             test_case_url=job_run.generate_test_case_report_url(
                 test_case_name=test_case.name, test_case_class=test_case.class_name
             ),            
-            cloud_init_version=parse_cloud_init_version_from_console_output(job_run.console_output),
+            cloud_init_version=get_cloud_init_version(job_run),
         )
 
     @classmethod
@@ -111,22 +139,13 @@ class CloudInitTestCaseFailure(TestCaseFailure):
         return failed_test_cases
 
     @classmethod
-    def compile_failed_test_cases(
-        cls,
-        test_job_runs: List[TestJobRun],
-    ) -> List["CloudInitTestCaseFailure"]:
-        failed_test_cases = []
-        for test_job in test_job_runs:
-            failed_test_cases.extend(cls.get_failed_test_cases(test_job))
-        return failed_test_cases
-
-    @classmethod
-    def create_pandas_dataframe_for_failing_tests(cls, test_job_runs: List[TestJobRun]) -> pd.DataFrame:
+    def create_pandas_dataframe_for_failing_tests(cls, test_job_runs: Iterable[TestJobRun]) -> pd.DataFrame:
         """
-        Create a pandas dataframe for failing tests from the given list of TestJobRun objects
+        Create a pandas dataframe for failing tests from the given TestJobRun objects
 
         Args:
-            test_job_runs: List of TestJobRun objects to extract failing tests from
+            test_job_runs: TestJobRun objects to extract failing tests from. Can be a lazy iterator (e.g.
+                `db.iter_job_runs_for_job`), which is consumed one job run at a time.
 
         Returns:
             DataFrame: A pandas DataFrame containing the following columns:
@@ -144,8 +163,7 @@ class CloudInitTestCaseFailure(TestCaseFailure):
                 - cloud_name: Name of the cloud provider
                 - cloud_init_version: Version of cloud-init used in the test
         """
-        failed_test_cases = cls.compile_failed_test_cases(test_job_runs)
-        df = pd.DataFrame([test_case.model_dump() for test_case in failed_test_cases])
+        df = pd.DataFrame([test_case.model_dump() for test_case in cls.iter_failed_test_cases(test_job_runs)])
         df["timestamp"] = pd.to_datetime(df["timestamp"])
         return df
 
@@ -198,22 +216,13 @@ class CPCTestCaseFailure(TestCaseFailure):
         return failed_test_cases
 
     @classmethod
-    def compile_failed_test_cases(
-        cls,
-        test_job_runs: List[TestMatrixJobRun | TestJobRun],
-    ) -> List["CPCTestCaseFailure"]:
-        failed_test_cases = []
-        for test_job in test_job_runs:
-            failed_test_cases.extend(cls.get_failed_test_cases(test_job))
-        return failed_test_cases
-
-    @classmethod
-    def create_pandas_dataframe_for_failing_tests(cls, test_job_runs: List[TestMatrixJobRun]) -> pd.DataFrame:
+    def create_pandas_dataframe_for_failing_tests(cls, test_job_runs: Iterable[TestMatrixJobRun]) -> pd.DataFrame:
         """
-        Create a pandas dataframe for failing tests from the given list of TestMatrixJobRun objects
+        Create a pandas dataframe for failing tests from the given TestMatrixJobRun objects
 
         Args:
-            test_job_runs: List of TestMatrixJobRun objects to extract failing tests from
+            test_job_runs: TestMatrixJobRun objects to extract failing tests from. Can be a lazy iterator (e.g.
+                `db.iter_test_job_runs_for_project`), which is consumed one job run at a time.
 
         Returns:
             DataFrame: A pandas DataFrame containing the following columns:
@@ -230,12 +239,11 @@ class CPCTestCaseFailure(TestCaseFailure):
                 - test_case_url: URL of the test case
                 - timestamp: Timestamp that the test was run
         """
-        failed_test_cases = cls.compile_failed_test_cases(test_job_runs)
-        return pd.DataFrame([test_case.model_dump() for test_case in failed_test_cases])
+        return pd.DataFrame([test_case.model_dump() for test_case in cls.iter_failed_test_cases(test_job_runs)])
 
 
 def print_failed_test_errors(
-    test_job_runs: List[TestMatrixJobRun],
+    test_job_runs: Iterable[TestMatrixJobRun],
     arch: Optional[str] = None,
     instance_type: Optional[str] = None,
     test: Optional[str] = None,
@@ -276,7 +284,7 @@ def print_failed_test_errors(
 
 def get_test_reports_for_failed_test(
     test_name: str,
-    test_job_runs: List[TestMatrixJobRun],
+    test_job_runs: Iterable[TestMatrixJobRun],
 ) -> List[MatrixTestReport]:
     """
     We want to return the matrix test report for all failed tests with the given test name
@@ -6,15 +6,39 @@ This module provides functions for saving and retrieving Job and JobRun instance
 Any processing of the data should be done elsewhere.
 """
 
+import hashlib
+import itertools
 import subprocess
-from typing import Dict, List, Optional
+import sys
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Literal, Optional, Tuple, TypeVar, Union
 
 import tqdm
-from pydantic import BaseModel
-from pymongo import MongoClient
+from bson.binary import Binary
+from pydantic import BaseModel, Field
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReturnDocument, UpdateOne
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, OperationFailure
 
-from cpc_jank_db.models import Job, JobRun, MatrixJobRun, TestJobRun, TestMatrixJobRun
-from cpc_jank_db.naming import PipelineConfig, ProjectConfig
+from cpc_jank_db import extractors
+from cpc_jank_db.models import (
+    PASSED_TEST_CASE_STATUSES,
+    Job,
+    JobRun,
+    MatrixChildRun,
+    MatrixJobRun,
+    MatrixTestReport,
+    MatrixTestResults,
+    TestCase,
+    TestJobRun,
+    TestMatrixJobRun,
+    TestResult,
+    TestSuite,
+    get_job_name_from_url,
+)
+from cpc_jank_db.naming import CloudInitPipelineConfig, PipelineConfig, ProjectConfig
 from dotenv import load_dotenv
 import os
 load_dotenv()
@@ -22,6 +46,7 @@ load_dotenv()
 username = os.getenv("MONGO_USERNAME")
 password = os.getenv("MONGO_PASSWORD")
 uri = os.getenv("MONGO_URI")
+database_name = os.getenv("MONGO_DB_NAME", "test_jenkins_observability_db")
 
 
 if not uri and not username and not password:
@@ -45,53 +70,417 @@ if username and password:
         password=password,
         authSource="admin"
     )
+elif uri:
+    print("No password or username set, using the mongo uri from environment variables.")
+    client = MongoClient(uri)
 else:
     print("No password or username set, assuming you are using the ssh tunnel.")
     client = MongoClient("mongodb://localhost:27069/")
 
-db = client["test_jenkins_observability_db"]
+db = client[database_name]
 job_collection = db["jenkins_job_collection"]
 job_run_collection = db["jenkins_job_run_collection"]
+console_log_collection = db["jenkins_console_log_collection"]
+console_log_chunk_collection = db["jenkins_console_log_chunk_collection"]
+sync_journal_collection = db["jenkins_sync_journal_collection"]
+work_queue_collection = db["jenkins_work_queue_collection"]
+migration_collection = db["jenkins_migration_collection"]
 
+# number of times a build may fail to sync before it is quarantined and no longer retried automatically
+MAX_BUILD_SYNC_ATTEMPTS = 3
 
-def save_to_mongo(pydantic_model: BaseModel):
-    """Convert pydantic model to a dict and insert into MongoDB."""
+# console logs are split into chunks at line boundaries chosen by their content (not their offset), so that the
+# same boilerplate shared by many logs ends up in identical chunks that are only stored once
+CONSOLE_LOG_MIN_CHUNK_BYTES = 16 * 1024
+CONSOLE_LOG_MAX_CHUNK_BYTES = 256 * 1024
+CONSOLE_LOG_CHUNK_BOUNDARY_MODULUS = 64
+# chunks are compressed with zlib from the standard library, so the log store needs no extra dependency
+CONSOLE_LOG_COMPRESSION_LEVEL = 6
+
+# number of jobs and job runs the collectors buffer before saving them with a single bulk write
+SAVE_BATCH_SIZE = int(os.getenv("MONGO_SAVE_BATCH_SIZE", "50"))
+
+# number of documents fetched from the database per round trip when iterating over job runs
+CURSOR_BATCH_SIZE = int(os.getenv("MONGO_CURSOR_BATCH_SIZE", "100"))
+
+# number of documents updated per bulk write when backfilling fields of existing documents
+BACKFILL_BATCH_SIZE = 1000
+
+# projection that leaves out console output stored inline by older versions of this module
+CONSOLE_OUTPUT_EXCLUSION_PROJECTION = {"consoleOutput": 0, "matrix_runs.consoleOutput": 0}
+
+# how much of every job run is loaded from the database:
+# "full" loads everything (except the console output, see `include_console_output`), "failures" leaves out the test
+# cases that passed and the testActions of test reports, and "summary" leaves out the test results and matrix child
+# runs, which are then loaded from the database the first time they are accessed. Job runs loaded with "failures" are
+# partial (see `JobRun.mark_partial`) and can not be saved, since their passing test cases would be lost.
+LoadProfile = Literal["summary", "failures", "full"]
+# fields (by name) of job runs that the "summary" load profile leaves out
+SUMMARY_OMITTED_FIELDS = ["test_results", "matrix_runs"]
+# fields (by name) of job runs that the "failures" load profile only loads partly
+FAILURES_PARTIAL_FIELDS = ["test_results"]
+SUMMARY_EXCLUSION_PROJECTION = {"consoleOutput": 0, "testResults": 0, "matrix_runs": 0}
+
+
+def _get_field_expressions(variable: str, model_class: type[BaseModel], exclude: Tuple[str, ...] = ()) -> Dict:
+    """Aggregation expressions that copy every stored field of a model (by alias) from a variable, e.g. "$$suite"."""
+    return {
+        field.alias or name: f"{variable}.{field.alias or name}"
+        for name, field in model_class.model_fields.items()
+        if name not in exclude
+    }
+
+
+def _get_failed_test_result_expression(variable: str) -> Dict:
+    """Aggregation expression that rebuilds a test result without its passing test cases and testActions."""
+    failed_cases = {
+        "$filter": {
+            "input": "$$suite.cases",
+            "as": "case",
+            "cond": {"$and": [{"$ne": ["$$case.status", status]} for status in PASSED_TEST_CASE_STATUSES]},
+        }
+    }
+    suite = {
+        **_get_field_expressions("$$suite", TestSuite, exclude=("cases",)),
+        "cases": {
+            "$map": {
+                "input": failed_cases,
+                "as": "case",
+                "in": _get_field_expressions("$$case", TestCase, exclude=("test_actions",)),
+            }
+        },
+    }
+    return {
+        **_get_field_expressions(variable, TestResult, exclude=("test_actions", "suites")),
+        "suites": {"$map": {"input": f"{variable}.suites", "as": "suite", "in": suite}},
+    }
+
+
+# rebuilds the testResults of TestJobRuns and TestMatrixJobRuns for the "failures" load profile
+FAILED_TEST_RESULTS_EXPRESSION = {
+    "$cond": {
+        "if": {"$isArray": "$testResults.suites"},
+        "then": _get_failed_test_result_expression("$testResults"),
+        "else": {
+            "$cond": {
+                "if": {"$isArray": "$testResults.matrixTestReports"},
+                "then": {
+                    **_get_field_expressions("$testResults", MatrixTestResults, exclude=("matrix_test_reports",)),
+                    "matrixTestReports": {
+                        "$map": {
+                            "input": "$testResults.matrixTestReports",
+                            "as": "report",
+                            "in": {
+                                **_get_field_expressions("$$report", MatrixTestReport, exclude=("test_result",)),
+                                "testResult": _get_failed_test_result_expression("$$report.testResult"),
+                            },
+                        }
+                    },
+                },
+                "else": "$testResults",
+            }
+        },
+    }
+}
+
+
+def _split_console_log_into_chunks(data: bytes) -> List[bytes]:
+    chunks = []
+    chunk_start = 0
+    line_start = 0
+    while line_start < len(data):
+        line_end = data.find(b"\n", line_start)
+        line_end = len(data) if line_end == -1 else line_end + 1
+        chunk_size = line_end - chunk_start
+        if chunk_size >= CONSOLE_LOG_MAX_CHUNK_BYTES or (
+            chunk_size >= CONSOLE_LOG_MIN_CHUNK_BYTES
+            and zlib.crc32(data[line_start:line_end]) % CONSOLE_LOG_CHUNK_BOUNDARY_MODULUS == 0
+        ):
+            chunks.append(data[chunk_start:line_end])
+            chunk_start = line_end
+        line_start = line_end
+    if chunk_start < len(data):
+        chunks.append(data[chunk_start:])
+    return chunks
+
+
+def save_console_logs(console_outputs: List[str]) -> List[str]:
+    """
+    Save console logs to the console log store and return their ids.
+
+    Every log is split into chunks that are compressed and keyed by the sha256 of their content, so chunks (and whole
+    logs) that were already stored are not stored again. However many logs are saved, this takes one lookup of the
+    logs that already exist, one bulk write of the chunks and one bulk write of the logs.
+
+    Args:
+        console_outputs (List[str]): The console outputs to store.
+
+    Returns:
+        List[str]: The ids of the stored console logs, in the same order as the console outputs. The id of a log is
+            the sha256 of its content.
+    """
+    logs = {}
+    log_ids = []
+    for console_output in console_outputs:
+        data = console_output.encode("utf-8")
+        log_id = hashlib.sha256(data).hexdigest()
+        logs[log_id] = data
+        log_ids.append(log_id)
+    if not logs:
+        return log_ids
+    existing_log_ids = {doc["_id"] for doc in console_log_collection.find({"_id": {"$in": list(logs)}}, {"_id": 1})}
+
+    chunk_operations: Dict[str, UpdateOne] = {}
+    log_operations = []
+    for log_id, data in logs.items():
+        if log_id in existing_log_ids:
+            continue
+        chunk_ids = []
+        for chunk in _split_console_log_into_chunks(data):
+            chunk_id = hashlib.sha256(chunk).hexdigest()
+            chunk_ids.append(chunk_id)
+            if chunk_id not in chunk_operations:
+                chunk_operations[chunk_id] = UpdateOne(
+                    {"_id": chunk_id},
+                    {
+                        "$setOnInsert": {
+                            "data": Binary(zlib.compress(chunk, CONSOLE_LOG_COMPRESSION_LEVEL)),
+                            "size": len(chunk),
+                        }
+                    },
+                    upsert=True,
+                )
+        log_operations.append(
+            UpdateOne({"_id": log_id}, {"$setOnInsert": {"chunks": chunk_ids, "size": len(data)}}, upsert=True)
+        )
+    # chunks are written before the logs that reference them, so a stored log never misses a chunk
+    if chunk_operations:
+        console_log_chunk_collection.bulk_write(list(chunk_operations.values()), ordered=False)
+    if log_operations:
+        console_log_collection.bulk_write(log_operations, ordered=False)
+    return log_ids
+
+
+def save_console_log(console_output: str) -> str:
+    """Save a single console log to the console log store and return its id. See `save_console_logs`."""
+    return save_console_logs([console_output])[0]
+
+
+def get_console_log(log_id: str) -> Optional[str]:
+    """Load a console log from the console log store by its id, or None if it does not exist."""
+    log = console_log_collection.find_one({"_id": log_id})
+    if log is None:
+        return None
+    chunks = {doc["_id"]: doc["data"] for doc in console_log_chunk_collection.find({"_id": {"$in": log["chunks"]}})}
+    return b"".join(zlib.decompress(chunks[chunk_id]) for chunk_id in log["chunks"]).decode("utf-8")
+
+
+def _move_console_output_to_log_store(documents: List[dict]):
+    """
+    Replace the inline console output of job run documents (and of their matrix child runs) with console log ids.
+
+    The console logs of all the documents are saved together (see `save_console_logs`).
+    """
+    docs = [doc for document in documents for doc in [document, *document.get("matrix_runs", [])]]
+    docs_with_console_output = [doc for doc in docs if doc.get("consoleOutput") is not None]
+    log_ids = save_console_logs([doc["consoleOutput"] for doc in docs_with_console_output])
+    for doc, log_id in zip(docs_with_console_output, log_ids):
+        doc["consoleLogId"] = log_id
+    for doc in docs:
+        doc.pop("consoleOutput", None)
+        # never unset the reference to a log that is already stored when re-saving a job run loaded without its logs
+        if doc.get("consoleLogId") is None:
+            doc.pop("consoleLogId", None)
+
+
+def load_console_output(job_run: JobRun) -> JobRun:
+    """
+    Load the console output of a job run (and of its matrix child runs) from the console log store.
+
+    Args:
+        job_run (JobRun): The job run that was loaded from the database without its console output.
+
+    Returns:
+        JobRun: The same job run, with console_output filled in.
+    """
+    for run in [job_run, *getattr(job_run, "matrix_runs", [])]:
+        if run.console_output is None and run.console_log_id is not None:
+            run.console_output = get_console_log(run.console_log_id)
+    return job_run
 
-    if pydantic_model is None:
-        raise ValueError("pydantic_model must not be None")
 
-    # if it is a Job, insert into job_collection
+class SaveError(Exception):
+    """Raised when a job or job run could not be saved to the database."""
+
+
+class SaveResult(BaseModel):
+    """The outcome of saving a single job or job run with `save_many_to_mongo`."""
+
+    model: BaseModel
+    job_name: str
+    build_number: Optional[int] = None
+    outcome: Literal["inserted", "updated", "failed"] = "updated"
+    error: Optional[str] = None
+
+    @property
+    def saved(self) -> bool:
+        return self.outcome != "failed"
+
+
+def _get_document(pydantic_model: BaseModel) -> dict:
+    document = pydantic_model.model_dump(by_alias=True, exclude_unset=False)
+    document["jobName"] = pydantic_model.job_name
+    return document
+
+
+def _get_upsert_operation(pydantic_model: BaseModel, document: dict) -> Tuple[Collection, UpdateOne]:
+    """Get the collection and the upsert that saves the document of a Job or JobRun, keyed on its job name."""
     if isinstance(pydantic_model, Job):
-        pydantic_model: Job
-        if job_exists(pydantic_model.name):
-            # print(f"Job: {pydantic_model.name} already exists in the database. Updating...")
-            # update the job
-            job_collection.update_one(
-                {"fullDisplayName": pydantic_model.name},
-                {"$set": pydantic_model.model_dump(by_alias=True, exclude_unset=False)},
-            )
-        else:
-            # print("Saving job to mongo")
-            document = pydantic_model.model_dump(by_alias=True, exclude_unset=False)
-            job_collection.insert_one(document)
-    # if it is a JobRun, insert into job_run_collection
-    elif isinstance(pydantic_model, JobRun):
-        if job_run_already_exists(pydantic_model.name, pydantic_model.build_number):
-            # print(f"Job run: {pydantic_model.name} (#{pydantic_model.build_number}) already exists in the database. Updating...")
-            # update the job run
-            job_run_collection.update_one(
-                {"fullDisplayName": pydantic_model.name, "buildNumber": pydantic_model.build_number},
-                {"$set": pydantic_model.model_dump(by_alias=True, exclude_unset=False)},
+        return job_collection, UpdateOne({"jobName": pydantic_model.job_name}, {"$set": document}, upsert=True)
+    return job_run_collection, UpdateOne(
+        {"jobName": pydantic_model.job_name, "buildNumber": pydantic_model.build_number},
+        {"$set": document, "$unset": {"consoleOutput": ""}},
+        upsert=True,
+    )
+
+
+def _bulk_upsert(collection: Collection, operations: List[UpdateOne]) -> Tuple[Dict[int, object], List[Dict]]:
+    """Run upserts unordered and return the ids of the inserted documents and the errors, by operation index."""
+    try:
+        return collection.bulk_write(operations, ordered=False).upserted_ids, []
+    except BulkWriteError as e:
+        upserted_ids = {upserted["index"]: upserted["_id"] for upserted in e.details.get("upserted", [])}
+        return upserted_ids, e.details.get("writeErrors", [])
+
+
+def save_many_to_mongo(pydantic_models: List[BaseModel]) -> List[SaveResult]:
+    """
+    Save many jobs and job runs with a single unordered bulk write of upserts per collection.
+
+    Jobs are keyed on their job name and job runs on their job name and build number, so saving a job or job run
+    that already exists updates it. A job run that fails to be saved does not stop the others from being saved.
+
+    Args:
+        pydantic_models (List[BaseModel]): The Job and JobRun instances to save.
+
+    Returns:
+        List[SaveResult]: The outcome of saving every model, in the same order as the models.
+
+    Raises:
+        ValueError: If any of the models is not a Job or JobRun, or is a job run that was only partly loaded from the
+            database (see `LoadProfile`).
+    """
+    for model in pydantic_models:
+        if not isinstance(model, (Job, JobRun)):
+            raise ValueError(f"pydantic_model must be either a Job or JobRun instance, not: {model} ({type(model)})")
+        if isinstance(model, JobRun) and model.partial_fields:
+            raise ValueError(
+                f"Can not save {model.job_name} (#{model.build_number}), its {sorted(model.partial_fields)} were only "
+                'partly loaded from the database. Load it with the "full" profile to save it.'
             )
-        else:
-            # print("Saving job run to mongo")
-            document = pydantic_model.model_dump(by_alias=True, exclude_unset=False)
-            job_run_collection.insert_one(document)
-    else:
-        raise ValueError(
-            f"pydantic_model must be either a Job or JobRun instance, not: {pydantic_model} ({type(pydantic_model)})"
+    results = [
+        SaveResult(model=model, job_name=model.job_name, build_number=getattr(model, "build_number", None))
+        for model in pydantic_models
+    ]
+    documents: Dict[int, dict] = {}
+    for index, result in enumerate(results):
+        try:
+            documents[index] = _get_document(result.model)
+        except Exception as e:
+            result.outcome, result.error = "failed", f"{type(e).__name__}: {e}"
+
+    # the console logs of every job run in the batch are moved to the console log store together
+    job_run_indexes = [index for index in documents if isinstance(results[index].model, JobRun)]
+    try:
+        _move_console_output_to_log_store([documents[index] for index in job_run_indexes])
+    except Exception as e:  # e.g. the console log store could not be written to
+        for index in job_run_indexes:
+            results[index].outcome, results[index].error = "failed", f"{type(e).__name__}: {e}"
+            del documents[index]
+
+    # mapping of collection -> [(index of the result, upsert)]
+    operations: Dict[str, List[Tuple[int, UpdateOne]]] = {}
+    collections: Dict[str, Collection] = {}
+    for index, document in documents.items():
+        collection, operation = _get_upsert_operation(results[index].model, document)
+        collections[collection.name] = collection
+        operations.setdefault(collection.name, []).append((index, operation))
+
+    for collection_name, indexed_operations in operations.items():
+        upserted_ids, write_errors = _bulk_upsert(
+            collections[collection_name], [operation for _, operation in indexed_operations]
         )
-    pass
+        for operation_index in upserted_ids:
+            results[indexed_operations[operation_index][0]].outcome = "inserted"
+        for write_error in write_errors:
+            result = results[indexed_operations[write_error["index"]][0]]
+            result.outcome, result.error = "failed", write_error.get("errmsg")
+    return results
+
+
+def save_to_mongo(pydantic_model: BaseModel):
+    """Convert pydantic model to a dict and insert into MongoDB (or update it if it already exists)."""
+
+    if pydantic_model is None:
+        raise ValueError("pydantic_model must not be None")
+
+    result = save_many_to_mongo([pydantic_model])[0]
+    if not result.saved:
+        raise SaveError(f"Failed to save {result.job_name} (#{result.build_number}): {result.error}")
+
+
+class BulkSaveBuffer:
+    """
+    Buffers the jobs and job runs that a collector saves, and saves them with `save_many_to_mongo` in batches.
+
+    Thread safe, so that it can be shared by the workers of a collector.
+    """
+
+    def __init__(
+        self,
+        on_flush: Callable[[List[SaveResult]], None],
+        batch_size: int = SAVE_BATCH_SIZE,
+    ):
+        """
+        Args:
+            on_flush (Callable[[List[SaveResult]], None]): Called with the outcome of every batch that is saved.
+            batch_size (int): The number of models to buffer before they are saved.
+        """
+        self.on_flush = on_flush
+        self.batch_size = batch_size
+        self._buffer: List[BaseModel] = []
+        self._lock = threading.Lock()
+
+    def add(self, pydantic_model: BaseModel):
+        with self._lock:
+            self._buffer.append(pydantic_model)
+            if len(self._buffer) < self.batch_size:
+                return
+            batch, self._buffer = self._buffer, []
+        self._save(batch)
+
+    def flush(self):
+        """Save everything that is still buffered."""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._save(batch)
+
+    def _save(self, batch: List[BaseModel]):
+        try:
+            results = save_many_to_mongo(batch)
+        except Exception as e:  # e.g. the database is unreachable, so nothing in the batch was saved
+            results = [
+                SaveResult(
+                    model=model,
+                    job_name=model.job_name,
+                    build_number=getattr(model, "build_number", None),
+                    outcome="failed",
+                    error=f"{type(e).__name__}: {e}",
+                )
+                for model in batch
+            ]
+        self.on_flush(results)
 
 
 def get_job_from_db(job_name: str) -> Optional[Job]:
@@ -101,23 +490,113 @@ def get_job_from_db(job_name: str) -> Optional[Job]:
     return None
 
 
-def get_job_run_from_db(job_name: str, build_number: int) -> Optional[JobRun]:
-    result = get_job_run_dict(job_name, build_number)
+def get_job_run_from_db(job_name: str, build_number: int, include_console_output: bool = False) -> Optional[JobRun]:
+    result = get_job_run_dict(job_name, build_number, include_console_output=include_console_output)
     if result:
-        return create_job_run_from_data(result)
+        return _create_job_run(result, include_console_output)
     return None
 
 
 def job_run_already_exists(job_name: str, build_number: int) -> bool:
-    return get_job_run_from_db(job_name, build_number) is not None
+    return job_run_collection.find_one({"jobName": job_name, "buildNumber": build_number}, {"_id": 1}) is not None
 
 
 def get_job_dict(job_name: str) -> dict:
-    return job_collection.find_one({"fullDisplayName": {"$regex": job_name}})
+    return job_collection.find_one({"jobName": job_name})
+
+
+def get_job_run_dict(job_name: str, build_number: int, include_console_output: bool = False) -> dict:
+    return job_run_collection.find_one(
+        {"jobName": job_name, "buildNumber": build_number},
+        _get_job_run_projection(include_console_output),
+    )
+
+
+def _get_job_run_projection(include_console_output: bool) -> Optional[dict]:
+    # a copy, so that the shared projection is never changed by whoever the projection is passed to
+    return None if include_console_output else dict(CONSOLE_OUTPUT_EXCLUSION_PROJECTION)
+
+
+def _find_job_run_dicts(
+    query: dict,
+    include_console_output: bool = False,
+    profile: LoadProfile = "full",
+    batch_size: int = CURSOR_BATCH_SIZE,
+    sort: Optional[List[Tuple[str, int]]] = None,
+):
+    """Find job run documents with only the fields of the given load profile, projected by the database."""
+    if profile == "failures":
+        pipeline = [{"$match": query}]
+        if sort:
+            pipeline.append({"$sort": dict(sort)})
+        if not include_console_output:
+            pipeline.append({"$project": _get_job_run_projection(include_console_output)})
+        pipeline.append({"$addFields": {"testResults": FAILED_TEST_RESULTS_EXPRESSION}})
+        return job_run_collection.aggregate(pipeline, batchSize=batch_size)
+    if profile == "summary":
+        projection = dict(SUMMARY_EXCLUSION_PROJECTION)
+        if include_console_output:
+            del projection["consoleOutput"]
+    else:
+        projection = _get_job_run_projection(include_console_output)
+    return job_run_collection.find(query, projection, sort=sort).batch_size(batch_size)
+
+
+def _load_omitted_job_run_fields(job_run: JobRun, aliases: List[str]) -> dict:
+    # console output is read from the console log store, unless it is still stored inline by an older version
+    console_log_id = job_run.console_log_id if "consoleOutput" in aliases else None
+    stored_aliases = [alias for alias in aliases if not (alias == "consoleOutput" and console_log_id is not None)]
+    document = {}
+    if stored_aliases:
+        document = (
+            job_run_collection.find_one(
+                {"jobName": job_run.job_name, "buildNumber": job_run.build_number},
+                {alias: 1 for alias in stored_aliases},
+            )
+            or {}
+        )
+    if document.get("matrix_runs"):
+        matrix_runs = [MatrixChildRun(**run) for run in document["matrix_runs"]]
+        for run in matrix_runs:
+            _omit_console_output(run)
+        document["matrix_runs"] = matrix_runs
+    if console_log_id is not None:
+        document["consoleOutput"] = get_console_log(console_log_id)
+    return document
+
+
+def _load_omitted_matrix_child_run_fields(matrix_child_run: MatrixChildRun, aliases: List[str]) -> dict:
+    # matrix child runs are stored in their parent's document, so only their console output is ever left out
+    if "consoleOutput" not in aliases or matrix_child_run.console_log_id is None:
+        return {}
+    return {"consoleOutput": get_console_log(matrix_child_run.console_log_id)}
+
+
+def _omit_console_output(job_run: JobRun):
+    """Leave out the console output of a job run (and of its matrix child runs) so that it is loaded when accessed."""
+    if isinstance(job_run, MatrixChildRun):
+        job_run.omit_fields(["console_output"], _load_omitted_matrix_child_run_fields)
+        return
+    job_run.omit_fields(["console_output"], _load_omitted_job_run_fields)
+    # matrix child runs that were left out as well get their console output left out once they are loaded
+    for run in job_run.__dict__.get("matrix_runs") or []:
+        _omit_console_output(run)
 
 
-def get_job_run_dict(job_name: str, build_number: int) -> dict:
-    return job_run_collection.find_one({"fullDisplayName": {"$regex": job_name}, "buildNumber": build_number})
+def _create_job_run(data: dict, include_console_output: bool = False, profile: LoadProfile = "full") -> JobRun:
+    job_run = create_job_run_from_data(data)
+    if job_run is None:
+        return job_run
+    if profile == "summary":
+        omitted_fields = [name for name in SUMMARY_OMITTED_FIELDS if name in type(job_run).model_fields]
+        job_run.omit_fields(omitted_fields, _load_omitted_job_run_fields)
+    elif profile == "failures":
+        job_run.mark_partial([name for name in FAILURES_PARTIAL_FIELDS if name in type(job_run).model_fields])
+    if include_console_output:
+        load_console_output(job_run)
+    else:
+        _omit_console_output(job_run)
+    return job_run
 
 
 def create_job_run_from_data(data: dict):
@@ -138,13 +617,58 @@ def create_job_run_from_data(data: dict):
         input("Press enter to continue...")
 
 
-def get_job_runs_dict_for_job(job_name: str) -> List[Dict]:
-    result = job_run_collection.find({"fullDisplayName": {"$regex": job_name}})
-    return [doc for doc in result]
+def iter_job_runs_dict_for_job(
+    job_name: str,
+    include_console_output: bool = False,
+    profile: LoadProfile = "full",
+    batch_size: int = CURSOR_BATCH_SIZE,
+) -> Iterator[Dict]:
+    """Iterate over the job run documents of a job, fetching `batch_size` of them from the database at a time."""
+    yield from _find_job_run_dicts({"jobName": job_name}, include_console_output, profile, batch_size)
+
+
+def get_job_runs_dict_for_job(
+    job_name: str, include_console_output: bool = False, profile: LoadProfile = "full"
+) -> List[Dict]:
+    return list(iter_job_runs_dict_for_job(job_name, include_console_output=include_console_output, profile=profile))
+
+
+def iter_job_runs_for_job(
+    job_name: str,
+    include_console_output: bool = False,
+    profile: LoadProfile = "full",
+    batch_size: int = CURSOR_BATCH_SIZE,
+) -> Iterator[JobRun]:
+    """
+    Iterate over the job runs of a job without loading all of them into memory at once.
+
+    Args:
+        job_name (str): The name of the job.
+        include_console_output (bool): Whether to load the console output of the job runs.
+        profile (LoadProfile): Which fields of the job runs to load.
+        batch_size (int): The number of job runs fetched from the database per round trip.
+
+    Yields:
+        JobRun: The job runs of the job.
+    """
+    for doc in iter_job_runs_dict_for_job(job_name, include_console_output, profile, batch_size):
+        yield _create_job_run(doc, include_console_output, profile)
+
+
+def get_job_runs_for_job(
+    job_name: str, include_console_output: bool = False, profile: LoadProfile = "full"
+) -> List[JobRun]:
+    """
+    Get all job runs for a job.
 
+    Console output is not loaded unless `include_console_output` is True, since it is by far the largest part of a
+    job run. It can also be loaded later for individual job runs with `load_console_output`.
 
-def get_job_runs_for_job(job_name: str) -> List[JobRun]:
-    return [create_job_run_from_data(doc) for doc in get_job_runs_dict_for_job(job_name)]
+    The load profile (see `LoadProfile`) decides which other heavy fields are left out by the database, e.g.
+    "failures" for a failure report or "summary" for results only. Use `iter_job_runs_for_job` to go through the job
+    runs one at a time instead.
+    """
+    return list(iter_job_runs_for_job(job_name, include_console_output=include_console_output, profile=profile))
 
 
 # clear all jobs run from db
@@ -154,61 +678,341 @@ def clear_db():
 
 
 def job_exists(job_name: str) -> bool:
-    return job_collection.find_one({"fullDisplayName": job_name}) is not None
+    return job_collection.find_one({"jobName": job_name}, {"_id": 1}) is not None
 
 
 def delete_job_and_job_runs(job_name: str):
     """Delete all job runs and the job with the given name from the database."""
-    job_result = job_collection.delete_one({"fullDisplayName": job_name})
-    job_runs_result = job_run_collection.delete_many({"fullDisplayName": {"$regex": f"^{job_name} #[0-9]+"}})
+    job_result = job_collection.delete_one({"jobName": job_name})
+    job_runs_result = job_run_collection.delete_many({"jobName": job_name})
     print(
         f"Deleted job: {job_name} ({job_result.deleted_count} documents) and {job_runs_result.deleted_count} job runs"
     )
 
 
-def get_most_recent_job_run_dict(job_name: str) -> Optional[Dict]:
-    return job_run_collection.find_one({"fullDisplayName": {"$regex": job_name}}, sort=[("buildNumber", -1)])
+def get_most_recent_job_run_dict(job_name: str, include_console_output: bool = False) -> Optional[Dict]:
+    return job_run_collection.find_one(
+        {"jobName": job_name},
+        _get_job_run_projection(include_console_output),
+        sort=[("buildNumber", -1)],
+    )
 
 
-def get_most_recent_job_run(job_name: str) -> Optional[JobRun]:
-    result = get_most_recent_job_run_dict(job_name)
+def get_most_recent_job_run(job_name: str, include_console_output: bool = False) -> Optional[JobRun]:
+    result = get_most_recent_job_run_dict(job_name, include_console_output=include_console_output)
     if result:
-        return create_job_run_from_data(result)
+        return _create_job_run(result, include_console_output)
     return None
 
 
 def get_all_jobs_matching_name(job_name: str) -> List[Job]:
+    """
+    Get all jobs whose name matches a regex.
+
+    Unlike the exact lookups by job name, this can not use an index and scans every job.
+    """
     result = job_collection.find({"fullDisplayName": {"$regex": job_name}})
     return [Job(**doc) for doc in result]
 
 
-# function to get job runs for a PipelineConfig
-def get_job_runs_for_pipeline_config(pipeline_config: PipelineConfig) -> List[JobRun]:
-    job_runs = []
-    for job_name in pipeline_config.all_job_names:
-        job_runs.extend(get_job_runs_for_job(job_name))
-    return job_runs
+def get_job_runs_matching_name(job_name_pattern: str, include_console_output: bool = False) -> List[JobRun]:
+    """
+    Get all job runs whose job name matches a regex, e.g. every job run of every job of a suite.
+
+    Unlike `get_job_runs_for_job`, this can not use an index and scans every job run.
+
+    Args:
+        job_name_pattern (str): The regex to search the job names for.
+        include_console_output (bool): Whether to load the console output of the job runs.
+
+    Returns:
+        List[JobRun]: The matching job runs.
+    """
+    result = job_run_collection.find(
+        {"jobName": {"$regex": job_name_pattern}}, _get_job_run_projection(include_console_output)
+    )
+    return [_create_job_run(doc, include_console_output) for doc in result]
+
+
+ProjectJobsConfig = Union[ProjectConfig, PipelineConfig, CloudInitPipelineConfig, List[CloudInitPipelineConfig]]
+
+
+class JobRunBounds(BaseModel):
+    """Bounds on the job runs to load, applied by the database. Every bound is inclusive and optional."""
+
+    min_build_number: Optional[int] = None
+    max_build_number: Optional[int] = None
+    since: Optional[datetime] = Field(default=None, description="Only job runs that started at or after this time.")
+    until: Optional[datetime] = Field(default=None, description="Only job runs that started at or before this time.")
+
+    def to_query(self) -> dict:
+        query = {}
+        build_number_range = {
+            operator: value
+            for operator, value in [("$gte", self.min_build_number), ("$lte", self.max_build_number)]
+            if value is not None
+        }
+        if build_number_range:
+            query["buildNumber"] = build_number_range
+        timestamp_range = {
+            operator: int(value.timestamp() * 1000)
+            for operator, value in [("$gte", self.since), ("$lte", self.until)]
+            if value is not None
+        }
+        if timestamp_range:
+            query["timestamp_ms"] = timestamp_range
+        return query
+
+    @property
+    def is_time_window(self) -> bool:
+        return self.since is not None or self.until is not None
+
+
+def get_job_names_for_configs(configs: ProjectJobsConfig, test_jobs_only: bool = False) -> List[str]:
+    """
+    Resolve a project, a pipeline or cloud-init pipelines into the names of their jobs.
+
+    Args:
+        configs (ProjectJobsConfig): A ProjectConfig, PipelineConfig, CloudInitPipelineConfig or a list of
+            CloudInitPipelineConfigs.
+        test_jobs_only (bool): Only resolve the test job of every pipeline. Cloud-init jobs are all test jobs.
+
+    Returns:
+        List[str]: The job names.
+    """
+    if isinstance(configs, list):
+        return [job_name for config in configs for job_name in get_job_names_for_configs(config, test_jobs_only)]
+    if isinstance(configs, CloudInitPipelineConfig):
+        return [configs.job_name]
+    if isinstance(configs, ProjectConfig):
+        pipeline_configs = configs.pipeline_configs
+    elif isinstance(configs, PipelineConfig):
+        pipeline_configs = [configs]
+    else:
+        raise ValueError(f"Unsupported config to load job runs for: {configs} ({type(configs)})")
+    if not test_jobs_only:
+        return [job_name for pipeline_config in pipeline_configs for job_name in pipeline_config.all_job_names]
+    job_names = []
+    for pipeline_config in pipeline_configs:
+        if not pipeline_config.test_job_name:
+            raise ValueError(f"No test job name found for pipeline config: {pipeline_config}")
+        job_names.append(pipeline_config.test_job_name)
+    return job_names
+
+
+def iter_job_runs_for_jobs(
+    job_names: List[str],
+    include_console_output: bool = False,
+    profile: LoadProfile = "full",
+    bounds: Optional[JobRunBounds] = None,
+    batch_size: int = CURSOR_BATCH_SIZE,
+) -> Iterator[JobRun]:
+    """
+    Iterate over the job runs of many jobs with a single indexed query, instead of a query per job.
+
+    Job runs are ordered by job and then newest first, so all job runs of a job come one after the other (see
+    `iter_job_runs_grouped_by_job`).
+
+    Args:
+        job_names (List[str]): The names of the jobs.
+        include_console_output (bool): Whether to load the console output of the job runs.
+        profile (LoadProfile): Which fields of the job runs to load.
+        bounds (Optional[JobRunBounds]): Only load the job runs within these build numbers and/or times.
+        batch_size (int): The number of job runs fetched from the database per round trip.
+
+    Yields:
+        JobRun: The job runs of the jobs.
+    """
+    bounds = bounds or JobRunBounds()
+    query = {"jobName": {"$in": list(dict.fromkeys(job_names))}, **bounds.to_query()}
+    # sorted along the (jobName, timestamp_ms) or (jobName, buildNumber) index, whichever the bounds use
+    sort = [("jobName", DESCENDING), ("timestamp_ms" if bounds.is_time_window else "buildNumber", DESCENDING)]
+    for doc in _find_job_run_dicts(query, include_console_output, profile, batch_size, sort):
+        yield _create_job_run(doc, include_console_output, profile)
+
+
+def iter_job_runs_grouped_by_job(job_runs: Iterable[JobRun]) -> Iterator[Tuple[str, List[JobRun]]]:
+    """
+    Group job runs that are ordered by job (e.g. from `iter_job_runs_for_jobs`) into the job runs of every job.
+
+    Yields:
+        Tuple[str, List[JobRun]]: The name of a job and its job runs, one job at a time.
+    """
+    for job_name, job_runs_of_job in itertools.groupby(job_runs, key=lambda job_run: job_run.job_name):
+        yield job_name, list(job_runs_of_job)
+
+
+def iter_project_job_runs_by_job(
+    configs: ProjectJobsConfig,
+    test_jobs_only: bool = False,
+    include_console_output: bool = False,
+    profile: LoadProfile = "full",
+    bounds: Optional[JobRunBounds] = None,
+    batch_size: int = CURSOR_BATCH_SIZE,
+) -> Iterator[Tuple[str, List[JobRun]]]:
+    """
+    Stream the job runs of every job of a project, grouped by job, with a single query for the whole project.
+
+    Args:
+        configs (ProjectJobsConfig): A ProjectConfig, PipelineConfig, CloudInitPipelineConfig or a list of
+            CloudInitPipelineConfigs.
+        test_jobs_only (bool): Only load the job runs of the test job of every pipeline.
+        include_console_output (bool): Whether to load the console output of the job runs.
+        profile (LoadProfile): Which fields of the job runs to load.
+        bounds (Optional[JobRunBounds]): Only load the job runs within these build numbers and/or times.
+        batch_size (int): The number of job runs fetched from the database per round trip.
+
+    Yields:
+        Tuple[str, List[JobRun]]: The name of a job and its job runs (newest first), one job at a time. Jobs without
+            any job runs within the bounds are left out.
+
+    Example:
+        from datetime import datetime, timedelta
+
+        bounds = db.JobRunBounds(since=datetime.now() - timedelta(days=7))
+        configs = CloudInitPipelineConfig.generate_all_configs()
+        for job_name, job_runs in db.iter_project_job_runs_by_job(configs, profile="failures", bounds=bounds):
+            ...
+    """
+    job_names = get_job_names_for_configs(configs, test_jobs_only=test_jobs_only)
+    job_runs = iter_job_runs_for_jobs(job_names, include_console_output, profile, bounds, batch_size)
+    yield from iter_job_runs_grouped_by_job(job_runs)
+
+
+def get_project_job_runs_by_job(
+    configs: ProjectJobsConfig,
+    test_jobs_only: bool = False,
+    include_console_output: bool = False,
+    profile: LoadProfile = "full",
+    bounds: Optional[JobRunBounds] = None,
+) -> Dict[str, List[JobRun]]:
+    """Get the job runs of every job of a project with a single query, see `iter_project_job_runs_by_job`."""
+    return dict(
+        iter_project_job_runs_by_job(
+            configs,
+            test_jobs_only=test_jobs_only,
+            include_console_output=include_console_output,
+            profile=profile,
+            bounds=bounds,
+        )
+    )
+
+
+def iter_job_runs_for_pipeline_config(
+    pipeline_config: PipelineConfig,
+    include_console_output: bool = False,
+    profile: LoadProfile = "full",
+    batch_size: int = CURSOR_BATCH_SIZE,
+) -> Iterator[JobRun]:
+    yield from iter_job_runs_for_jobs(
+        pipeline_config.all_job_names, include_console_output, profile, batch_size=batch_size
+    )
+
+
+def get_job_runs_for_pipeline_config(
+    pipeline_config: PipelineConfig, include_console_output: bool = False, profile: LoadProfile = "full"
+) -> List[JobRun]:
+    return list(
+        iter_job_runs_for_pipeline_config(
+            pipeline_config, include_console_output=include_console_output, profile=profile
+        )
+    )
 
 
-def get_test_job_runs_for_pipeline_config(pipeline_config: PipelineConfig) -> List[TestMatrixJobRun]:
+def iter_test_job_runs_for_pipeline_config(
+    pipeline_config: PipelineConfig,
+    include_console_output: bool = False,
+    profile: LoadProfile = "full",
+    batch_size: int = CURSOR_BATCH_SIZE,
+) -> Iterator[TestMatrixJobRun]:
     test_job_name = pipeline_config.test_job_name
     if not test_job_name:
         raise ValueError(f"No test job name found for pipeline config: {pipeline_config}")
-    return [job_run for job_run in get_job_runs_for_job(test_job_name) if isinstance(job_run, TestMatrixJobRun)]
+    for job_run in iter_job_runs_for_job(test_job_name, include_console_output, profile, batch_size):
+        if isinstance(job_run, TestMatrixJobRun):
+            yield job_run
+
+
+def get_test_job_runs_for_pipeline_config(
+    pipeline_config: PipelineConfig, include_console_output: bool = False, profile: LoadProfile = "full"
+) -> List[TestMatrixJobRun]:
+    return list(
+        iter_test_job_runs_for_pipeline_config(
+            pipeline_config, include_console_output=include_console_output, profile=profile
+        )
+    )
+
+
+def iter_test_job_runs_for_project(
+    project_config: ProjectConfig,
+    include_console_output: bool = False,
+    profile: LoadProfile = "full",
+    batch_size: int = CURSOR_BATCH_SIZE,
+) -> Iterator[TestMatrixJobRun]:
+    """
+    Iterate over the test job runs of every pipeline of a project without loading all of them into memory at once.
+
+    Args:
+        project_config (ProjectConfig): The project to get the test job runs of.
+        include_console_output (bool): Whether to load the console output of the job runs.
+        profile (LoadProfile): Which fields of the job runs to load.
+        batch_size (int): The number of job runs fetched from the database per round trip.
+
+    Yields:
+        TestMatrixJobRun: The test job runs of the project, ordered by job (see `iter_job_runs_for_jobs`).
+    """
+    test_job_names = get_job_names_for_configs(project_config, test_jobs_only=True)
+    for job_run in iter_job_runs_for_jobs(test_job_names, include_console_output, profile, batch_size=batch_size):
+        if isinstance(job_run, TestMatrixJobRun):
+            yield job_run
+
+
+def get_test_job_runs_for_project(
+    project_config: ProjectConfig, include_console_output: bool = False, profile: LoadProfile = "full"
+) -> List[TestMatrixJobRun]:
+    return list(
+        iter_test_job_runs_for_project(project_config, include_console_output=include_console_output, profile=profile)
+    )
+
+
+def iter_job_runs_for_project(
+    project_config: ProjectConfig,
+    include_console_output: bool = False,
+    profile: LoadProfile = "full",
+    batch_size: int = CURSOR_BATCH_SIZE,
+) -> Iterator[JobRun]:
+    yield from iter_job_runs_for_jobs(
+        project_config.all_job_names, include_console_output, profile, batch_size=batch_size
+    )
+
+
+def get_job_runs_for_project(
+    project_config: ProjectConfig, include_console_output: bool = False, profile: LoadProfile = "full"
+) -> List[JobRun]:
+    return list(
+        iter_job_runs_for_project(project_config, include_console_output=include_console_output, profile=profile)
+    )
 
 
-def get_test_job_runs_for_project(project_config: ProjectConfig) -> List[TestMatrixJobRun]:
-    test_job_runs = []
-    for pipeline_config in tqdm.tqdm(project_config.pipeline_configs, desc="Downloading test job runs per pipeline"):
-        test_job_runs.extend(get_test_job_runs_for_pipeline_config(pipeline_config))
-    return test_job_runs
+T = TypeVar("T")
 
 
-def get_job_runs_for_project(project_config: ProjectConfig) -> List[JobRun]:
-    job_runs = []
-    for pipeline_config in project_config.pipeline_configs:
-        job_runs.extend(get_job_runs_for_pipeline_config(pipeline_config))
-    return job_runs
+def iter_in_chunks(items: Iterable[T], chunk_size: int = CURSOR_BATCH_SIZE) -> Iterator[List[T]]:
+    """
+    Group the items of an iterator (e.g. `iter_job_runs_for_project`) into lists of up to `chunk_size` items.
+
+    Example:
+        for job_runs in db.iter_in_chunks(db.iter_job_runs_for_project(project_config), chunk_size=50):
+            ...
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
 def _update_existing_entries_with_family_field():
@@ -233,10 +1037,517 @@ def _update_existing_entries_with_family_field():
             print(f"Updated job run: {name} with family: {family}")
 
 
+def _get_job_name_of_document(document: dict) -> str:
+    return get_job_name_from_url(document.get("url") or "") or document["fullDisplayName"].split("#")[0].strip()
+
+
+def _backfill_job_name_field():
+    """
+    Add the jobName field, which every lookup by job name uses, to the job and job run documents that were saved
+    before it existed, and correct the job names of jobs that were saved with the "/api/json" of their url in it.
+    """
+    query = {"$or": [{"jobName": {"$exists": False}}, {"jobName": {"$regex": "/api/[a-z]+$"}}]}
+    for collection in [job_collection, job_run_collection]:
+        documents_missing_job_name = collection.find(query, {"url": 1, "fullDisplayName": 1})
+        operations = []
+        for document in tqdm.tqdm(documents_missing_job_name, desc=f"Backfilling job names of {collection.name}"):
+            operations.append(
+                UpdateOne({"_id": document["_id"]}, {"$set": {"jobName": _get_job_name_of_document(document)}})
+            )
+            if len(operations) >= BACKFILL_BATCH_SIZE:
+                collection.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+
+
+def _move_existing_console_output_to_log_store():
+    """
+    Move the console output stored inline in existing job run documents to the console log store.
+    """
+    job_runs_with_console_output = job_run_collection.find(
+        {"$or": [{"consoleOutput": {"$ne": None}}, {"matrix_runs.consoleOutput": {"$ne": None}}]},
+        {"consoleOutput": 1, "matrix_runs": 1},
+    )
+    # console output is large, so job runs are moved in batches of the size the collectors save them in
+    for job_runs in iter_in_chunks(
+        tqdm.tqdm(job_runs_with_console_output, desc="Moving console output to the console log store"),
+        chunk_size=SAVE_BATCH_SIZE,
+    ):
+        _move_console_output_to_log_store(job_runs)
+        operations = []
+        for job_run in job_runs:
+            update_fields = {key: job_run[key] for key in ["consoleLogId", "matrix_runs"] if key in job_run}
+            update = {"$unset": {"consoleOutput": ""}}
+            if update_fields:
+                update["$set"] = update_fields
+            operations.append(UpdateOne({"_id": job_run["_id"]}, update))
+        job_run_collection.bulk_write(operations, ordered=False)
+
+
+def backfill_extracted_fields(field_names: Optional[List[str]] = None):
+    """
+    Extract fields from the console output of existing job runs that were collected before their extractor existed.
+
+    Runs once for the built-in extractors as a migration (see `migrate_db`). Run it again after registering a new
+    extractor to fill in its field for the job runs that are already in the database.
+
+    Args:
+        field_names (Optional[List[str]]): The fields to backfill. Defaults to every registered extractor.
+    """
+    field_names = field_names or list(extractors.EXTRACTORS)
+    job_runs_missing_fields = job_run_collection.find(
+        {"$or": [{f"extractedFields.{field_name}": {"$exists": False}} for field_name in field_names]},
+        {"consoleOutput": 1, "consoleLogId": 1, "extractedFields": 1},
+    )
+    operations = []
+    for job_run in tqdm.tqdm(job_runs_missing_fields, desc=f"Backfilling extracted fields: {field_names}"):
+        console_output = job_run.get("consoleOutput")
+        if console_output is None and job_run.get("consoleLogId") is not None:
+            console_output = get_console_log(job_run["consoleLogId"])
+        extracted_fields = extractors.extract_fields(console_output, field_names)
+        if extracted_fields:
+            operations.append(
+                UpdateOne(
+                    {"_id": job_run["_id"]},
+                    {"$set": {f"extractedFields.{name}": value for name, value in extracted_fields.items()}},
+                )
+            )
+        if len(operations) >= BACKFILL_BATCH_SIZE:
+            job_run_collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        job_run_collection.bulk_write(operations, ordered=False)
+
+
+def get_job_runs_by_extracted_field(
+    field_name: str, value: str, job_name: Optional[str] = None, include_console_output: bool = False
+) -> List[JobRun]:
+    """
+    Get the job runs whose console output contained the given value for an extracted field (see `extractors`).
+
+    Args:
+        field_name (str): The name of the extracted field, e.g. "cloudInitVersion".
+        value (str): The value of the field to match.
+        job_name (Optional[str]): Only get job runs of the job with this name.
+        include_console_output (bool): Whether to load the console output of the job runs.
+
+    Returns:
+        List[JobRun]: The matching job runs.
+    """
+    query = {f"extractedFields.{field_name}": value}
+    if job_name is not None:
+        query["jobName"] = job_name
+    return [
+        _create_job_run(doc, include_console_output)
+        for doc in job_run_collection.find(query, _get_job_run_projection(include_console_output))
+    ]
+
+
 def get_all_fetched_build_numbers_for_job(job_name: str) -> List[int]:
-    result = job_run_collection.find({"fullDisplayName": {"$regex": job_name}}, {"buildNumber": 1})
+    result = job_run_collection.find({"jobName": job_name}, {"_id": 0, "buildNumber": 1})
+    return [doc["buildNumber"] for doc in result]
+
+
+def get_recent_job_run_timestamps(job_name: str, limit: int = 10) -> List[int]:
+    """Get the start timestamps (in ms) of the `limit` most recent job runs of a job, newest first."""
+    result = job_run_collection.find(
+        {"jobName": job_name},
+        {"timestamp_ms": 1},
+        sort=[("buildNumber", -1)],
+        limit=limit,
+    )
+    return [doc["timestamp_ms"] for doc in result if doc.get("timestamp_ms") is not None]
+
+def _get_build_journal_id(job_name: str, build_number: int) -> str:
+    return f"{job_name}#{build_number}"
+
+
+def get_job_sync_journal(job_name: str) -> Optional[Dict]:
+    """
+    Get the sync journal entry of a job.
+
+    The entry has a "status" of "in_progress" while the job is being synced (or if the sync was interrupted),
+    "complete" if every build was synced and "incomplete" if some builds failed to sync. It also records the
+    "lastCompletedBuildNumber" of the job when the sync started and the "pendingBuildNumbers" left to sync.
+    """
+    # job entries are keyed by the job name (see `start_job_sync`)
+    return sync_journal_collection.find_one({"_id": job_name})
+
+
+def start_job_sync(job_name: str, build_numbers: List[int], last_completed_build_number: Optional[int]):
+    """
+    Record in the sync journal that a sync of the given builds of a job has started.
+    """
+    now = datetime.now()
+    sync_journal_collection.update_one(
+        {"_id": job_name},
+        {
+            "$set": {
+                "type": "job",
+                "jobName": job_name,
+                "status": "in_progress",
+                "startedAt": now,
+                "finishedAt": None,
+                "lastCompletedBuildNumber": last_completed_build_number,
+                "pendingBuildNumbers": sorted(build_numbers, reverse=True),
+            }
+        },
+        upsert=True,
+    )
+    operations = [
+        UpdateOne(
+            {"_id": _get_build_journal_id(job_name, build_number)},
+            {
+                "$set": {"type": "build", "jobName": job_name, "buildNumber": build_number, "updatedAt": now},
+                "$setOnInsert": {"status": "pending", "attempts": 0, "lastError": None},
+            },
+            upsert=True,
+        )
+        for build_number in build_numbers
+    ]
+    if operations:
+        sync_journal_collection.bulk_write(operations, ordered=False)
+
+
+def record_builds_synced(job_name: str, build_numbers: List[int]):
+    """Record in the sync journal that builds of a job were synced and saved to the database, in one bulk write."""
+    if not build_numbers:
+        return
+    now = datetime.now()
+    sync_journal_collection.bulk_write(
+        [
+            UpdateOne(
+                {"_id": _get_build_journal_id(job_name, build_number)},
+                {
+                    "$set": {
+                        "type": "build",
+                        "jobName": job_name,
+                        "buildNumber": build_number,
+                        "status": "done",
+                        "updatedAt": now,
+                    }
+                },
+                upsert=True,
+            )
+            for build_number in build_numbers
+        ]
+        + [UpdateOne({"_id": job_name}, {"$pull": {"pendingBuildNumbers": {"$in": build_numbers}}})],
+        ordered=False,
+    )
+
+
+def record_build_sync_failure(job_name: str, build_number: int, error: Exception) -> Dict:
+    """
+    Record in the sync journal that a build failed to sync.
+
+    Once a build has failed MAX_BUILD_SYNC_ATTEMPTS times it is quarantined so that it is no longer retried and
+    does not block the rest of the job from syncing.
+
+    Returns:
+        Dict: The updated sync journal entry of the build.
+    """
+    entry = sync_journal_collection.find_one_and_update(
+        {"_id": _get_build_journal_id(job_name, build_number)},
+        {
+            "$set": {
+                "type": "build",
+                "jobName": job_name,
+                "buildNumber": build_number,
+                "status": "failed",
+                "lastError": f"{type(error).__name__}: {error}",
+                "updatedAt": datetime.now(),
+            },
+            "$inc": {"attempts": 1},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    if entry["attempts"] >= MAX_BUILD_SYNC_ATTEMPTS:
+        entry = sync_journal_collection.find_one_and_update(
+            {"_id": entry["_id"]},
+            {"$set": {"status": "quarantined"}},
+            return_document=ReturnDocument.AFTER,
+        )
+        sync_journal_collection.update_one({"_id": job_name}, {"$pull": {"pendingBuildNumbers": build_number}})
+    return entry
+
+
+def finish_job_sync(job_name: str):
+    """Record in the sync journal that a sync of a job has finished, whether or not every build was synced."""
+    journal = get_job_sync_journal(job_name) or {}
+    status = "incomplete" if journal.get("pendingBuildNumbers") else "complete"
+    sync_journal_collection.update_one(
+        {"_id": job_name},
+        {"$set": {"status": status, "finishedAt": datetime.now()}},
+    )
+
+
+def get_quarantined_build_numbers(job_name: str) -> List[int]:
+    result = sync_journal_collection.find(
+        {"type": "build", "jobName": job_name, "status": "quarantined"}, {"buildNumber": 1}
+    )
     return [doc["buildNumber"] for doc in result]
 
+
+def get_quarantined_builds(job_name: Optional[str] = None) -> List[Dict]:
+    """Get the sync journal entries of all quarantined builds, optionally only for a single job."""
+    query = {"type": "build", "status": "quarantined"}
+    if job_name is not None:
+        query["jobName"] = job_name
+    return list(sync_journal_collection.find(query))
+
+
+def release_quarantined_builds(job_name: Optional[str] = None) -> int:
+    """
+    Release quarantined builds so that they are retried by the next sync.
+
+    Returns:
+        int: The number of builds that were released.
+    """
+    query = {"type": "build", "status": "quarantined"}
+    if job_name is not None:
+        query["jobName"] = job_name
+    result = sync_journal_collection.update_many(query, {"$set": {"status": "failed", "attempts": 0}})
+    return result.modified_count
+
+
+def get_incomplete_job_syncs() -> List[str]:
+    """Get the names of all jobs whose last sync was interrupted or did not sync every build."""
+    result = sync_journal_collection.find(
+        {"type": "job", "status": {"$in": ["in_progress", "incomplete"]}}, {"jobName": 1}
+    )
+    return [doc["jobName"] for doc in result]
+
+
+def ensure_indexes():
+    """
+    Create the indexes used by the collectors if they do not exist yet.
+
+    The unique index on job runs guarantees that a build is never stored twice, even if two collector workers end
+    up saving it at the same time. If the database already contains duplicate job runs, the index cannot be created
+    and a warning is printed instead.
+
+    Every lookup by job name is an exact match on the jobName field, so that it is served by the (jobName, ...)
+    indexes. Documents saved before the jobName field existed get it from `migrate_db`, which has to run first.
+    """
+    work_queue_collection.create_index([("status", ASCENDING), ("priority", ASCENDING)])
+    work_queue_collection.create_index([("status", ASCENDING), ("leaseExpiresAt", ASCENDING)])
+    work_queue_collection.create_index([("jobName", ASCENDING), ("status", ASCENDING)])
+    # quarantined and failed builds are looked up by type, job name and status
+    sync_journal_collection.create_index([("type", ASCENDING), ("jobName", ASCENDING), ("status", ASCENDING)])
+    for field_name in extractors.EXTRACTORS:
+        job_run_collection.create_index([(f"extractedFields.{field_name}", ASCENDING)], sparse=True)
+    job_run_collection.create_index([("jobName", ASCENDING), ("timestamp_ms", ASCENDING)])
+    unique_indexes = [
+        (job_run_collection, [("jobName", ASCENDING), ("buildNumber", ASCENDING)]),
+        (job_collection, [("jobName", ASCENDING)]),
+    ]
+    for collection, keys in unique_indexes:
+        try:
+            collection.create_index(keys, unique=True)
+        except OperationFailure as e:
+            print(f"[db] Failed to create unique index on {collection.name}, remove the duplicates first: {e}")
+
+
+# one-time migrations of documents saved by older versions, applied in order by `migrate_db`. Every migration is
+# recorded in the migration collection once it finished, so it only ever runs once per database.
+MIGRATIONS: List[Tuple[str, Callable[[], None]]] = [
+    ("backfill_job_name_field", _backfill_job_name_field),
+    ("backfill_extracted_fields", backfill_extracted_fields),
+    # after the extracted fields, so that they are extracted from the inline console output that is still loaded
+    ("move_console_output_to_log_store", _move_existing_console_output_to_log_store),
+]
+
+
+def migrate_db():
+    """
+    Apply the migrations in `MIGRATIONS` that were not applied to the database yet.
+
+    Migrations are idempotent, so two processes that start at the same time may both apply a migration safely.
+    """
+    applied_migrations = {doc["_id"] for doc in migration_collection.find({}, {"_id": 1})}
+    for migration_name, migration in MIGRATIONS:
+        if migration_name in applied_migrations:
+            continue
+        print(f"[db] Applying migration: {migration_name}")
+        migration()
+        migration_collection.update_one({"_id": migration_name}, {"$set": {"appliedAt": datetime.now()}}, upsert=True)
+
+
+_db_prepared = threading.Event()
+_prepare_db_lock = threading.Lock()
+
+
+def prepare_db():
+    """
+    Apply the pending migrations and create the missing indexes.
+
+    Called by the collector, sync, watch and worker entry points before they write to the database, and only does the
+    work once per process. Reads do not need it, so importing this module never touches the database. Can also be
+    run on its own with `python -m cpc_jank_db.db prepare`.
+    """
+    with _prepare_db_lock:
+        if _db_prepared.is_set():
+            return
+        try:
+            migrate_db()
+            ensure_indexes()
+        except OperationFailure as e:
+            print(f"[db] Failed to migrate the database or create its indexes, older documents may not be found: {e}")
+            return
+        _db_prepared.set()
+
+
+def enqueue_work_items(items: List[Dict]) -> int:
+    """
+    Add (job, build) work items to the shared work queue that collector workers claim work from.
+
+    Items that are already in the queue (whatever their status) are left untouched.
+
+    Args:
+        items (List[Dict]): The work items to add. Each item must have a "jobName" and "buildNumber", and may have
+            a "priority" (lower is claimed first), "jobRunType" and "jobRunApiJson".
+
+    Returns:
+        int: The number of items that were added.
+    """
+    now = datetime.now()
+    operations = [
+        UpdateOne(
+            {"_id": _get_build_journal_id(item["jobName"], item["buildNumber"])},
+            {
+                "$setOnInsert": {
+                    "jobName": item["jobName"],
+                    "buildNumber": item["buildNumber"],
+                    "priority": item.get("priority", ""),
+                    "jobRunType": item.get("jobRunType"),
+                    "jobRunApiJson": item.get("jobRunApiJson"),
+                    "status": "queued",
+                    "attempts": 0,
+                    "leaseOwner": None,
+                    "leaseExpiresAt": None,
+                    "lastError": None,
+                    "createdAt": now,
+                }
+            },
+            upsert=True,
+        )
+        for item in items
+    ]
+    if not operations:
+        return 0
+    return work_queue_collection.bulk_write(operations, ordered=False).upserted_count
+
+
+def claim_work_item(
+    worker_id: str, lease_seconds: float, max_attempts: int = MAX_BUILD_SYNC_ATTEMPTS
+) -> Optional[Dict]:
+    """
+    Atomically claim the highest priority work item that is queued or whose lease has expired.
+
+    Items whose lease expired on their last attempt are marked as failed instead of being claimed again, so that a
+    job run that keeps killing its workers is not retried forever.
+
+    Args:
+        worker_id (str): The unique id of the worker claiming the item.
+        lease_seconds (float): How long the worker may hold the item before it has to renew the lease.
+        max_attempts (int): The number of times an item may be claimed before it is marked as failed.
+
+    Returns:
+        Optional[Dict]: The claimed work item, or None if there is no work left to claim.
+    """
+    now = datetime.now()
+    work_queue_collection.update_many(
+        {"status": "leased", "leaseExpiresAt": {"$lt": now}, "attempts": {"$gte": max_attempts}},
+        {
+            "$set": {
+                "status": "failed",
+                "leaseOwner": None,
+                "leaseExpiresAt": None,
+                "lastError": f"LeaseExpired: lease expired on attempt {max_attempts} of {max_attempts}",
+            }
+        },
+    )
+    return work_queue_collection.find_one_and_update(
+        {
+            "attempts": {"$lt": max_attempts},
+            "$or": [{"status": "queued"}, {"status": "leased", "leaseExpiresAt": {"$lt": now}}],
+        },
+        {
+            "$set": {
+                "status": "leased",
+                "leaseOwner": worker_id,
+                "leaseExpiresAt": now + timedelta(seconds=lease_seconds),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("priority", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def renew_work_item_lease(item_id: str, worker_id: str, lease_seconds: float) -> bool:
+    """
+    Extend the lease of a work item held by a worker.
+
+    Returns:
+        bool: False if the worker no longer holds the lease (e.g. it expired and another worker claimed the item).
+    """
+    result = work_queue_collection.update_one(
+        {"_id": item_id, "status": "leased", "leaseOwner": worker_id},
+        {"$set": {"leaseExpiresAt": datetime.now() + timedelta(seconds=lease_seconds)}},
+    )
+    return result.matched_count == 1
+
+
+def complete_work_item(item_id: str, worker_id: str) -> bool:
+    """
+    Mark a work item as done.
+
+    Returns:
+        bool: False if the worker no longer holds the lease of the item.
+    """
+    result = work_queue_collection.update_one(
+        {"_id": item_id, "status": "leased", "leaseOwner": worker_id},
+        {"$set": {"status": "done", "leaseExpiresAt": None, "finishedAt": datetime.now()}},
+    )
+    return result.matched_count == 1
+
+
+def fail_work_item(item_id: str, worker_id: str, error: Exception, max_attempts: int = MAX_BUILD_SYNC_ATTEMPTS) -> bool:
+    """
+    Release a work item that failed so that it is retried, or mark it as failed once it used up its attempts.
+
+    Returns:
+        bool: False if the worker no longer holds the lease of the item.
+    """
+    item = work_queue_collection.find_one({"_id": item_id, "leaseOwner": worker_id, "status": "leased"})
+    if item is None:
+        return False
+    status = "failed" if item["attempts"] >= max_attempts else "queued"
+    result = work_queue_collection.update_one(
+        {"_id": item_id, "status": "leased", "leaseOwner": worker_id},
+        {
+            "$set": {
+                "status": status,
+                "leaseOwner": None,
+                "leaseExpiresAt": None,
+                "lastError": f"{type(error).__name__}: {error}",
+            }
+        },
+    )
+    return result.matched_count == 1
+
+
+def count_open_work_items(job_name: Optional[str] = None) -> int:
+    """Count the work items that are queued or leased, optionally only for a single job."""
+    query = {"status": {"$in": ["queued", "leased"]}}
+    if job_name is not None:
+        query["jobName"] = job_name
+    return work_queue_collection.count_documents(query)
+
+
 # function to pull the entire MongoDB instance to a local file that can be applied to a different MongoDB instance
 # to migrate the database
 def dump_mongo_db():
@@ -250,7 +1561,12 @@ def push_mongo_db():
     subprocess.run(["tar", "-xzvf", "mongo_dump.tar.gz"])
     subprocess.run(["mongorestore", "--drop", "mongo_dump"])
 
+
 if __name__ == "__main__":
+    if sys.argv[1:] == ["prepare"]:
+        prepare_db()
+        sys.exit()
+
     # print out list of all job names in the db and then also print out the number of job runs stored for each job
     # all_jobs = job_collection.find({})
     # for job in all_jobs:
@@ -0,0 +1,106 @@
+"""
+Module for the registry of fields that are extracted from the console output of job runs when they are collected.
+
+Every line of a job run's full console output is passed through the registered extractors while it is streamed from
+Jenkins (see `jenkins.ConsoleOutputWindow`), and the first value each extractor finds is stored on the job run as
+`extracted_fields` (the "extractedFields" field of the job run document, which is indexed per extractor by
+`db.prepare_db`). Analysis and queries can then use these values without loading or scanning console logs.
+
+Example:
+    from cpc_jank_db import db
+    from cpc_jank_db.extractors import register_regex_extractor
+
+    # stored as extractedFields.kernelVersion on every job run collected from now on
+    register_regex_extractor("kernelVersion", r"Linux version (\\S+)")
+    # and on the job runs that are already in the database
+    db.backfill_extracted_fields(["kernelVersion"])
+"""
+
+import re
+from typing import Callable, Dict, List, Optional
+
+# mapping of field name -> callable that takes in a line of console output and returns the value of the field if the
+# line contains it, otherwise None
+EXTRACTORS: Dict[str, Callable[[str], Optional[str]]] = {}
+
+CLOUD_INIT_VERSION_FIELD = "cloudInitVersion"
+
+
+def register_extractor(field_name: str, extract: Callable[[str], Optional[str]]):
+    """
+    Register an extractor for a field of the console output.
+
+    Args:
+        field_name (str): The name the extracted value is stored under in the job run's extracted fields.
+        extract (Callable[[str], Optional[str]]): Callable that takes in a line of console output and returns the
+            value of the field if the line contains it, otherwise None. Only the first value found is kept.
+    """
+    EXTRACTORS[field_name] = extract
+
+
+def register_regex_extractor(field_name: str, pattern: str, group: int = 1):
+    """
+    Register an extractor that stores a group of the first line of console output that matches a regex.
+
+    Args:
+        field_name (str): The name the extracted value is stored under in the job run's extracted fields.
+        pattern (str): The regex to search every line of console output for.
+        group (int): The group of the match to store.
+    """
+    compiled_pattern = re.compile(pattern)
+
+    def extract(line: str) -> Optional[str]:
+        match = compiled_pattern.search(line)
+        return match.group(group) if match else None
+
+    register_extractor(field_name, extract)
+
+
+# for a line like: `cloud-init version: /usr/bin/cloud-init 99.daily-202503112148-3da7eca87~ubuntu20.04.1`
+# we want "99.daily-202503112148-3da7eca87~ubuntu20.04.1"
+register_regex_extractor(CLOUD_INIT_VERSION_FIELD, r"cloud-init version: /usr/bin/cloud-init (.+)")
+
+
+class ConsoleFieldExtraction:
+    """Runs the registered extractors over the lines of a single console output."""
+
+    def __init__(self, extractors: Optional[Dict[str, Callable[[str], Optional[str]]]] = None):
+        """
+        Args:
+            extractors (Optional[Dict[str, Callable[[str], Optional[str]]]]): The extractors to run. Defaults to
+                every registered extractor.
+        """
+        self._pending = dict(EXTRACTORS if extractors is None else extractors)
+        self.fields: Dict[str, str] = {}
+
+    def handle_line(self, line: str):
+        """Line handler to pass to `jenkins.ConsoleOutputWindow`."""
+        if not self._pending:
+            return
+        for field_name, extract in list(self._pending.items()):
+            value = extract(line)
+            if value is not None:
+                self.fields[field_name] = value
+                del self._pending[field_name]
+
+
+def extract_fields(console_output: Optional[str], field_names: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    Run the registered extractors over a console output that is already loaded.
+
+    Args:
+        console_output (Optional[str]): The console output to extract fields from.
+        field_names (Optional[List[str]]): The fields to extract. Defaults to every registered extractor.
+
+    Returns:
+        Dict[str, str]: mapping of field name -> extracted value, for every field that was found.
+    """
+    if not console_output:
+        return {}
+    extractors = EXTRACTORS if field_names is None else {name: EXTRACTORS[name] for name in field_names}
+    extraction = ConsoleFieldExtraction(extractors)
+    for line in console_output.split("\n"):
+        extraction.handle_line(line)
+        if len(extraction.fields) == len(extractors):
+            break
+    return extraction.fields
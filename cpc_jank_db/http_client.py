@@ -0,0 +1,336 @@
+"""
+Module for the shared HTTP session used to talk to the Jenkins API.
+
+The session keeps connections alive in a pool that is shared by every thread, retries transient failures with
+exponential backoff, and records latency stats per endpoint so that slow parts of a sync can be spotted.
+
+Every request also goes through an adaptive concurrency limiter (AIMD, like TCP congestion control): the number of
+requests allowed in flight grows slowly while Jenkins responds quickly and is cut in half as soon as Jenkins responds
+slowly or asks us to back off (429/503), so a sync runs as fast as the Jenkins controller can safely handle.
+
+Example:
+    from cpc_jank_db.http_client import JenkinsSession
+
+    session = JenkinsSession(auth=("username", "api-token"), pool_size=32)
+    response = session.get("https://jenkins.example.com/api/json", endpoint="fetch jobs")
+    print(session.get_stats())
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TIMEOUT = (10.0, 300.0)  # (connect timeout, read timeout) in seconds
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_MAX_BACKOFF = 30.0
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+THROTTLE_STATUS_CODES = (429, 503)
+
+DEFAULT_INITIAL_CONCURRENCY = 4
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_TARGET_LATENCY = 5.0  # seconds to receive the response headers before a request is considered slow
+DEFAULT_DECREASE_FACTOR = 0.5
+DEFAULT_DECREASE_COOLDOWN = 2.0  # seconds during which repeated throttles only count as a single decrease
+
+
+class EndpointStats(BaseModel):
+    """Latency and error stats for all requests made to a single endpoint."""
+
+    request_count: int = 0
+    error_count: int = 0
+    retry_count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def average_seconds(self) -> float:
+        if self.request_count == 0:
+            return 0.0
+        return self.total_seconds / self.request_count
+
+
+class ConcurrencyStats(BaseModel):
+    """Snapshot of the state of an AdaptiveConcurrencyLimiter."""
+
+    current_limit: float
+    max_limit: int
+    in_flight: int
+    in_flight_per_host: Dict[str, int]
+    throttle_events: int
+    slow_response_events: int
+    decrease_events: int
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits the number of requests in flight using additive-increase/multiplicative-decrease (AIMD).
+
+    The limit grows by roughly one for every `limit` requests that are answered within the target latency, and is
+    multiplied by `decrease_factor` when a request is throttled (429/503), fails to connect or is slower than the
+    target latency. The limit never goes past `max_limit` (the global cap), and no single host ever has more than its
+    per host cap of requests in flight.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = DEFAULT_INITIAL_CONCURRENCY,
+        min_limit: int = DEFAULT_MIN_CONCURRENCY,
+        max_limit: int = DEFAULT_POOL_SIZE,
+        per_host_limit: Optional[int] = None,
+        per_host_limits: Optional[Dict[str, int]] = None,
+        target_latency: float = DEFAULT_TARGET_LATENCY,
+        decrease_factor: float = DEFAULT_DECREASE_FACTOR,
+        decrease_cooldown: float = DEFAULT_DECREASE_COOLDOWN,
+    ):
+        """
+        Args:
+            initial_limit (int): The number of requests allowed in flight to start with.
+            min_limit (int): The lowest the limit is ever decreased to.
+            max_limit (int): The global cap on the number of requests in flight.
+            per_host_limit (Optional[int]): The default cap on the number of requests in flight to a single host.
+                Defaults to `max_limit`.
+            per_host_limits (Optional[Dict[str, int]]): Caps for specific hosts (e.g. "jenkins.example.com").
+            target_latency (float): Requests slower than this many seconds decrease the limit.
+            decrease_factor (float): The limit is multiplied by this on every decrease.
+            decrease_cooldown (float): Seconds after a decrease during which further slow or throttled responses do
+                not decrease the limit again, since they were likely sent before the last decrease.
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.per_host_limit = per_host_limit or max_limit
+        self.per_host_limits = per_host_limits or {}
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._in_flight = 0
+        self._in_flight_per_host: Dict[str, int] = {}
+        self._throttle_events = 0
+        self._slow_response_events = 0
+        self._decrease_events = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def _get_host_limit(self, host: str) -> int:
+        return self.per_host_limits.get(host, self.per_host_limit)
+
+    def _has_capacity(self, host: str) -> bool:
+        return self._in_flight < int(self._limit) and self._in_flight_per_host.get(host, 0) < self._get_host_limit(
+            host
+        )
+
+    def _take_slot(self, host: str):
+        self._in_flight += 1
+        self._in_flight_per_host[host] = self._in_flight_per_host.get(host, 0) + 1
+
+    def acquire(self, host: str):
+        with self._condition:
+            self._condition.wait_for(lambda: self._has_capacity(host))
+            self._take_slot(host)
+
+    def try_acquire(self, host: str) -> bool:
+        """Take a slot only if one is free right away, for callers that must not block (e.g. an event loop)."""
+        with self._condition:
+            if not self._has_capacity(host):
+                return False
+            self._take_slot(host)
+            return True
+
+    def release(self, host: str, latency: float, throttled: bool = False, failed: bool = False):
+        """
+        Release a slot taken by `acquire` and adjust the limit based on how the request went.
+
+        Args:
+            host (str): The host the request was made to.
+            latency (float): How many seconds the request took.
+            throttled (bool): Whether Jenkins asked us to back off (e.g. 429/503 response).
+            failed (bool): Whether the request failed to connect or timed out.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            self._in_flight_per_host[host] -= 1
+            slow = latency > self.target_latency
+            if throttled:
+                self._throttle_events += 1
+            elif slow:
+                self._slow_response_events += 1
+
+            if throttled or failed or slow:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.decrease_cooldown:
+                    self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+                    self._decrease_events += 1
+                    self._last_decrease = now
+            else:
+                self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, host: str):
+        """
+        Context manager that holds a slot for the duration of a request.
+
+        Yields a dict in which the caller should set "throttled" and/or "failed" to True if the request was
+        throttled or failed before the slot is released.
+        """
+        self.acquire(host)
+        outcome = {"throttled": False, "failed": False}
+        start = time.monotonic()
+        try:
+            yield outcome
+        finally:
+            self.release(host, time.monotonic() - start, throttled=outcome["throttled"], failed=outcome["failed"])
+
+    def get_stats(self) -> ConcurrencyStats:
+        with self._condition:
+            return ConcurrencyStats(
+                current_limit=self._limit,
+                max_limit=self.max_limit,
+                in_flight=self._in_flight,
+                in_flight_per_host={host: n for host, n in self._in_flight_per_host.items() if n},
+                throttle_events=self._throttle_events,
+                slow_response_events=self._slow_response_events,
+                decrease_events=self._decrease_events,
+            )
+
+
+class JenkinsSession:
+    """
+    Thread-safe, keep-alive HTTP session with retries for the Jenkins API.
+
+    A single instance is meant to be shared by every thread making requests so that connections are reused from
+    the same pool instead of doing a new TCP+TLS handshake for every request.
+    """
+
+    def __init__(
+        self,
+        auth: Optional[Tuple[str, str]] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+    ):
+        """
+        Args:
+            auth (Optional[Tuple[str, str]]): The (username, password) basic auth to send with every request.
+            pool_size (int): The maximum number of connections kept alive per host.
+            timeout (Tuple[float, float]): The (connect, read) timeouts in seconds for every request.
+            max_retries (int): The number of times a request is retried after a retryable failure.
+            backoff_factor (float): The base delay in seconds between retries. Doubles after every attempt.
+            max_backoff (float): The maximum delay in seconds between retries.
+            limiter (Optional[AdaptiveConcurrencyLimiter]): The limiter every request goes through. Defaults to an
+                AdaptiveConcurrencyLimiter capped at `pool_size` requests in flight.
+        """
+        self.limiter = limiter or AdaptiveConcurrencyLimiter(max_limit=pool_size)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+        self._session = requests.Session()
+        self._session.auth = auth
+        # retries are done by this class so that every attempt is visible to the stats
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0, pool_block=True)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._stats: Dict[str, EndpointStats] = {}
+        self._stats_lock = threading.Lock()
+
+    def _get_backoff_seconds(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        # honor the Retry-After header if jenkins tells us how long to wait
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return min(float(response.headers["Retry-After"]), self.max_backoff)
+        return min(self.backoff_factor * (2**attempt), self.max_backoff)
+
+    def _record(self, endpoint: str, seconds: float, error: bool = False, retry: bool = False):
+        with self._stats_lock:
+            stats = self._stats.setdefault(endpoint, EndpointStats())
+            stats.request_count += 1
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            if error:
+                stats.error_count += 1
+            if retry:
+                stats.retry_count += 1
+
+    def get(self, url: str, endpoint: str = "default", **kwargs) -> requests.Response:
+        """
+        Make a GET request, retrying on 5xx/429 responses and connection errors with exponential backoff.
+
+        Args:
+            url (str): The url to fetch.
+            endpoint (str): The name the latency stats for this request are recorded under.
+            **kwargs: Any extra keyword arguments are passed on to `requests.Session.get`.
+
+        Returns:
+            requests.Response: The last response received. This may still be an error response if all retries
+                were used up.
+
+        Raises:
+            requests.RequestException: If the last attempt failed with a connection error or timeout.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).netloc
+        for attempt in range(self.max_retries + 1):
+            will_retry = attempt < self.max_retries
+            try:
+                response = self._send(url, host, endpoint, will_retry, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not will_retry:
+                    raise e
+                time.sleep(self._get_backoff_seconds(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and will_retry:
+                response.close()
+                time.sleep(self._get_backoff_seconds(attempt, response))
+                continue
+            return response
+
+    def _send(self, url: str, host: str, endpoint: str, will_retry: bool, **kwargs) -> requests.Response:
+        """Make a single attempt at a request while holding a slot of the concurrency limiter."""
+        with self.limiter.slot(host) as outcome:
+            # time spent waiting for a slot is not part of the latency of the endpoint
+            start = time.monotonic()
+            try:
+                response = self._session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                outcome["failed"] = True
+                self._record(endpoint, time.monotonic() - start, error=True, retry=will_retry)
+                raise
+            outcome["throttled"] = response.status_code in THROTTLE_STATUS_CODES
+            self._record(
+                endpoint,
+                time.monotonic() - start,
+                error=response.status_code >= 400,
+                retry=will_retry and response.status_code in RETRY_STATUS_CODES,
+            )
+            return response
+
+    def get_stats(self) -> Dict[str, EndpointStats]:
+        """Returns a snapshot of the latency stats recorded for each endpoint."""
+        with self._stats_lock:
+            return {endpoint: stats.model_copy() for endpoint, stats in self._stats.items()}
+
+    def get_concurrency_stats(self) -> ConcurrencyStats:
+        """Returns the current concurrency limit and throttle events of the limiter every request goes through."""
+        return self.limiter.get_stats()
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+    def close(self):
+        self._session.close()
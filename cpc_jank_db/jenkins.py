@@ -1,14 +1,28 @@
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Literal, Optional, Tuple, get_args
 
-import diskcache
 import dotenv
 import requests
+from pydantic import BaseModel
 from tqdm import tqdm
 
-from cpc_jank_db import db
-from cpc_jank_db.models import Job, JobRun, MatrixJobRun, TestJobRun, TestMatrixJobRun
+from cpc_jank_db import cache as jenkins_cache
+from cpc_jank_db import db, extractors, http_client, json_stream
+from cpc_jank_db.models import (
+    FAILED_TEST_CASE_STATUSES,
+    PASSED_TEST_CASE_STATUSES,
+    Job,
+    JobRun,
+    MatrixJobRun,
+    TestCase,
+    TestJobRun,
+    TestMatrixJobRun,
+    TestSuite,
+)
+from cpc_jank_db.pipeline import Pipeline, Stage
 
 dotenv.load_dotenv()
 
@@ -30,7 +44,123 @@ if JENKINS_SSO_URL is None:
 if auth[0] is None or auth[1] is None:
     raise ValueError("JENKINS_API_USERNAME or JENKINS_API_PASSWORD not set in .env file")
 
-cache = diskcache.Cache(".disk-cache")
+cache = jenkins_cache.JenkinsCache(
+    directory=os.getenv("JENKINS_CACHE_DIR", jenkins_cache.DEFAULT_DIRECTORY),
+    size_limit=int(os.getenv("JENKINS_CACHE_SIZE_LIMIT_MB", str(jenkins_cache.DEFAULT_SIZE_LIMIT_BYTES // 1024**2)))
+    * 1024**2,
+)
+
+
+def _job_run_ttl(data: dict) -> Optional[float]:
+    # completed job runs are immutable and can be cached forever
+    if data and data.get("result") is not None and not data.get("building"):
+        return None
+    return jenkins_cache.IN_PROGRESS_TTL_SECONDS
+
+
+def _matrix_child_runs_ttl(child_runs: Optional[List[dict]]) -> Optional[float]:
+    if child_runs is not None and all(child_run.get("result") is not None for child_run in child_runs):
+        return None
+    return jenkins_cache.IN_PROGRESS_TTL_SECONDS
+
+
+def get_cache_stats() -> jenkins_cache.CacheStats:
+    """Returns the hit/miss/size stats of the Jenkins API response cache."""
+    return cache.get_stats()
+
+# fields fetched for every job run from the Jenkins API
+JOB_RUN_FIELDS = [
+    "url",
+    "actions[_class,parameters[name,value]]",
+    "fullDisplayName",
+    "number",
+    "description",
+    "timestamp",
+    "duration",
+    "result",
+    "building",
+    "runs[url]",
+]
+JOB_FIELDS = [
+    "url",
+    "fullDisplayName",
+    "description",
+    "lastCompletedBuild[number]",
+    "lastBuild[number]",
+    "builds[number]",
+]
+JOB_PROBE_FIELDS = ["lastBuild[number]", "lastCompletedBuild[number]"]
+# fields of every job (and folder) fetched by job discovery
+JOB_DISCOVERY_FIELDS = ["name", "url", "_class", "lastBuild[number]", "lastCompletedBuild[number]"]
+# number of levels of folders that job discovery looks into (the tree query parameter can not recurse by itself)
+JOB_DISCOVERY_MAX_FOLDER_DEPTH = int(os.getenv("JENKINS_JOB_DISCOVERY_MAX_FOLDER_DEPTH", "3"))
+# `_class`es of the items that contain jobs but have no builds themselves
+JOB_FOLDER_CLASSES = [
+    "com.cloudbees.hudson.plugins.folder.Folder",
+    "jenkins.branch.OrganizationFolder",
+    "org.jenkinsci.plugins.workflow.multibranch.WorkflowMultiBranchProject",
+]
+# only the fields of a test report that TestResult, TestSuite and TestCase use
+TEST_CASE_FIELDS = ["className", "name", "status", "duration", "skipped", "errorDetails", "errorStackTrace"]
+TEST_SUITE_FIELDS = ["cases[" + ",".join(TEST_CASE_FIELDS) + "]", "duration", "id", "name", "nodeId", "timestamp"]
+TEST_RESULT_COUNT_FIELDS = ["duration", "empty", "failCount", "passCount", "skipCount"]
+
+# which test cases of a test report are kept:
+# "full" keeps every test case, "failures" only keeps failed and skipped test cases, "counts" keeps no test cases
+# and only the pass/fail/skip counts (the test cases are then not downloaded at all)
+TestReportRetention = Literal["full", "failures", "counts"]
+TEST_REPORT_RETENTION: TestReportRetention = os.getenv("JENKINS_TEST_REPORT_RETENTION", "full")
+if TEST_REPORT_RETENTION not in get_args(TestReportRetention):
+    raise ValueError(
+        f"JENKINS_TEST_REPORT_RETENTION must be one of {get_args(TestReportRetention)}, not: {TEST_REPORT_RETENTION}"
+    )
+HARVESTED_ERROR_TEXT_FIELDS = ["suites[cases[className,name,status,errorDetails,errorStackTrace]]"]
+
+# console output longer than this is truncated to its first and last CONSOLE_OUTPUT_MAX_CHARS characters
+CONSOLE_OUTPUT_MAX_CHARS = 1000000
+CONSOLE_OUTPUT_TRUNCATION_MARKER = "\n\n... TRUNCATED BY CPC-JANK-DB ...\n\n"
+CONSOLE_OUTPUT_CHUNK_SIZE = 64 * 1024
+JSON_STREAM_CHUNK_SIZE = 64 * 1024
+
+# number of builds fetched per request when fetching job run data in bulk
+BULK_JOB_RUNS_PAGE_SIZE = 100
+
+# maximum number of matrix child runs fetched at the same time for a single matrix job run
+MATRIX_CHILD_MAX_WORKERS = int(os.getenv("JENKINS_MATRIX_CHILD_MAX_WORKERS", "8"))
+
+# shared keep-alive session used for every request to the Jenkins API
+session = http_client.JenkinsSession(
+    auth=auth,
+    pool_size=int(os.getenv("JENKINS_HTTP_POOL_SIZE", str(http_client.DEFAULT_POOL_SIZE))),
+)
+
+
+def configure_http_session(**kwargs) -> http_client.JenkinsSession:
+    """
+    Replace the shared Jenkins API session with a new one using the given settings.
+
+    Args:
+        **kwargs: Keyword arguments passed on to `JenkinsSession` (e.g. pool_size, timeout, max_retries,
+            backoff_factor, limiter).
+
+    Returns:
+        JenkinsSession: The new shared session.
+    """
+    global session  # noqa: PLW0603
+    old_session = session
+    session = http_client.JenkinsSession(auth=auth, **kwargs)
+    old_session.close()
+    return session
+
+
+def get_http_stats() -> dict[str, http_client.EndpointStats]:
+    """Returns the latency stats recorded per endpoint by the shared Jenkins API session."""
+    return session.get_stats()
+
+
+def get_concurrency_stats() -> http_client.ConcurrencyStats:
+    """Returns the current adaptive concurrency limit and throttle events of the shared Jenkins API session."""
+    return session.get_concurrency_stats()
 
 
 suites = {
@@ -99,20 +229,48 @@ def _get_job_from_api(url: str) -> dict:
     """
 
     url = _convert_to_api_url(url)
-    url = _append_tree_query_param(
-        url,
-        [
-            "url",
-            "fullDisplayName",
-            "description",
-            "lastCompletedBuild[number]",
-            "builds[number]",
-        ],
-    )
+    url = _append_tree_query_param(url, JOB_FIELDS)
     return _fetch_json(url, attempted_action="fetch job data")
 
 
-@cache.memoize()
+# DO NOT CACHE - the whole point is to see if the job changed
+def _probe_job_from_api(url: str) -> dict:
+    """
+    Fetch only the last build numbers of a job from the Jenkins API.
+
+    This is a much smaller request than `_get_job_from_api` and is used to check if a job has changed before
+    fetching all of its data.
+    """
+    url = _convert_to_api_url(url)
+    url = _append_tree_query_param(url, JOB_PROBE_FIELDS)
+    return _fetch_json(url, attempted_action="probe job")
+
+
+def _get_build_number(data: dict, key: str) -> Optional[int]:
+    return (data.get(key) or {}).get("number")
+
+
+def _job_has_changed(job: Job, probe: Optional[dict] = None) -> bool:
+    """
+    Check if a job has new builds since it was last saved, using a single small request.
+
+    Jobs saved before the last build number was recorded are always considered changed.
+
+    Args:
+        job (Job): The job as it was last saved.
+        probe (Optional[dict]): The result of `_probe_job_from_api` for the job if it was already fetched.
+    """
+    if job.last_build_number is None:
+        return True
+    if probe is None:
+        probe = _probe_job_from_api(job.url)
+    return (
+        _get_build_number(probe, "lastBuild") != job.last_build_number
+        or _get_build_number(probe, "lastCompletedBuild") != job.last_completed_build_number
+    )
+
+
+@cache.memoize(ttl_for=_job_run_ttl)
 def _get_job_run_from_api(url: str) -> dict:
     """
     Fetch job run data from the Jenkins API.
@@ -121,27 +279,162 @@ def _get_job_run_from_api(url: str) -> dict:
     """
 
     url = _convert_to_api_url(url)
-    url = _append_tree_query_param(
-        url,
-        [
-            "url",
-            "actions[_class,parameters[name,value]]",
-            "fullDisplayName",
-            "number",
-            "description",
-            "timestamp",
-            "duration",
-            "result",
-            "runs[url]",
-        ],
-    )
+    url = _append_tree_query_param(url, JOB_RUN_FIELDS)
     return _fetch_json(url, attempted_action="fetch job run data")
 
 
-def _fetch_test_job_results(job_name: str, build_number: int):
-    url = f"{JENKINS_API_URL}/job/{job_name}/{build_number}/testReport"
-    url = _convert_to_api_url(url)
-    return _fetch_json(url, attempted_action="fetch test job results")
+def _get_job_runs_page_from_api(job_name: str, start: int, end: int) -> List[dict]:
+    """
+    Fetch the job run data of a range of builds of a job in a single request.
+
+    Uses a range specifier on the job's allBuilds tree query so that the same fields as `_get_job_run_from_api` are
+    fetched for every build in the range. Builds are ordered newest first.
+
+    Args:
+        job_name (str): The name of the job.
+        start (int): The index (inclusive) of the first build to fetch, where 0 is the newest build.
+        end (int): The index (exclusive) of the last build to fetch.
+
+    Returns:
+        List[dict]: The job run data of each build in the range.
+    """
+    url = _convert_to_api_url(_make_url_from_job_name(job_name))
+    url = _append_tree_query_param(url, ["allBuilds[" + ",".join(JOB_RUN_FIELDS) + "]{" + f"{start},{end}" + "}"])
+    return _fetch_json(url, attempted_action="fetch job run data in bulk").get("allBuilds") or []
+
+
+def _iter_job_runs_from_api(job_name: str, page_size: int = BULK_JOB_RUNS_PAGE_SIZE) -> Iterator[dict]:
+    """
+    Page through the job run data of every build of a job, newest first, `page_size` builds per request.
+    """
+    start = 0
+    while True:
+        page = _get_job_runs_page_from_api(job_name, start, start + page_size)
+        yield from page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+def _fetch_job_run_jsons_in_bulk(
+    job_name: str, build_numbers: List[int], page_size: int = BULK_JOB_RUNS_PAGE_SIZE
+) -> Dict[int, dict]:
+    """
+    Fetch the job run data of the given builds of a job using as few requests as possible.
+
+    Only completed builds are returned, builds that are still running are left for the per build requests.
+
+    Args:
+        job_name (str): The name of the job.
+        build_numbers (List[int]): The build numbers to fetch the job run data for.
+        page_size (int): The number of builds to fetch per request.
+
+    Returns:
+        Dict[int, dict]: The job run data of each build that was found, keyed by build number.
+    """
+    remaining = set(build_numbers)
+    results = {}
+    if not remaining:
+        return results
+    oldest_build_number = min(remaining)
+    for data in _iter_job_runs_from_api(job_name, page_size=page_size):
+        if data["number"] in remaining and data.get("result") is not None:
+            results[data["number"]] = data
+            remaining.discard(data["number"])
+        # builds are ordered newest first so there is nothing left to find past the oldest build
+        if not remaining or data["number"] <= oldest_build_number:
+            break
+    return results
+
+
+def _get_test_report_fields(retention: TestReportRetention, matrix: bool = False) -> List[str]:
+    """
+    Get the tree query fields of a test report that are needed for the given retention.
+
+    Args:
+        retention (TestReportRetention): Which test cases of the test report are kept.
+        matrix (bool): Whether the test report is the aggregated test report of a matrix job run.
+
+    Returns:
+        List[str]: The fields to pass to `_append_tree_query_param`.
+    """
+    result_fields = list(TEST_RESULT_COUNT_FIELDS)
+    if retention != "counts":
+        result_fields.append("suites[" + ",".join(TEST_SUITE_FIELDS) + "]")
+    if not matrix:
+        return result_fields
+    return [
+        "failCount",
+        "skipCount",
+        "totalCount",
+        "childReports[child[number,url],result[" + ",".join(result_fields) + "]]",
+    ]
+
+
+def _get_test_report_converters(retention: TestReportRetention, matrix: bool = False) -> Dict[str, Callable]:
+    """
+    Get the converters that turn the test suites and test cases of a streamed test report into models one at a time,
+    dropping the test cases that are not kept by the given retention.
+
+    Args:
+        retention (TestReportRetention): Which test cases of the test report are kept.
+        matrix (bool): Whether the test report is the aggregated test report of a matrix job run.
+
+    Returns:
+        Dict[str, Callable]: The converters to pass to `StreamingJSONBuilder`.
+    """
+    result_path = "childReports.item.result" if matrix else ""
+    suites_path = f"{result_path}.suites.item" if result_path else "suites.item"
+
+    def convert_test_case(case: dict):
+        if retention == "failures" and case.get("status") in PASSED_TEST_CASE_STATUSES:
+            return json_stream.DROP
+        return TestCase.from_data(case)
+
+    def convert_test_result(test_result: dict) -> dict:
+        # suites are not fetched at all for the "counts" retention
+        test_result.setdefault("suites", [])
+        return test_result
+
+    return {
+        f"{suites_path}.cases.item": convert_test_case,
+        suites_path: TestSuite.from_data,
+        result_path: convert_test_result,
+    }
+
+
+def _get_test_report_url(job_name: str, build_number: int, retention: TestReportRetention, matrix: bool) -> str:
+    url = _convert_to_api_url(f"{JENKINS_API_URL}/job/{job_name}/{build_number}/testReport")
+    return _append_tree_query_param(url, _get_test_report_fields(retention, matrix=matrix))
+
+
+def _fetch_test_job_results(
+    job_name: str,
+    build_number: int,
+    matrix: bool = False,
+    retention: Optional[TestReportRetention] = None,
+) -> dict:
+    """
+    Fetch the test report of a job run, with only the fields that are stored.
+
+    The test report is parsed as it streams in, and every test suite and test case is turned into a model (or dropped
+    if it is not kept by the retention) as soon as it is parsed, so memory use stays flat however big the test
+    report is. See `json_stream.StreamingJSONBuilder`.
+
+    Args:
+        job_name (str): The name of the job.
+        build_number (int): The build number of the job run.
+        matrix (bool): Whether the job run is a matrix job run, whose test report aggregates its child runs.
+        retention (Optional[TestReportRetention]): Which test cases to keep. Defaults to `TEST_REPORT_RETENTION`.
+
+    Returns:
+        dict: The test report, with its test suites and test cases already built into TestSuite and TestCase models.
+    """
+    retention = retention or TEST_REPORT_RETENTION
+    url = _get_test_report_url(job_name, build_number, retention, matrix)
+    return _fetch_json_streamed(
+        url, _get_test_report_converters(retention, matrix=matrix), attempted_action="fetch test job results"
+    )
 
 
 def _fetch_env_vars(job_name: str, build_number: Optional[int] = None) -> dict:
@@ -176,7 +469,40 @@ def _get_error_texts(individual_test_report_url: str) -> Tuple[str, str]:
             "errorStackTrace",
         ],
     )
-    return _fetch_json(url, attempted_action="fetch error texts")
+    data = _fetch_json(url, attempted_action="fetch error texts")
+    return data.get("errorDetails"), data.get("errorStackTrace")
+
+
+@cache.memoize()
+def _get_harvested_error_texts(job_run_url: str) -> Dict[str, Dict[str, Tuple[str, str]]]:
+    """
+    Fetch the error details and stack traces of every failed test case of a job run in a single request.
+
+    Uses a tree query on the job run's testReport so only the fields needed to match up the failed test cases are
+    fetched, instead of making one request per failed test case to its individual test report page.
+
+    Args:
+        job_run_url (str): The url of the job run (or matrix child run) whose test report should be harvested.
+
+    Returns:
+        Dict[str, Dict[str, Tuple[str, str]]]: mapping of test case class name -> test case name ->
+            (error details, error stack trace) for every failed test case.
+    """
+    url = _convert_to_api_url(job_run_url.removesuffix("/") + "/testReport")
+    url = _append_tree_query_param(url, HARVESTED_ERROR_TEXT_FIELDS)
+    return _parse_harvested_error_texts(_fetch_json(url, attempted_action="fetch failed test case error texts"))
+
+
+def _parse_harvested_error_texts(data: dict) -> Dict[str, Dict[str, Tuple[str, str]]]:
+    error_texts: Dict[str, Dict[str, Tuple[str, str]]] = {}
+    for suite in data.get("suites") or []:
+        for case in suite.get("cases") or []:
+            if case.get("status") in FAILED_TEST_CASE_STATUSES:
+                error_texts.setdefault(case["className"], {})[case["name"]] = (
+                    case.get("errorDetails"),
+                    case.get("errorStackTrace"),
+                )
+    return error_texts
 
 
 def _make_url_from_job_name(job_name: str) -> str:
@@ -197,11 +523,16 @@ def _convert_to_api_url(url: str) -> str:
     return r
 
 
+def _get_console_text_url(url: str) -> str:
+    url = _convert_to_api_url(url)
+    return url.removesuffix("/api/json").removesuffix("/") + "/consoleText"
+
+
 def _fetch_json(url: str, attempted_action: Optional[str] = None) -> dict:
     url = _convert_to_api_url(url)
     r: Optional[requests.Response] = None
     try:
-        r = requests.get(url, auth=auth)
+        r = session.get(url, endpoint=attempted_action or "fetch data")
         if r.status_code == 200:
             return r.json()
         else:
@@ -213,41 +544,181 @@ def _fetch_json(url: str, attempted_action: Optional[str] = None) -> dict:
             raise JenkinsAPIError(url=url, response=r, attempted_action=attempted_action, root_cause=e)
 
 
-def _fetch_text(url: str, attempted_action: Optional[str] = None) -> str:
+def _feed_response_to_json_builder(
+    url: str, r: requests.Response, builder: json_stream.StreamingJSONBuilder, attempted_action: str
+):
+    if r.status_code != 200:
+        raise JenkinsAPIError(url=url, response=r, attempted_action=attempted_action)
+    for chunk in r.iter_content(chunk_size=JSON_STREAM_CHUNK_SIZE):
+        builder.feed(chunk)
+
+
+def _fetch_json_streamed(url: str, converters: Dict[str, Callable], attempted_action: str = "fetch data"):
+    """
+    Fetch a JSON document and build it as it streams in, converting parts of it as soon as they are parsed.
+
+    Args:
+        url (str): The url to fetch.
+        converters (Dict[str, Callable]): The converters to pass to `json_stream.StreamingJSONBuilder`.
+        attempted_action (str): What is being fetched, used in error messages and the http stats.
+
+    Returns:
+        The built JSON document.
+    """
     url = _convert_to_api_url(url)
+    builder = json_stream.StreamingJSONBuilder(converters)
     r: Optional[requests.Response] = None
     try:
-        r = requests.get(url, auth=auth)
-        if r.status_code == 200:
-            return r.text
-        else:
-            raise JenkinsAPIError(url=url, response=r, attempted_action="fetch text")
+        with session.get(url, endpoint=attempted_action, stream=True) as r:
+            _feed_response_to_json_builder(url, r, builder, attempted_action)
+        return builder.finish()
     except Exception as e:
+        if isinstance(e, JenkinsAPIError):
+            raise e
         raise JenkinsAPIError(url=url, response=r, attempted_action=attempted_action, root_cause=e)
 
 
-@cache.memoize()
-def _fetch_console_output(url: str) -> str:
-    url = _convert_to_api_url(url)
-    url = url.removesuffix("/api/json").removesuffix("/") + "/consoleText"
-    return _fetch_text(url, attempted_action="fetch console output")
+def _fetch_matrix_child_run(child_run_url: str) -> dict:
+    """
+    Fetch and parse a single matrix child run including its console output.
+    """
+    job_run_dict = _parse_job_run_info(_get_job_run_from_api(child_run_url))
+    extraction = extractors.ConsoleFieldExtraction()
+    job_run_dict["consoleOutput"] = _fetch_console_output_window(
+        job_run_dict["url"], line_handlers=[extraction.handle_line]
+    )
+    job_run_dict["extractedFields"] = extraction.fields
+    return job_run_dict
 
 
-@cache.memoize()
-def _fetch_matrix_child_runs(matrix_job_run_url: str) -> List[dict]:
+class ConsoleOutputWindow:
+    """
+    Incrementally builds the (possibly truncated) console output of a job run from chunks of text.
+
+    Only the first and last `max_chars` characters are ever held in memory, so the full console output never has to
+    be loaded at once. Every complete line is also passed to the line handlers as it streams past, so that fields
+    can be extracted from the full console output and not just from the kept window.
+    """
+
+    def __init__(self, max_chars: int = CONSOLE_OUTPUT_MAX_CHARS, line_handlers: Optional[List[Callable]] = None):
+        self.max_chars = max_chars
+        self.line_handlers = line_handlers or []
+        self.total_chars = 0
+        self._head: List[str] = []
+        self._head_chars = 0
+        self._tail: deque = deque()
+        self._tail_chars = 0
+        self._partial_line = ""
+
+    def feed(self, chunk: str):
+        if not chunk:
+            return
+        self.total_chars += len(chunk)
+
+        if self._head_chars < self.max_chars:
+            head_part = chunk[: self.max_chars - self._head_chars]
+            self._head.append(head_part)
+            self._head_chars += len(head_part)
+
+        self._tail.append(chunk)
+        self._tail_chars += len(chunk)
+        while self._tail_chars - len(self._tail[0]) >= self.max_chars:
+            self._tail_chars -= len(self._tail.popleft())
+
+        if self.line_handlers:
+            lines = (self._partial_line + chunk).split("\n")
+            self._partial_line = lines.pop()
+            for line in lines:
+                self._handle_line(line)
+
+    def _handle_line(self, line: str):
+        for line_handler in self.line_handlers:
+            line_handler(line)
+
+    def finish(self) -> str:
+        """Flush any remaining partial line to the line handlers and return the console output window."""
+        if self._partial_line:
+            self._handle_line(self._partial_line)
+            self._partial_line = ""
+        head = "".join(self._head)
+        if self.total_chars <= self.max_chars:
+            return head
+        tail = "".join(self._tail)[-self.max_chars :]
+        return head + CONSOLE_OUTPUT_TRUNCATION_MARKER + tail
+
+
+def _feed_response_to_console_output_window(url: str, r: requests.Response, window: ConsoleOutputWindow):
+    if r.status_code != 200:
+        raise JenkinsAPIError(url=url, response=r, attempted_action="fetch console output")
+    if r.encoding is None:
+        r.encoding = "utf-8"
+    for chunk in r.iter_content(chunk_size=CONSOLE_OUTPUT_CHUNK_SIZE, decode_unicode=True):
+        window.feed(chunk)
+
+
+def _fetch_console_output_window(
+    url: str,
+    max_chars: int = CONSOLE_OUTPUT_MAX_CHARS,
+    line_handlers: Optional[List[Callable]] = None,
+) -> str:
+    """
+    Stream the console output of a job run and return it, truncated to its first and last `max_chars` characters.
+
+    The console output is read in chunks and never held in memory in full. It is not cached, since only the kept
+    window ends up in the job run anyway.
+
+    Args:
+        url (str): The url of the job run.
+        max_chars (int): The number of characters to keep from the start and from the end of the console output.
+        line_handlers (Optional[List[Callable]]): Callables that are each called with every line of the full
+            console output as it is streamed.
+
+    Returns:
+        str: The console output, truncated if it is longer than `max_chars` characters.
+    """
+    url = _get_console_text_url(url)
+    window = ConsoleOutputWindow(max_chars=max_chars, line_handlers=line_handlers)
+    r: Optional[requests.Response] = None
+    try:
+        with session.get(url, endpoint="fetch console output", stream=True) as r:
+            _feed_response_to_console_output_window(url, r, window)
+    except Exception as e:
+        if isinstance(e, JenkinsAPIError):
+            raise e
+        raise JenkinsAPIError(url=url, response=r, attempted_action="fetch console output", root_cause=e)
+    return window.finish()
+
+
+@cache.memoize(ttl_for=_matrix_child_runs_ttl)
+def _fetch_matrix_child_runs(
+    matrix_job_run_url: str, child_run_urls: List[str], max_workers: int = MATRIX_CHILD_MAX_WORKERS
+) -> List[dict]:
+    """
+    Fetch all child runs of a matrix job run.
+
+    The child runs are fetched concurrently by up to `max_workers` threads, but are returned in the same order as
+    they are listed in the parent job run.
+
+    Args:
+        matrix_job_run_url (str): The url of the parent matrix job run.
+        child_run_urls (List[str]): The urls of the child runs, as listed in the "runs" of the parent job run data
+            that was already fetched.
+        max_workers (int): The maximum number of child runs to fetch at the same time.
+
+    Returns:
+        List[dict]: The parsed job run info (with console output) of each child run.
+    """
     try:
-        parent_job_data = _get_job_run_from_api(matrix_job_run_url)
-        if parent_job_data:
-            parsed_job_runs = [
-                _parse_job_run_info(_get_job_run_from_api(run["url"])) for run in parent_job_data["runs"]
-            ]
-            for job_run_dict in parsed_job_runs:
-                job_run_dict["consoleOutput"] = _fetch_console_output(job_run_dict["url"])
-            return parsed_job_runs
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(child_run_urls)))) as executor:
+            return list(executor.map(_fetch_matrix_child_run, child_run_urls))
     except Exception as e:
         raise Exception(f"Failed to fetch matrix child runs from {matrix_job_run_url}") from e
 
 
+def _get_matrix_child_run_urls(job_run_api_json: dict) -> List[str]:
+    return [run["url"] for run in job_run_api_json["runs"]]
+
+
 def _parse_job_run_info(data: dict) -> dict:
     """
     Parse job run info from the Jenkins API json object.
@@ -315,13 +786,11 @@ def _fetch_job_run_json_from_name_and_build(job_name: str, build_number: int) ->
 def collect_job(job_name: str) -> Job:
     # print(f"Collecting job info from API: {job_name}")
     url = _make_url_from_job_name(job_name) + "api/json"
+    return _parse_job_object_from_api_json(url, _get_job_from_api(url))
 
-    data = _get_job_from_api(url)
 
-    if data.get("lastCompletedBuild"):
-        last_completed_build_number = data.get("lastCompletedBuild").get("number")
-    else:
-        last_completed_build_number = None
+def _parse_job_object_from_api_json(url: str, data: dict) -> Job:
+    last_completed_build_number = _get_build_number(data, "lastCompletedBuild")
     r = Job(
         url=url,
         fullDisplayName=data["fullDisplayName"],
@@ -329,83 +798,157 @@ def collect_job(job_name: str) -> Job:
         description=data.get("description"),
         buildNumbers=[entry["number"] for entry in data.get("builds", [])],
         lastCompletedBuildNumber=last_completed_build_number,
+        lastBuildNumber=_get_build_number(data, "lastBuild"),
     )
     return r
 
 
-def collect_job_run(
+def _has_matrix_test_results(job_run_api_json: dict) -> bool:
+    # if one of the actions has hudson.tasks.test.MatrixTestResult as its _class, then it is a TestMatrixJobRun
+    return any(
+        action.get("_class") == "hudson.tasks.test.MatrixTestResult" for action in job_run_api_json.get("actions") or []
+    )
+
+
+def _fetch_job_run_data(
     job_name: str,
     build_number: int,
     job_run_type: Optional[type[JobRun]] = None,
-) -> JobRun | MatrixJobRun | TestMatrixJobRun | TestJobRun:
-    # print(f"Collecting job run: {job_name} (#{build_number})")
-    job_run_api_json = _fetch_job_run_json_from_name_and_build(job_name=job_name, build_number=build_number)
-    job_run = _parse_job_run_object_from_api_json(job_run_api_json)
-    console_output = _fetch_console_output(job_run.url)
+    job_run_api_json: Optional[dict] = None,
+) -> dict:
+    """
+    Fetch everything that belongs to a job run from the API, without building the job run from it yet.
+
+    This is the network bound part of `collect_job_run`. The returned data is turned into a job run by
+    `_build_job_run`.
+
+    Args:
+        job_name (str): The name of the job.
+        build_number (int): The build number of the job run.
+        job_run_type (Optional[type[JobRun]]): The type of job run to create (e.g. TestJobRun).
+        job_run_api_json (Optional[dict]): The job run data from the Jenkins API if it was already fetched.
+
+    Returns:
+        dict: The job run data from the API, its console output, the fields extracted from its console output (see
+            `extractors`), and its test results and matrix child runs if it has any.
+    """
+    if job_run_api_json is None:
+        job_run_api_json = _fetch_job_run_json_from_name_and_build(job_name=job_name, build_number=build_number)
+    # fields are extracted from the full console output while it streams past, not just from the kept window
+    extraction = extractors.ConsoleFieldExtraction()
+    data = {
+        "jobName": job_name,
+        "buildNumber": build_number,
+        "jobRunType": job_run_type,
+        "jobRunApiJson": job_run_api_json,
+        "consoleOutput": _fetch_console_output_window(job_run_api_json["url"], line_handlers=[extraction.handle_line]),
+        "extractedFields": extraction.fields,
+    }
     # if runs list exists, it is a matrix job
-    if job_run.child_runs_urls is not None:
-        # if one of the actions has hudson.tasks.test.MatrixTestResult as its _class, then it is a TestMatrixJobRun
-        if any(
-            action.get("_class") == "hudson.tasks.test.MatrixTestResult" for action in job_run_api_json.get("actions")
-        ):
+    if job_run_api_json.get("runs"):
+        if _has_matrix_test_results(job_run_api_json):
+            data["testResultsJson"] = _fetch_test_job_results(job_name, build_number, matrix=True)
+        data["matrixRuns"] = _fetch_matrix_child_runs(
+            job_run_api_json["url"], _get_matrix_child_run_urls(job_run_api_json)
+        )
+    elif job_run_type == TestJobRun:
+        # try to fetch test results url
+        try:
+            data["testResultsJson"] = _fetch_test_job_results(job_name, build_number)
+        except Exception:
+            print(f"Failed to fetch test job results for {job_name} (#{build_number})")
+            data["testResultsJson"] = None
+    return data
+
+
+def _build_job_run(data: dict) -> JobRun | MatrixJobRun | TestMatrixJobRun | TestJobRun:
+    """
+    Build a job run from the data fetched by `_fetch_job_run_data`.
+
+    Args:
+        data (dict): The data returned by `_fetch_job_run_data`.
+
+    Returns:
+        JobRun | MatrixJobRun | TestMatrixJobRun | TestJobRun: The job run, without the error texts of its failed
+            tests (see `_enrich_job_run`).
+    """
+    job_run_api_json = data["jobRunApiJson"]
+    if "matrixRuns" in data:
+        if "testResultsJson" in data:
             result = TestMatrixJobRun.from_data(
                 job_run_json=_parse_job_run_info(job_run_api_json),
-                # job_run_json=job_run.model_dump(by_alias=True, exclude_unset=True),
-                test_results_json=_fetch_test_job_results(job_name, build_number),
-                matrix_runs=_fetch_matrix_child_runs(job_run.url),
+                test_results_json=data["testResultsJson"],
+                matrix_runs=data["matrixRuns"],
             )
-            result.console_output = console_output
-            result.fetch_error_texts_for_failed_tests(_get_error_texts)
-            return result
-        # otherwise, it is a MatrixJobRun
         else:
             result = MatrixJobRun.from_data(
-                matrix_runs=_fetch_matrix_child_runs(job_run.url),
-                **job_run.model_dump(by_alias=True, exclude_unset=True),
+                matrix_runs=data["matrixRuns"],
+                **_parse_job_run_object_from_api_json(job_run_api_json).model_dump(by_alias=True, exclude_unset=True),
             )
-            result.console_output = console_output
-            return result
-    # otherwise, it is a JobRun or TestJobRun
+    elif data["jobRunType"] == TestJobRun:
+        test_job_results = data.get("testResultsJson")
+        # if test results do not exist or failCount is None, create a TestJobRun without test results
+        result = TestJobRun.from_data(
+            job_run_json=_parse_job_run_info(job_run_api_json),
+            test_results_json=(
+                test_job_results if test_job_results and test_job_results.get("failCount") is not None else None
+            ),
+        )
     else:
-        if job_run_type == TestJobRun:
-            # try to fetch test results url
-            try:
-                test_job_results = _fetch_test_job_results(job_name, build_number)
-            except Exception:
-                print(f"Failed to fetch test job results for {job_name} (#{build_number})")
-                test_job_results = None
-            if test_job_results and test_job_results.get("failCount") is not None:
-                result = TestJobRun.from_data(
-                    job_run_json=_parse_job_run_info(job_run_api_json),
-                    test_results_json=test_job_results,
-                )
-            # if test results do not exist or failCount is None, create a TestJobRun without test results
-            else:
-                result = TestJobRun.from_data(
-                    job_run_json=_parse_job_run_info(job_run_api_json),
-                    test_results_json=None,
-                )
-            if len(console_output) > 1000000:
-                # print(f"console output for {job_name} (#{build_number}) is too long ({len(console_output)} bytes). Truncating...")
-                result.console_output = (
-                    console_output[:1000000] + "\n\n... TRUNCATED BY CPC-JANK-DB ...\n\n" + console_output[-1000000:]
-                )
-            else:
-                result.console_output = console_output
-            return result
-        else:
-            job_run.console_output = console_output
-            return job_run
+        result = _parse_job_run_object_from_api_json(job_run_api_json)
+    result.console_output = data["consoleOutput"]
+    result.extracted_fields = data["extractedFields"]
+    return result
 
 
-def _fetch_and_refresh_job(job_name: str) -> Job:
+def _enrich_job_run(
+    job_run: JobRun | MatrixJobRun | TestMatrixJobRun | TestJobRun,
+) -> JobRun | MatrixJobRun | TestMatrixJobRun | TestJobRun:
+    """
+    Fetch the details that are only needed for some job runs, like the error texts of failed tests.
+    """
+    if isinstance(job_run, TestMatrixJobRun):
+        job_run.fetch_error_texts_for_failed_tests(_get_error_texts, _get_harvested_error_texts)
+    return job_run
+
+
+def collect_job_run(
+    job_name: str,
+    build_number: int,
+    job_run_type: Optional[type[JobRun]] = None,
+    job_run_api_json: Optional[dict] = None,
+) -> JobRun | MatrixJobRun | TestMatrixJobRun | TestJobRun:
+    """
+    Fetch a single job run and everything that belongs to it (console output, test results, matrix child runs).
+
+    Args:
+        job_name (str): The name of the job.
+        build_number (int): The build number of the job run.
+        job_run_type (Optional[type[JobRun]]): The type of job run to create (e.g. TestJobRun).
+        job_run_api_json (Optional[dict]): The job run data from the Jenkins API if it was already fetched (e.g. by
+            `_fetch_job_run_jsons_in_bulk`). If not given, it is fetched from the API.
+
+    Returns:
+        JobRun | MatrixJobRun | TestMatrixJobRun | TestJobRun: The collected job run.
+    """
+    # print(f"Collecting job run: {job_name} (#{build_number})")
+    data = _fetch_job_run_data(job_name, build_number, job_run_type, job_run_api_json)
+    return _enrich_job_run(_build_job_run(data))
+
+
+def _fetch_and_refresh_job(job_name: str, probe: Optional[dict] = None) -> Job:
     """
     Get newest job data from API and update existing job in the database if it exists.
+
+    If the job already exists in the database, a small probe request is made first (unless `probe` is given) and the
+    full job data is only fetched (and the job only saved) if the job has new builds.
     """
     job = db.get_job_from_db(job_name)
     if job is None:
         job = collect_job(job_name)
     else:  # update job
+        if not _job_has_changed(job, probe):
+            return job
         new_job = collect_job(job_name)
         if new_job is not None:
             # update job with new description and build numbers and update last_updated
@@ -413,23 +956,197 @@ def _fetch_and_refresh_job(job_name: str) -> Job:
             job.build_numbers = new_job.build_numbers
             job.last_updated = datetime.now()
             job.last_completed_build_number = new_job.last_completed_build_number
+            job.last_build_number = new_job.last_build_number
     db.save_to_mongo(job)
     return job
 
 
+def _record_job_run_failure(job_name: str, build_number: int, error: Exception):
+    entry = db.record_build_sync_failure(job_name, build_number, error)
+    if entry["status"] == "quarantined":
+        print(
+            f"Failed to fetch job run: {job_name} (#{build_number}) {entry['attempts']} times, quarantining it: {error}"
+        )
+    else:
+        print(f"Failed to fetch job run: {job_name} (#{build_number}) (attempt {entry['attempts']}): {error}")
+
+
+def _get_build_numbers_to_fetch(job_name: str, job: Job) -> List[int]:
+    """
+    Get the build numbers of a job that still need to be fetched, newest first.
+
+    If the job has no new completed builds since its last sync, the builds left over from that sync (e.g. because it
+    was interrupted or some builds failed) are read from the sync journal. Otherwise they are worked out from the
+    builds already in the database. Quarantined builds are never included.
+    """
+    if job.last_completed_build_number is None:
+        return []
+
+    journal = db.get_job_sync_journal(job_name)
+    if journal is not None and journal.get("lastCompletedBuildNumber") == job.last_completed_build_number:
+        # resume where the last sync stopped instead of rediscovering what was already fetched
+        return sorted(journal.get("pendingBuildNumbers") or [], reverse=True)
+
+    skipped_build_numbers = set(db.get_all_fetched_build_numbers_for_job(job_name))
+    skipped_build_numbers.update(db.get_quarantined_build_numbers(job_name))
+    build_numbers_to_fetch = [
+        build_number
+        for build_number in job.build_numbers
+        if build_number not in skipped_build_numbers and build_number <= job.last_completed_build_number
+    ]
+    # sort build numbers in descending order
+    build_numbers_to_fetch.sort(reverse=True)
+    return build_numbers_to_fetch
+
+
+def _create_job_run_save_buffer(
+    job_name: str,
+    saved_job_runs: List[JobRun],
+    on_error: Callable[[int, Exception], None],
+    progress: Optional[tqdm] = None,
+) -> db.BulkSaveBuffer:
+    """
+    Create a buffer that saves the job runs of a job in batches of `db.SAVE_BATCH_SIZE`.
+
+    Every batch that is saved is recorded as synced in the sync journal and added to `saved_job_runs`. Job runs that
+    fail to be saved are passed to `on_error` with their build number.
+    """
+
+    def on_flush(results: List[db.SaveResult]):
+        db.record_builds_synced(job_name, [result.build_number for result in results if result.saved])
+        for result in results:
+            if result.saved:
+                saved_job_runs.append(result.model)
+            else:
+                on_error(result.build_number, db.SaveError(result.error))
+        if progress is not None:
+            progress.update(sum(result.saved for result in results))
+
+    return db.BulkSaveBuffer(on_flush)
+
+
+def _collect_and_save_job_runs_serially(
+    job_name: str,
+    build_numbers: List[int],
+    job_run_type: Optional[type[JobRun]],
+    job_run_api_jsons: Dict[int, dict],
+    failed_build_numbers: List[int],
+) -> List[JobRun]:
+    """
+    Collect job runs of a job one at a time and save them in batches of `db.SAVE_BATCH_SIZE`.
+
+    Failed builds are recorded in the sync journal and added to `failed_build_numbers`.
+
+    Returns:
+        List[JobRun]: The job runs that were saved, in the order they were saved.
+    """
+    saved_job_runs: List[JobRun] = []
+    with tqdm(total=len(build_numbers), desc=f"Fetching {len(build_numbers)} job run(s) for {job_name}") as progress:
+
+        def on_error(build_number: int, error: Exception):
+            _record_job_run_failure(job_name, build_number, error)
+            failed_build_numbers.append(build_number)
+            progress.update(1)
+
+        save_buffer = _create_job_run_save_buffer(job_name, saved_job_runs, on_error, progress)
+        for build_number in build_numbers:
+            try:
+                job_run = collect_job_run(job_name, build_number, job_run_type, job_run_api_jsons.get(build_number))
+            except Exception as e:
+                on_error(build_number, e)
+                continue
+            save_buffer.add(job_run)
+        save_buffer.flush()
+    return saved_job_runs
+
+
+def _collect_and_save_job_runs_in_pipeline(
+    job_name: str,
+    build_numbers: List[int],
+    job_run_type: Optional[type[JobRun]],
+    job_run_api_jsons: Dict[int, dict],
+    max_workers: int,
+    failed_build_numbers: List[int],
+) -> List[JobRun]:
+    """
+    Collect and save job runs of a job in a pipeline of overlapping stages: fetch, parse, enrich and persist.
+
+    While some job runs are being fetched, others are already being built, having their error texts fetched, or
+    being saved to the database. The persist stage buffers job runs and saves them in batches of
+    `db.SAVE_BATCH_SIZE`. Failed builds are recorded in the sync journal and added to `failed_build_numbers`.
+    The throughput of every stage is printed at the end.
+
+    Returns:
+        List[JobRun]: The job runs that were saved, in the order they were saved.
+    """
+    progress = tqdm(
+        total=len(build_numbers),
+        desc=f"Fetching {len(build_numbers)} job run(s) for {job_name} ({max_workers} workers)",
+    )
+
+    def fetch(build_number: int) -> dict:
+        return _fetch_job_run_data(job_name, build_number, job_run_type, job_run_api_jsons.get(build_number))
+
+    def on_error(build_number: int, error: Exception):
+        _record_job_run_failure(job_name, build_number, error)
+        failed_build_numbers.append(build_number)
+        progress.update(1)
+
+    saved_job_runs: List[JobRun] = []
+    save_buffer = _create_job_run_save_buffer(job_name, saved_job_runs, on_error, progress)
+
+    collection_pipeline = Pipeline(
+        [
+            Stage("fetch", fetch, workers=max_workers),
+            Stage("parse", _build_job_run),
+            Stage("enrich", _enrich_job_run, workers=max(1, max_workers // 2)),
+            Stage("persist", save_buffer.add),
+        ],
+        queue_size=2 * max_workers,
+    )
+    try:
+        collection_pipeline.run(
+            build_numbers, on_error=lambda build_number, stage_name, error: on_error(build_number, error)
+        )
+        save_buffer.flush()
+        return saved_job_runs
+    finally:
+        progress.close()
+        for stats in collection_pipeline.get_stats():
+            print(f"[{job_name}] {stats.summary()}")
+
+
 def collect_all_job_runs(
     job_name: str,
     job_run_type: Optional[type[JobRun]] = None,
+    max_workers: int = 1,
+    bulk_metadata: bool = True,
+    probe: Optional[dict] = None,
 ) -> Tuple[Job, List[JobRun]]:
     """
     Fetch all job runs for a job and save them to the database.
 
+    Progress is recorded in the sync journal (see `db.get_job_sync_journal`) so that an interrupted or partially
+    failed sync resumes where it stopped. A job run that fails to be fetched is reported and retried by the next
+    sync, until it has failed `db.MAX_BUILD_SYNC_ATTEMPTS` times and is quarantined.
+
     Args:
         job_name (str): The name of the job to fetch job runs for.
 
         Example: "24.04-Base-Oracle-Daily-Test"
         Example: "24.04-Base-Oracle-Build-Images"
 
+        job_run_type (Optional[type[JobRun]]): The type of job run to create (e.g. TestJobRun).
+        max_workers (int): The number of job runs to fetch concurrently. Defaults to 1 (serial fetching).
+
+            When greater than 1, job runs are collected in a pipeline of overlapping stages (fetch, parse, enrich
+            and persist, see `_collect_and_save_job_runs_in_pipeline`), with `max_workers` threads fetching job runs.
+            Either way, job runs are saved to the database in batches of `db.SAVE_BATCH_SIZE`.
+        bulk_metadata (bool): Whether to fetch the job run data of all builds to fetch in bulk (a page of builds per
+            request) instead of with one request per build. Defaults to True.
+        probe (Optional[dict]): The result of `_probe_job_from_api` for the job if it was already fetched, so that
+            the job is not probed again to check if it has new builds.
+
     Returns:
         Tuple[Job, List[JobRun]]: A tuple containing the job and a list of job runs.
 
@@ -437,50 +1154,57 @@ def collect_all_job_runs(
 
             The list of job runs are the job runs that were fetched from the API, and saved to the database.
             Any job runs that already existed in the database were not saved again and will not be in the list.
+            Any job runs that failed to be fetched will not be in the list either.
     """
+    if max_workers < 1:
+        raise ValueError(f"max_workers must be at least 1, not: {max_workers}")
+    db.prepare_db()
+
     fetched_job_runs = []
-    job = _fetch_and_refresh_job(job_name)
+    job = _fetch_and_refresh_job(job_name, probe)
     if job is None:
         raise ValueError(f"Failed to fetch job: {job_name}")
 
     # if job.last_completed_build_number is None:
     # print(f"Job {job_name} has no builds. No job runs to fetch...")
 
-    # get all existing runs for this job
-    existing_build_numbers = db.get_all_fetched_build_numbers_for_job(job_name)
-    build_numbers_to_fetch = [
-        build_number
-        for build_number in job.build_numbers
-        if build_number not in existing_build_numbers and build_number <= job.last_completed_build_number
-    ]
-    # sort build numbers in descending order
-    build_numbers_to_fetch.sort(reverse=True)
+    build_numbers_to_fetch = _get_build_numbers_to_fetch(job_name, job)
 
     if len(build_numbers_to_fetch) == 0:
+        journal = db.get_job_sync_journal(job_name)
+        if journal is None or journal.get("lastCompletedBuildNumber") != job.last_completed_build_number:
+            db.start_job_sync(job_name, [], job.last_completed_build_number)
+            db.finish_job_sync(job_name)
         print(f"No new job runs to fetch for job: {job_name}")
         return job, fetched_job_runs
 
-    # if show_progress_bar:
-    #     it =
-    # else:
-    #     it = build_numbers_to_fetch
+    db.start_job_sync(job_name, build_numbers_to_fetch, job.last_completed_build_number)
 
-    for build_number in tqdm(
-        build_numbers_to_fetch,
-        desc=f"Fetching {len(build_numbers_to_fetch)} job run(s) for {job_name}",
-    ):
-        # print(f"Fetching job run: {job_name} (#{build_number})")
+    job_run_api_jsons = {}
+    if bulk_metadata:
         try:
-            test_job_run = collect_job_run(
-                job_name=job_name,
-                build_number=build_number,
-                job_run_type=job_run_type,
-            )
-            db.save_to_mongo(test_job_run)
-            fetched_job_runs.append(test_job_run)
+            job_run_api_jsons = _fetch_job_run_jsons_in_bulk(job_name, build_numbers_to_fetch)
         except Exception as e:
-            print(f"Failed to fetch job run: {job_name} (#{build_number})")
-            raise (e)
+            print(f"Failed to fetch job run data in bulk for {job_name}, falling back to per build requests: {e}")
+
+    failed_build_numbers = []
+    if max_workers == 1:
+        fetched_job_runs = _collect_and_save_job_runs_serially(
+            job_name, build_numbers_to_fetch, job_run_type, job_run_api_jsons, failed_build_numbers
+        )
+    else:
+        fetched_job_runs = _collect_and_save_job_runs_in_pipeline(
+            job_name, build_numbers_to_fetch, job_run_type, job_run_api_jsons, max_workers, failed_build_numbers
+        )
+        # keep the same newest-first ordering as the serial mode
+        fetched_job_runs.sort(key=lambda job_run: job_run.build_number, reverse=True)
+    db.finish_job_sync(job_name)
+
+    if failed_build_numbers:
+        print(
+            f"Failed to fetch {len(failed_build_numbers)} job run(s) for {job_name}: "
+            f"{sorted(failed_build_numbers, reverse=True)}"
+        )
     print(f"Fetched {len(fetched_job_runs)} job runs for {job_name}")
     return job, fetched_job_runs
 
@@ -490,9 +1214,76 @@ def get_all_existing_job_names_from_jenkins() -> List[str]:
     Get all existing job names from Jenkins.
     """
     url = f"{JENKINS_API_URL}/api/json"
-    data = _fetch_json(url)
+    data = _fetch_json(url, attempted_action="fetch job names")
     return [job["name"] for job in data["jobs"]]
 
 
+class JobSnapshot(BaseModel):
+    """The state of a job in Jenkins at the time of job discovery."""
+
+    job_name: str
+    url: str
+    last_build_number: Optional[int] = None
+    last_completed_build_number: Optional[int] = None
+
+
+def _get_job_discovery_tree_fields(max_folder_depth: int) -> List[str]:
+    """
+    Returns the tree query fields that fetch every job down to `max_folder_depth` levels of folders.
+
+    e.g. for a depth of 1: `jobs[name,...,lastCompletedBuild[number],jobs[name,...,lastCompletedBuild[number]]]`
+    """
+    fields = ",".join(JOB_DISCOVERY_FIELDS)
+    tree_field = f"jobs[{fields}]"
+    for _ in range(max_folder_depth):
+        tree_field = f"jobs[{fields},{tree_field}]"
+    return [tree_field]
+
+
+def _parse_job_snapshots(data: dict, parent_job_name: Optional[str] = None) -> Dict[str, JobSnapshot]:
+    """
+    Flatten the jobs of a job discovery response into snapshots, recursing into folders.
+
+    Jobs in folders are named like "folder/job/sub-folder/job/name", so that `_make_url_from_job_name` and every other
+    function that takes a job name build the right url for them. Folders deeper than the discovery went (see
+    `JOB_DISCOVERY_MAX_FOLDER_DEPTH`) are skipped, since their jobs were not fetched.
+    """
+    snapshots: Dict[str, JobSnapshot] = {}
+    for job_data in data.get("jobs") or []:
+        job_name = job_data["name"] if parent_job_name is None else f"{parent_job_name}/job/{job_data['name']}"
+        if job_data.get("_class") in JOB_FOLDER_CLASSES or "jobs" in job_data:
+            if "jobs" not in job_data:
+                print(f"Skipping folder {job_name}, it is deeper than JENKINS_JOB_DISCOVERY_MAX_FOLDER_DEPTH")
+                continue
+            snapshots.update(_parse_job_snapshots(job_data, job_name))
+            continue
+        snapshots[job_name] = JobSnapshot(
+            job_name=job_name,
+            url=job_data.get("url") or _make_url_from_job_name(job_name),
+            last_build_number=_get_build_number(job_data, "lastBuild"),
+            last_completed_build_number=_get_build_number(job_data, "lastCompletedBuild"),
+        )
+    return snapshots
+
+
+def _get_job_discovery_url(max_folder_depth: int) -> str:
+    return _append_tree_query_param(f"{JENKINS_API_URL}/api/json", _get_job_discovery_tree_fields(max_folder_depth))
+
+
+# DO NOT CACHE - the snapshot is used to decide which jobs have new builds
+def discover_jobs(max_folder_depth: int = JOB_DISCOVERY_MAX_FOLDER_DEPTH) -> Dict[str, JobSnapshot]:
+    """
+    Get every job in Jenkins, including the jobs in folders, with their last build numbers in a single request.
+
+    Args:
+        max_folder_depth (int): The number of levels of folders to look into.
+
+    Returns:
+        Dict[str, JobSnapshot]: mapping of job name -> snapshot of the job.
+    """
+    data = _fetch_json(_get_job_discovery_url(max_folder_depth), attempted_action="discover jobs")
+    return _parse_job_snapshots(data)
+
+
 if __name__ == "__main__":
     print("This module is not meant to be run directly. Import it into another module.")
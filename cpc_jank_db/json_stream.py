@@ -0,0 +1,136 @@
+"""
+Module for building objects from JSON that arrives in chunks, without holding the whole document in memory.
+
+`StreamingJSONBuilder` is fed the raw bytes of a response as they arrive and builds the document incrementally.
+Converters registered for a path (in ijson prefix notation, e.g. "suites.item.cases.item") are called with every
+object or array at that path as soon as it is complete, so large repeated parts of a document (like the test cases
+of a test report) are turned into models, or dropped, one at a time instead of after the whole document is parsed.
+
+Uses the optional `ijson` dependency (`pip install cpc-jank-db[streaming]`). Without it, the document is buffered and
+parsed at once when it is finished, and the converters are applied afterwards, so the result is the same but memory
+use is not flat.
+
+Example:
+    from cpc_jank_db.json_stream import DROP, StreamingJSONBuilder
+
+    builder = StreamingJSONBuilder({"suites.item.cases.item": lambda case: DROP if case["status"] == "PASSED" else case})
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        builder.feed(chunk)
+    test_report = builder.finish()
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional dependency
+    ijson = None
+
+# returned by a converter to leave the value out of its parent object or array
+DROP = object()
+_MISSING = object()
+
+
+class StreamingJSONBuilder:
+    """Incrementally builds a JSON document from chunks of bytes, converting parts of it as soon as they complete."""
+
+    def __init__(self, converters: Optional[Dict[str, Callable[[Any], Any]]] = None):
+        """
+        Args:
+            converters (Optional[Dict[str, Callable[[Any], Any]]]): mapping of path -> callable that takes in the
+                complete object or array at that path and returns what to store in its place, or `DROP` to leave it
+                out. Paths use ijson prefix notation: keys separated by dots, with "item" for the items of an array.
+        """
+        self.converters = converters or {}
+        self._root = _MISSING
+        # stack of [container, current key, path] of the objects and arrays that are still being built
+        self._stack: List[list] = []
+        if ijson is not None:
+            self._events = ijson.sendable_list()
+            self._parser = ijson.parse_coro(self._events, use_float=True)
+        else:
+            self._buffer = bytearray()
+
+    def feed(self, chunk: bytes):
+        """
+        Parse the next chunk of the document.
+
+        Raises:
+            ValueError: If the document is not valid JSON. Without ijson, this is only raised by `finish`.
+        """
+        if not chunk:
+            return
+        if ijson is None:
+            self._buffer.extend(chunk)
+            return
+        try:
+            self._parser.send(chunk)
+        except ijson.JSONError as e:
+            raise ValueError(f"Invalid JSON document: {e}") from e
+        self._handle_events()
+
+    def finish(self) -> Any:
+        """
+        Finish parsing and return the built document.
+
+        Raises:
+            ValueError: If the document is not valid or incomplete JSON.
+        """
+        if ijson is None:
+            return self._convert(json.loads(bytes(self._buffer)), "")
+        try:
+            self._parser.close()
+        except ijson.JSONError as e:
+            raise ValueError(f"Invalid JSON document: {e}") from e
+        self._handle_events()
+        if self._root is _MISSING or self._stack:
+            raise ValueError("Incomplete JSON document")
+        return self._root
+
+    def _handle_events(self):
+        for path, event, value in self._events:
+            if event == "start_map":
+                self._stack.append([{}, None, path])
+            elif event == "start_array":
+                self._stack.append([[], None, path])
+            elif event == "map_key":
+                self._stack[-1][1] = value
+            elif event in ("end_map", "end_array"):
+                container, _, container_path = self._stack.pop()
+                self._add(self._apply_converter(container, container_path))
+            else:
+                self._add(value)
+        del self._events[:]
+
+    def _apply_converter(self, value: Any, path: str) -> Any:
+        converter = self.converters.get(path)
+        return converter(value) if converter else value
+
+    def _add(self, value: Any):
+        if value is DROP:
+            return
+        if not self._stack:
+            self._root = value
+            return
+        container, key, _ = self._stack[-1]
+        if isinstance(container, dict):
+            container[key] = value
+        else:
+            container.append(value)
+
+    def _convert(self, value: Any, path: str) -> Any:
+        """Apply the converters to an already parsed document, children first, like the streaming parser does."""
+        if isinstance(value, dict):
+            converted = {}
+            for key, child in value.items():
+                converted_child = self._convert(child, f"{path}.{key}" if path else key)
+                if converted_child is not DROP:
+                    converted[key] = converted_child
+            value = converted
+        elif isinstance(value, list):
+            item_path = f"{path}.item" if path else "item"
+            value = [child for child in (self._convert(item, item_path) for item in value) if child is not DROP]
+        else:
+            return value
+        return self._apply_converter(value, path)
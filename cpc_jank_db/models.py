@@ -1,16 +1,23 @@
 import re
 from datetime import datetime
-from typing import Dict, List, Literal, Optional
+from typing import Any, Callable, Dict, List, Literal, Optional, Set
+from urllib.parse import unquote, urlparse
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr, TypeAdapter
 from tqdm import tqdm
 
 from cpc_jank_db import utils
 
+# test case statuses of passing test cases, which are dropped by the "failures" test report retention and load profile
+PASSED_TEST_CASE_STATUSES = ("PASSED", "FIXED")
+# test case statuses of failed test cases, whose error texts are fetched when a job run is collected
+FAILED_TEST_CASE_STATUSES = ("FAILED", "REGRESSION")
+
 
 class TestCase(BaseModel):
-    test_actions: List[Dict] = Field(alias="testActions")
-    age: int
+    # not fetched from the API anymore (see `jenkins.TEST_CASE_FIELDS`), only present in older job runs
+    test_actions: List[Dict] = Field(alias="testActions", default_factory=list)
+    age: int = 0
     class_name: str = Field(alias="className")
     duration: float
     # failed_since: Optional[int] = Field(alias="failedSince")
@@ -25,6 +32,11 @@ class TestCase(BaseModel):
     def from_data(cls, data: dict):
         return cls(**data)
 
+    @property
+    def has_error_texts(self) -> bool:
+        """Whether the error texts were already included in the test report, so they do not need to be fetched."""
+        return self.error_details is not None or self.error_stack_trace is not None
+
 
 class TestSuite(BaseModel):
     cases: List[TestCase]
@@ -38,7 +50,8 @@ class TestSuite(BaseModel):
 
     @classmethod
     def from_data(cls, data: dict):
-        cases = [TestCase.from_data(case) for case in data["cases"]]
+        # cases may already have been built while the test report was streamed in
+        cases = [case if isinstance(case, TestCase) else TestCase.from_data(case) for case in data["cases"]]
         data["cases"] = cases
         return cls(**data)
 
@@ -56,11 +69,30 @@ def _update_family_in_data(data: dict):
             data["family"] = "Minimal" if "minimal" in name.lower() else "Base"
 
 
+def get_job_name_from_url(url: str) -> Optional[str]:
+    """
+    Get the name of a job (as passed to `jenkins.collect_job`) from the url of the job or of one of its job runs.
+
+    e.g. "https://jenkins/job/folder/job/some-job/12/" -> "folder/job/some-job"
+    and "https://jenkins/job/some-job/api/json" (the url stored on jobs) -> "some-job"
+
+    Returns:
+        Optional[str]: The job name, or None if the url is not the url of a job or job run.
+    """
+    path = unquote(urlparse(url).path)
+    if "/job/" not in path:
+        return None
+    job_path = path.split("/job/", 1)[1].strip("/")
+    job_path = re.sub(r"(^|/)api/[a-z]+$", "", job_path).strip("/")
+    return re.sub(r"/[0-9]+$", "", job_path)
+
+
 class Job(BaseModel):
     url: str
     name: str = Field(alias="fullDisplayName")
     build_numbers: List[int] = Field(alias="buildNumbers")
     last_completed_build_number: Optional[int] = Field(alias="lastCompletedBuildNumber", default=None)
+    last_build_number: Optional[int] = Field(alias="lastBuildNumber", default=None)
     suite: Optional[str] = None  # only requireed for CPC Jenkins
     family: Optional[Literal["Base", "Minimal"]] = None  # only requireed for CPC Jenkins
     description: Optional[str] = None
@@ -74,6 +106,10 @@ class Job(BaseModel):
     def from_data(cls, **data):
         return cls(**data)
 
+    @property
+    def job_name(self):
+        return get_job_name_from_url(self.url) or self.name
+
 
 class JobRun(BaseModel):
     self_class: str = Field(frozen=True, default="JobRun")
@@ -95,6 +131,24 @@ class JobRun(BaseModel):
         "Otherwise, it will be None to indicate that this is not a matrix job.",
     )
     console_output: Optional[str] = Field(alias="consoleOutput", default=None)
+    console_log_id: Optional[str] = Field(
+        alias="consoleLogId",
+        default=None,
+        description="Id of the console output in the console log store if it is not stored inline.",
+    )
+    extracted_fields: Dict[str, str] = Field(
+        alias="extractedFields",
+        default_factory=dict,
+        description="Fields extracted from the console output when the job run was collected (see `extractors`).",
+    )
+
+    # fields that were left out when the job run was loaded from the database (see `db.LoadProfile`), and the
+    # callable that loads them (by alias) the first time one of them is accessed
+    _omitted_fields: Set[str] = PrivateAttr(default_factory=set)
+    _load_omitted_fields: Optional[Callable[["JobRun", List[str]], Dict[str, Any]]] = PrivateAttr(default=None)
+    # fields that were only partly loaded from the database (e.g. test results without their passing test cases), so
+    # that the job run must not be saved with them
+    _partial_fields: Set[str] = PrivateAttr(default_factory=set)
 
     def __init__(self, **data):
         _update_family_in_data(data)
@@ -104,9 +158,64 @@ class JobRun(BaseModel):
     def from_data(cls, **data):
         return cls(**data)
 
+    def omit_fields(self, field_names: List[str], load_omitted_fields: Callable[["JobRun", List[str]], Dict[str, Any]]):
+        """
+        Leave out fields that were not loaded, so that they are loaded with `load_omitted_fields` when first accessed.
+
+        Args:
+            field_names (List[str]): The names of the fields that were not loaded.
+            load_omitted_fields (Callable[[JobRun, List[str]], Dict[str, Any]]): Callable that takes in this job run
+                and the aliases of the omitted fields and returns mapping of alias -> stored value.
+        """
+        for field_name in field_names:
+            self.__dict__.pop(field_name, None)
+        self._omitted_fields.update(field_names)
+        self._load_omitted_fields = load_omitted_fields
+
+    def mark_partial(self, field_names: List[str]):
+        """
+        Mark fields that were only partly loaded from the database, so that the job run is never saved with them.
+
+        Args:
+            field_names (List[str]): The names of the fields that were only partly loaded.
+        """
+        self._partial_fields.update(field_names)
+
+    @property
+    def partial_fields(self) -> Set[str]:
+        """The names of the fields that were only partly loaded from the database (see `mark_partial`)."""
+        return set(self._partial_fields)
+
+    def load_omitted_fields(self):
+        """Load every field that was left out when the job run was loaded from the database."""
+        # fields that were assigned since the job run was loaded keep their new value
+        field_names = [field_name for field_name in self._omitted_fields if field_name not in self.__dict__]
+        self._omitted_fields.clear()
+        if not field_names:
+            return
+        fields = {name: self.__class__.model_fields[name] for name in field_names}
+        values = self._load_omitted_fields(self, [field.alias or name for name, field in fields.items()])
+        for name, field in fields.items():
+            value = values.get(field.alias or name)
+            if value is None:
+                self.__dict__[name] = field.get_default(call_default_factory=True)
+            else:
+                self.__dict__[name] = TypeAdapter(field.annotation).validate_python(value)
+
+    def __getattr__(self, name: str):
+        if not name.startswith("_") and name in self._omitted_fields:
+            self.load_omitted_fields()
+            return self.__dict__[name]
+        return super().__getattr__(name)
+
+    def model_dump(self, **kwargs) -> Dict[str, Any]:
+        # never save a job run with the fields it was loaded without
+        self.load_omitted_fields()
+        return super().model_dump(**kwargs)
+
     @property
     def job_name(self):
-        return self.name.split("#")[0].strip()
+        return get_job_name_from_url(self.url) or self.name.split("#")[0].strip()
 
     @property
     def unique_identifier(self):
@@ -144,6 +253,22 @@ class OracleMatrixTestRunConfig(MatrixTestRunConfig):
     login_method: str = Field(alias="loginMethod")
 
 
+def _harvest_error_texts(harvest_error_texts: Optional[callable], url: str) -> Dict[str, Dict[str, tuple]]:
+    """
+    Call the given harvesting callable for a test report, returning an empty result if it is not given or fails.
+
+    Returns:
+        Dict[str, Dict[str, tuple]]: mapping of test case class name -> test case name -> (error details, stack trace)
+    """
+    if harvest_error_texts is None:
+        return {}
+    try:
+        return harvest_error_texts(url)
+    except Exception as e:
+        print(f"Failed to harvest error texts for {url}, falling back to fetching them per test case: {e}")
+        return {}
+
+
 def getMatrixTestRunConfigClass(config: dict):
     if "launchMode" in config and "loginMethod" in config:
         return OracleMatrixTestRunConfig
@@ -152,7 +277,8 @@ def getMatrixTestRunConfigClass(config: dict):
 
 
 class TestResult(BaseModel):
-    test_actions: List[Dict] = Field(alias="testActions")
+    # not fetched from the API anymore, only present in older job runs
+    test_actions: List[Dict] = Field(alias="testActions", default_factory=list)
     duration: float
     empty: bool
     fail_count: int = Field(alias="failCount")
@@ -162,7 +288,7 @@ class TestResult(BaseModel):
 
     @classmethod
     def from_data(cls, **data):
-        suites = [TestSuite.from_data(suite) for suite in data["suites"]]
+        suites = [suite if isinstance(suite, TestSuite) else TestSuite.from_data(suite) for suite in data["suites"]]
         data["suites"] = suites
         return cls(**data)
 
@@ -242,6 +368,12 @@ class MatrixJobRun(JobRun):
         job_run.matrix_runs = matrix_run_objs
         return job_run
 
+    def model_dump(self, **kwargs) -> Dict[str, Any]:
+        # the matrix child runs are dumped with their parent, so they are never saved without their fields either
+        for matrix_run in self.matrix_runs:
+            matrix_run.load_omitted_fields()
+        return super().model_dump(**kwargs)
+
 
 class TestMatrixJobRun(MatrixJobRun):
     self_class: str = Field(frozen=True, default="TestMatrixJobRun")
@@ -255,33 +387,53 @@ class TestMatrixJobRun(MatrixJobRun):
         result.test_results = test_results
         return result
 
-    def fetch_error_texts_for_failed_tests(self, fetch_error_texts: callable):
+    def fetch_error_texts_for_failed_tests(
+        self,
+        fetch_error_texts: callable,
+        harvest_error_texts: Optional[callable] = None,
+    ):
         """
         Fetches the error details and stack trace for failed
 
         Args:
             fetch_error_texts: callable that takes in the URL of the test report and returns a tuple of error details and stack trace
+            harvest_error_texts: optional callable that takes in the URL of a matrix child run and returns the error
+                texts of all of its failed test cases in a single request (see `_get_harvested_error_texts`). Any
+                failed test case missing from the harvested texts falls back to `fetch_error_texts`.
+
+        Failed test cases whose error texts were already included in the test report are skipped.
         """
 
         for test_report in self.test_results.matrix_test_reports:
-            for suite in test_report.test_result.suites:
-                for case in suite.cases:
-                    if case.status == "FAILED":
-                        try:
-                            url = test_report.generate_test_case_report_url(
-                                test_case_name=case.name,
-                                test_case_class=case.class_name,
-                            )
-                            error_details, error_stack_trace = fetch_error_texts(url)
-                        except Exception as e:
-                            error_msg = (
-                                f"Failed to fetch error texts using url: '{url}'"
-                                f" for {case.name}, {case.class_name}, {self.url}"
-                            )
-                            print(error_msg)
-                            raise Exception(error_msg) from e
-                        case.error_details = error_details
-                        case.error_stack_trace = error_stack_trace
+            failed_test_cases = [
+                case
+                for suite in test_report.test_result.suites
+                for case in suite.cases
+                if case.status in FAILED_TEST_CASE_STATUSES and not case.has_error_texts
+            ]
+            if not failed_test_cases:
+                continue
+            harvested_error_texts = _harvest_error_texts(harvest_error_texts, test_report.url)
+            for case in failed_test_cases:
+                harvested = harvested_error_texts.get(case.class_name, {}).get(case.name)
+                if harvested is not None:
+                    case.error_details, case.error_stack_trace = harvested
+                    continue
+                try:
+                    url = test_report.generate_test_case_report_url(
+                        test_case_name=case.name,
+                        test_case_class=case.class_name,
+                    )
+                    error_details, error_stack_trace = fetch_error_texts(url)
+                except Exception as e:
+                    error_msg = (
+                        f"Failed to fetch error texts using url: '{url}'"
+                        f" for {case.name}, {case.class_name}, {self.url}"
+                    )
+                    print(error_msg)
+                    raise Exception(error_msg) from e
+                case.error_details = error_details
+                case.error_stack_trace = error_stack_trace
 
 
 # full fetch involves getting the parent job, getting
@@ -344,20 +496,40 @@ class TestJobRun(JobRun):
 
         return f"{self.url.rstrip('/')}/testReport/junit/{test_case_class}/{test_case_name}"
 
-    def fetch_error_texts_for_failed_tests(self, fetch_error_texts: callable):
+    def fetch_error_texts_for_failed_tests(
+        self,
+        fetch_error_texts: callable,
+        harvest_error_texts: Optional[callable] = None,
+    ):
         """
         Fetches the error details and stack trace for failed
 
         Args:
             fetch_error_texts: callable that takes in the URL of the test report and returns a tuple of error details and stack trace
+            harvest_error_texts: optional callable that takes in the URL of this job run and returns the error texts
+                of all of its failed test cases in a single request (see `_get_harvested_error_texts`). Any failed
+                test case missing from the harvested texts falls back to `fetch_error_texts`.
+
+        Failed test cases whose error texts were already included in the test report are skipped.
         """
 
         # create flattened list of all failed test cases and THEN fetch the error texts
         failed_test_cases: List[TestCase] = []
         for suite in self.test_results.suites:
-            failed_test_cases.extend([case for case in suite.cases if case.status == "FAILED"])
+            failed_test_cases.extend(
+                [case for case in suite.cases if case.status in FAILED_TEST_CASE_STATUSES and not case.has_error_texts]
+            )
+
+        if failed_test_cases:
+            harvested_error_texts = _harvest_error_texts(harvest_error_texts, self.url)
+        else:
+            harvested_error_texts = {}
 
         for case in tqdm(failed_test_cases, desc="Fetching error texts for failed tests"):
+            harvested = harvested_error_texts.get(case.class_name, {}).get(case.name)
+            if harvested is not None:
+                case.error_details, case.error_stack_trace = harvested
+                continue
             try:
                 error_details, error_stack_trace = fetch_error_texts(
                     self.generate_test_case_report_url(
@@ -374,7 +546,9 @@ class TestJobRun(JobRun):
         # check to make sure that self.test_results error details and stack traces are filled in for all failed tests
         for suite in self.test_results.suites:
             for case in suite.cases:
-                if case.status == "FAILED" and (case.error_details is None or case.error_stack_trace is None):
+                if case.status in FAILED_TEST_CASE_STATUSES and (
+                    case.error_details is None or case.error_stack_trace is None
+                ):
                     raise ValueError(
                         f"Error details and stack trace not fetched for {case.name}, {case.class_name}, {self.url}"
                     )
@@ -0,0 +1,219 @@
+"""
+Module for running items through a series of stages that overlap, connected by bounded queues.
+
+Every stage has its own pool of worker threads, so while one stage waits on the network another can be building
+models or writing to the database. The queues between the stages are bounded, so a slow stage holds back the stages
+before it instead of letting unprocessed items pile up in memory. Per stage statistics show which stage is the
+bottleneck.
+
+Example:
+    from cpc_jank_db.pipeline import Pipeline, Stage
+
+    pipeline = Pipeline(
+        [
+            Stage("fetch", fetch_data, workers=8),
+            Stage("parse", parse_data),
+            Stage("persist", save_data, workers=2),
+        ],
+        queue_size=16,
+    )
+    results = pipeline.run(items, on_error=lambda item, stage, e: print(f"{item} failed in {stage}: {e}"))
+    print(pipeline.get_stats())
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from pydantic import BaseModel
+
+DEFAULT_QUEUE_SIZE = 16
+
+_DONE = object()
+
+
+class StageStats(BaseModel):
+    name: str
+    workers: int
+    processed: int = 0
+    failed: int = 0
+    # failed items whose on_error callback raised as well
+    unreported_failures: int = 0
+    busy_seconds: float = 0.0
+    # time the stage's workers spent blocked because the next stage's queue was full
+    blocked_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Items processed per second over the lifetime of the pipeline run."""
+        if self.wall_seconds == 0:
+            return 0.0
+        return self.processed / self.wall_seconds
+
+    @property
+    def utilization(self) -> float:
+        """Fraction of the stage's worker time spent processing items. The bottleneck is the most utilized stage."""
+        if self.wall_seconds == 0:
+            return 0.0
+        return self.busy_seconds / (self.wall_seconds * self.workers)
+
+    def summary(self) -> str:
+        return (
+            f"{self.name}: {self.processed} item(s) ({self.failed} failed, {self.unreported_failures} not reported), "
+            f"{self.throughput:.2f} item(s)/s, "
+            f"{self.utilization:.0%} busy, {self.blocked_seconds:.1f}s blocked on the next stage"
+        )
+
+
+class Stage:
+    """A single step of a pipeline that transforms every item passed through it."""
+
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1):
+        """
+        Args:
+            name (str): The name of the stage, used in its statistics.
+            func (Callable[[Any], Any]): Callable that takes in the output of the previous stage (or an input item for
+                the first stage) and returns the input of the next stage.
+            workers (int): The number of threads running the stage concurrently.
+        """
+        if workers < 1:
+            raise ValueError(f"workers must be at least 1, not: {workers}")
+        self.name = name
+        self.func = func
+        self.workers = workers
+
+
+class Pipeline:
+    """Runs items through a series of stages concurrently, with bounded queues between the stages."""
+
+    def __init__(self, stages: List[Stage], queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        Args:
+            stages (List[Stage]): The stages every item is passed through, in order.
+            queue_size (int): The maximum number of items waiting in front of each stage.
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+        self._stats: Dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+
+    def get_stats(self) -> List[StageStats]:
+        with self._lock:
+            return [stats.model_copy() for stats in self._stats.values()]
+
+    def run(
+        self,
+        items: Iterable[Any],
+        on_error: Optional[Callable[[Any, str, Exception], None]] = None,
+    ) -> List[Any]:
+        """
+        Pass every item through all the stages.
+
+        An item that raises in any stage is dropped from the pipeline, the other items carry on.
+
+        Args:
+            items (Iterable[Any]): The input items of the first stage. Consumed lazily as the first stage has room.
+            on_error (Optional[Callable[[Any, str, Exception], None]]): Callable that is called with the input item,
+                the name of the stage and the exception for every item that failed. If it raises, the exception is
+                printed and counted in the stage's `unreported_failures`, and the pipeline carries on.
+
+        Returns:
+            List[Any]: The outputs of the last stage, in the order they finished.
+        """
+        with self._lock:
+            self._stats = {stage.name: StageStats(name=stage.name, workers=stage.workers) for stage in self.stages}
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results: List[Any] = []
+        results_lock = threading.Lock()
+        started_at = time.monotonic()
+
+        threads = []
+        for index, stage in enumerate(self.stages):
+            output_queue = queues[index + 1] if index + 1 < len(queues) else None
+            remaining_workers = [stage.workers]
+            for worker_index in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._run_stage_worker,
+                    args=(stage, queues[index], output_queue, remaining_workers, results, results_lock, on_error),
+                    name=f"pipeline-{stage.name}-{worker_index}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        for item in items:
+            # every item carries its original input along so failures can be reported against it
+            queues[0].put((item, item))
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_DONE)
+        for thread in threads:
+            thread.join()
+
+        wall_seconds = time.monotonic() - started_at
+        with self._lock:
+            for stats in self._stats.values():
+                stats.wall_seconds = wall_seconds
+        return results
+
+    def _run_stage_worker(
+        self,
+        stage: Stage,
+        input_queue: queue.Queue,
+        output_queue: Optional[queue.Queue],
+        remaining_workers: List[int],
+        results: List[Any],
+        results_lock: threading.Lock,
+        on_error: Optional[Callable[[Any, str, Exception], None]],
+    ):
+        stats = self._stats[stage.name]
+        try:
+            while True:
+                entry = input_queue.get()
+                if entry is _DONE:
+                    break
+                item, value = entry
+                processing_started_at = time.monotonic()
+                try:
+                    output = stage.func(value)
+                except Exception as e:
+                    with self._lock:
+                        stats.failed += 1
+                        stats.busy_seconds += time.monotonic() - processing_started_at
+                    if on_error:
+                        self._report_error(on_error, item, stage.name, e)
+                    continue
+                processed_at = time.monotonic()
+
+                if output_queue is None:
+                    with results_lock:
+                        results.append(output)
+                else:
+                    output_queue.put((item, output))
+                with self._lock:
+                    stats.processed += 1
+                    stats.busy_seconds += processed_at - processing_started_at
+                    stats.blocked_seconds += time.monotonic() - processed_at
+        finally:
+            # the last worker of a stage to finish tells every worker of the next stage that there is nothing left,
+            # even if this worker stopped because of an unexpected error, so that `run` never waits forever
+            with self._lock:
+                remaining_workers[0] -= 1
+                is_last_worker = remaining_workers[0] == 0
+            if is_last_worker and output_queue is not None:
+                next_stage = self.stages[self.stages.index(stage) + 1]
+                for _ in range(next_stage.workers):
+                    output_queue.put(_DONE)
+
+    def _report_error(
+        self, on_error: Callable[[Any, str, Exception], None], item: Any, stage_name: str, error: Exception
+    ):
+        try:
+            on_error(item, stage_name, error)
+        except Exception as e:
+            with self._lock:
+                self._stats[stage_name].unreported_failures += 1
+            print(f"[pipeline] Failed to report the failure of {item} in {stage_name} ({error}): {e}")
@@ -0,0 +1,326 @@
+"""
+Module for syncing whole projects from Jenkins to the database.
+
+Instead of syncing one job at a time (where a single job with a huge backlog delays every other job), every build to
+fetch across all jobs is put on a single prioritized queue that is worked through by a shared pool of workers. The
+newest builds of every job are fetched first, then the rest of the history is backfilled.
+
+Example:
+    from cpc_jank_db.naming import CloudInitPipelineConfig
+    from cpc_jank_db.sync import sync_projects
+
+    report = sync_projects([oracle_project_config, CloudInitPipelineConfig.generate_all_configs()], max_workers=16)
+    print(report.summary())
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from pydantic import BaseModel, Field
+from tqdm import tqdm
+
+from cpc_jank_db import db, jenkins
+from cpc_jank_db.models import JobRun, TestJobRun
+from cpc_jank_db.naming import CloudInitPipelineConfig, PipelineConfig, ProjectConfig
+
+SyncConfig = Union[ProjectConfig, PipelineConfig, CloudInitPipelineConfig, List[CloudInitPipelineConfig]]
+
+DEFAULT_MAX_WORKERS = 8
+# number of newest builds of every job that are fetched before any job's history is backfilled
+DEFAULT_FRESH_BUILDS_PER_JOB = 1
+# number of tasks per worker that are submitted ahead of time, so that workers never wait for the next task
+IN_FLIGHT_TASKS_PER_WORKER = 2
+
+
+class SyncTask(BaseModel):
+    """A single build of a job to fetch and save to the database."""
+
+    job_name: str
+    build_number: int
+    job_run_type: Optional[type[JobRun]] = None
+    job_run_api_json: Optional[dict] = None
+    # lower sorts first: (0 = fresh build / 1 = backfill, rank of the build within its job, -timestamp)
+    priority: Tuple[int, int, int]
+
+
+class SyncReport(BaseModel):
+    """The outcome of a project sync."""
+
+    synced_build_numbers: Dict[str, List[int]] = Field(default_factory=dict)
+    failed_build_numbers: Dict[str, List[int]] = Field(default_factory=dict)
+    failed_jobs: Dict[str, str] = Field(
+        default_factory=dict, description="Jobs that could not be planned (e.g. they do not exist) and why."
+    )
+    missing_jobs: List[str] = Field(default_factory=list, description="Jobs that do not exist in Jenkins.")
+    up_to_date_jobs: List[str] = Field(
+        default_factory=list, description="Jobs whose last completed build was already in the database."
+    )
+
+    def summary(self) -> str:
+        synced = sum(len(build_numbers) for build_numbers in self.synced_build_numbers.values())
+        failed = sum(len(build_numbers) for build_numbers in self.failed_build_numbers.values())
+        return (
+            f"Synced {synced} job run(s) across {len(self.synced_build_numbers)} job(s), "
+            f"{failed} job run(s) failed, {len(self.failed_jobs)} job(s) could not be synced, "
+            f"{len(self.up_to_date_jobs)} job(s) were already up to date, {len(self.missing_jobs)} job(s) do not exist"
+        )
+
+
+def get_jobs_to_sync(configs: List[SyncConfig]) -> Dict[str, Optional[type[JobRun]]]:
+    """
+    Resolve project and pipeline configs into the names of the jobs to sync and the type of job run of each job.
+
+    Cloud-init jobs are always TestJobRuns. The type of job run of every other job is detected when it is fetched.
+
+    Args:
+        configs (List[SyncConfig]): ProjectConfigs, PipelineConfigs, CloudInitPipelineConfigs, or lists of
+            CloudInitPipelineConfigs.
+
+    Returns:
+        Dict[str, Optional[type[JobRun]]]: mapping of job name -> type of job run to create (or None to detect it).
+    """
+    jobs: Dict[str, Optional[type[JobRun]]] = {}
+    for config in configs:
+        if isinstance(config, list):
+            jobs.update(get_jobs_to_sync(config))
+        elif isinstance(config, CloudInitPipelineConfig):
+            jobs[config.job_name] = TestJobRun
+        elif isinstance(config, (ProjectConfig, PipelineConfig)):
+            for job_name in config.all_job_names:
+                jobs.setdefault(job_name, None)
+        else:
+            raise ValueError(f"Unsupported config to sync: {config} ({type(config)})")
+    return jobs
+
+
+def _is_job_up_to_date(job_name: str, snapshot: jenkins.JobSnapshot, incomplete_job_syncs: Set[str]) -> bool:
+    if job_name in incomplete_job_syncs:
+        # builds left over from an interrupted or partly failed sync still need to be fetched
+        return False
+    if snapshot.last_completed_build_number is None:
+        return True
+    return db.job_run_already_exists(job_name, snapshot.last_completed_build_number)
+
+
+def skip_jobs_not_needing_sync(
+    jobs: Dict[str, Optional[type[JobRun]]],
+    report: SyncReport,
+    snapshots: Optional[Dict[str, jenkins.JobSnapshot]] = None,
+) -> Dict[str, Optional[type[JobRun]]]:
+    """
+    Leave out the jobs that do not exist in Jenkins and the jobs whose last completed build is already in the database.
+
+    Uses a single job discovery request instead of a request per job, so that the many job names generated by
+    configs that do not exist in Jenkins (and jobs without new builds) cost nothing to sync.
+
+    Args:
+        jobs (Dict[str, Optional[type[JobRun]]]): mapping of job name -> type of job run to create.
+        report (SyncReport): The report that missing and up to date jobs are added to.
+        snapshots (Optional[Dict[str, jenkins.JobSnapshot]]): The result of `jenkins.discover_jobs` if it was already
+            fetched.
+
+    Returns:
+        Dict[str, Optional[type[JobRun]]]: The jobs that still need to be synced. If job discovery fails, every job is
+            returned as is.
+    """
+    if snapshots is None:
+        try:
+            snapshots = jenkins.discover_jobs()
+        except Exception as e:
+            print(f"Failed to discover jobs, syncing every job: {e}")
+            return jobs
+
+    incomplete_job_syncs = set(db.get_incomplete_job_syncs())
+    jobs_to_sync: Dict[str, Optional[type[JobRun]]] = {}
+    for job_name, job_run_type in jobs.items():
+        snapshot = snapshots.get(job_name)
+        if snapshot is None:
+            report.missing_jobs.append(job_name)
+        elif _is_job_up_to_date(job_name, snapshot, incomplete_job_syncs):
+            report.up_to_date_jobs.append(job_name)
+        else:
+            jobs_to_sync[job_name] = job_run_type
+    print(
+        f"Skipping {len(report.missing_jobs)} job(s) that do not exist and {len(report.up_to_date_jobs)} job(s) "
+        f"that are up to date, {len(jobs_to_sync)} job(s) left to sync"
+    )
+    return jobs_to_sync
+
+
+def _plan_job(
+    job_name: str,
+    job_run_type: Optional[type[JobRun]],
+    fresh_builds_per_job: int,
+) -> List[SyncTask]:
+    job = jenkins._fetch_and_refresh_job(job_name)
+    build_numbers = jenkins._get_build_numbers_to_fetch(job_name, job)
+    db.start_job_sync(job_name, build_numbers, job.last_completed_build_number)
+    if not build_numbers:
+        db.finish_job_sync(job_name)
+        return []
+
+    try:
+        job_run_api_jsons = jenkins._fetch_job_run_jsons_in_bulk(job_name, build_numbers)
+    except Exception as e:
+        print(f"Failed to fetch job run data in bulk for {job_name}, falling back to per build requests: {e}")
+        job_run_api_jsons = {}
+
+    tasks = []
+    for rank, build_number in enumerate(sorted(build_numbers, reverse=True)):
+        job_run_api_json = job_run_api_jsons.get(build_number)
+        timestamp = job_run_api_json.get("timestamp", 0) if job_run_api_json else 0
+        tasks.append(
+            SyncTask(
+                job_name=job_name,
+                build_number=build_number,
+                job_run_type=job_run_type,
+                job_run_api_json=job_run_api_json,
+                priority=(0 if rank < fresh_builds_per_job else 1, rank, -timestamp),
+            )
+        )
+    return tasks
+
+
+def plan_sync_tasks(
+    jobs: Dict[str, Optional[type[JobRun]]],
+    report: SyncReport,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    fresh_builds_per_job: int = DEFAULT_FRESH_BUILDS_PER_JOB,
+) -> List[SyncTask]:
+    """
+    Work out every build to fetch across all the given jobs, in the order they should be fetched.
+
+    The newest `fresh_builds_per_job` builds of every job come first (most recently started first), then the rest
+    of every job's history is interleaved newest first, so that no single job's backlog holds up the others.
+
+    Args:
+        jobs (Dict[str, Optional[type[JobRun]]]): mapping of job name -> type of job run to create.
+        report (SyncReport): The report that jobs that fail to be planned are added to.
+        max_workers (int): The number of jobs to plan concurrently.
+        fresh_builds_per_job (int): The number of newest builds of each job to prioritize.
+
+    Returns:
+        List[SyncTask]: The tasks to run, highest priority first.
+    """
+    tasks: List[SyncTask] = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_plan_job, job_name, job_run_type, fresh_builds_per_job): job_name
+            for job_name, job_run_type in jobs.items()
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc=f"Planning sync of {len(jobs)} job(s)"):
+            job_name = futures[future]
+            try:
+                tasks.extend(future.result())
+            except Exception as e:
+                print(f"Failed to plan sync of job: {job_name}: {e}")
+                report.failed_jobs[job_name] = f"{type(e).__name__}: {e}"
+    tasks.sort(key=lambda task: task.priority)
+    return tasks
+
+
+def _run_task(task: SyncTask) -> JobRun:
+    return jenkins.collect_job_run(task.job_name, task.build_number, task.job_run_type, task.job_run_api_json)
+
+
+def run_sync_tasks(tasks: List[SyncTask], report: SyncReport, max_workers: int = DEFAULT_MAX_WORKERS) -> SyncReport:
+    """
+    Run sync tasks over a shared pool of workers in the given order.
+
+    Only a bounded window of tasks is in flight at a time and every collected job run is handed to the save buffer
+    (and dropped) as soon as it is done, so memory use does not grow with the number of tasks. The collected job runs
+    are saved in batches of `db.SAVE_BATCH_SIZE`, and each job's sync journal entry is finished as soon as its last
+    task is saved or failed.
+
+    Args:
+        tasks (List[SyncTask]): The tasks to run, highest priority first.
+        report (SyncReport): The report that the outcome of every task is added to.
+        max_workers (int): The number of tasks to run concurrently.
+
+    Returns:
+        SyncReport: The given report.
+    """
+    remaining_tasks_per_job: Dict[str, int] = {}
+    for task in tasks:
+        remaining_tasks_per_job[task.job_name] = remaining_tasks_per_job.get(task.job_name, 0) + 1
+
+    def finish_task(job_name: str):
+        remaining_tasks_per_job[job_name] -= 1
+        if remaining_tasks_per_job[job_name] == 0:
+            db.finish_job_sync(job_name)
+
+    def record_failure(job_name: str, build_number: int, error: Exception):
+        jenkins._record_job_run_failure(job_name, build_number, error)
+        report.failed_build_numbers.setdefault(job_name, []).append(build_number)
+        finish_task(job_name)
+
+    def on_flush(results: List[db.SaveResult]):
+        synced_build_numbers_per_job: Dict[str, List[int]] = {}
+        for result in results:
+            if result.saved:
+                synced_build_numbers_per_job.setdefault(result.job_name, []).append(result.build_number)
+        for job_name, build_numbers in synced_build_numbers_per_job.items():
+            db.record_builds_synced(job_name, build_numbers)
+            report.synced_build_numbers.setdefault(job_name, []).extend(build_numbers)
+        for result in results:
+            if result.saved:
+                finish_task(result.job_name)
+            else:
+                record_failure(result.job_name, result.build_number, db.SaveError(result.error))
+
+    save_buffer = db.BulkSaveBuffer(on_flush)
+    remaining_tasks = iter(tasks)
+    in_flight: Dict[Future, SyncTask] = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, tqdm(
+        total=len(tasks), desc=f"Syncing {len(tasks)} job run(s)"
+    ) as progress:
+        while True:
+            # tasks are submitted in the given order, so they start in priority order
+            while len(in_flight) < max_workers * IN_FLIGHT_TASKS_PER_WORKER:
+                task = next(remaining_tasks, None)
+                if task is None:
+                    break
+                in_flight[executor.submit(_run_task, task)] = task
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = in_flight.pop(future)
+                try:
+                    job_run = future.result()
+                except Exception as e:
+                    record_failure(task.job_name, task.build_number, e)
+                else:
+                    save_buffer.add(job_run)
+                progress.update()
+    save_buffer.flush()
+    return report
+
+
+def sync_projects(
+    configs: List[SyncConfig],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    fresh_builds_per_job: int = DEFAULT_FRESH_BUILDS_PER_JOB,
+) -> SyncReport:
+    """
+    Sync every job of the given projects from Jenkins to the database over a shared pool of workers.
+
+    Jobs that do not exist in Jenkins or that are already up to date are skipped before any per job request is made.
+
+    Args:
+        configs (List[SyncConfig]): ProjectConfigs, PipelineConfigs, CloudInitPipelineConfigs, or lists of
+            CloudInitPipelineConfigs to sync.
+        max_workers (int): The number of builds to fetch concurrently.
+        fresh_builds_per_job (int): The number of newest builds of each job to fetch before backfilling history.
+
+    Returns:
+        SyncReport: Which builds were synced or failed per job, and which jobs could not be synced at all.
+    """
+    db.prepare_db()
+    report = SyncReport()
+    jobs = skip_jobs_not_needing_sync(get_jobs_to_sync(configs), report)
+    tasks = plan_sync_tasks(jobs, report, max_workers=max_workers, fresh_builds_per_job=fresh_builds_per_job)
+    run_sync_tasks(tasks, report, max_workers=max_workers)
+    print(report.summary())
+    return report
@@ -0,0 +1,224 @@
+"""
+Module for continuously watching jobs on Jenkins and ingesting new builds as soon as they complete.
+
+Instead of running a full sync from cron, a single long-running process keeps its HTTP and database connections warm
+and polls every job with a small probe request (see `jenkins._probe_job_from_api`). A job is only synced with
+`jenkins.collect_all_job_runs` once its last completed build moves.
+
+Every job is polled at its own interval, adapted to how often it is built: the interval starts at a fraction of the
+typical gap between the job's recent builds, so daily test jobs are polled rarely and busy build jobs often. Every
+poll that finds nothing new backs the interval off further, and it is reset as soon as a new build is found.
+
+Example:
+    from cpc_jank_db.naming import CloudInitPipelineConfig
+    from cpc_jank_db.watch import watch_projects
+
+    watch_projects([oracle_project_config, CloudInitPipelineConfig.generate_all_configs()])
+"""
+
+import heapq
+import statistics
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from cpc_jank_db import db, jenkins
+from cpc_jank_db.models import JobRun
+from cpc_jank_db.sync import SyncConfig, get_jobs_to_sync
+
+DEFAULT_MIN_INTERVAL_SECONDS = 60
+DEFAULT_MAX_INTERVAL_SECONDS = 6 * 60 * 60
+DEFAULT_MAX_WORKERS = 4
+# number of job runs of a single job fetched concurrently while it is synced, so that a watch never runs more than
+# max_workers * DEFAULT_MAX_WORKERS_PER_JOB fetches at once
+DEFAULT_MAX_WORKERS_PER_JOB = 2
+# number of times a job is polled within the typical gap between two of its builds
+POLLS_PER_BUILD = 4
+# factor the interval of a job grows by every time a poll finds no new builds
+IDLE_BACKOFF_FACTOR = 1.5
+# number of most recent builds of a job used to work out how often it is built
+CADENCE_SAMPLE_SIZE = 10
+
+
+class JobWatchState(BaseModel):
+    """The polling state of a single watched job."""
+
+    job_name: str
+    job_run_type: Optional[type[JobRun]] = None
+    interval_seconds: float
+    # interval based on the job's build cadence, that the interval is reset to whenever a new build is found
+    base_interval_seconds: float
+    last_completed_build_number: Optional[int] = None
+    polls: int = 0
+    syncs: int = 0
+    errors: int = 0
+
+
+def _get_build_cadence_seconds(job_name: str) -> Optional[float]:
+    """
+    Get the typical number of seconds between two builds of a job, based on its most recent builds in the database.
+
+    Returns:
+        Optional[float]: The median gap between the job's recent builds, or None if there are not enough builds.
+    """
+    timestamps = db.get_recent_job_run_timestamps(job_name, limit=CADENCE_SAMPLE_SIZE)
+    gaps = [(newer - older) / 1000 for newer, older in zip(timestamps, timestamps[1:]) if newer > older]
+    if not gaps:
+        return None
+    return statistics.median(gaps)
+
+
+def _get_base_interval_seconds(job_name: str, min_interval_seconds: float, max_interval_seconds: float) -> float:
+    cadence_seconds = _get_build_cadence_seconds(job_name)
+    if cadence_seconds is None:
+        return min_interval_seconds
+    return min(max(cadence_seconds / POLLS_PER_BUILD, min_interval_seconds), max_interval_seconds)
+
+
+def _poll_job(state: JobWatchState, max_workers_per_job: int) -> bool:
+    """
+    Check a job for new completed builds and sync it if there are any.
+
+    Returns:
+        bool: Whether the job had new completed builds.
+    """
+    state.polls += 1
+    probe = jenkins._probe_job_from_api(jenkins._make_url_from_job_name(state.job_name))
+    last_completed_build_number = jenkins._get_build_number(probe, "lastCompletedBuild")
+    if state.last_completed_build_number is not None and (
+        last_completed_build_number == state.last_completed_build_number
+    ):
+        return False
+
+    # the probe is passed on so that the job is not probed a second time to check if it changed
+    job, _ = jenkins.collect_all_job_runs(
+        state.job_name, job_run_type=state.job_run_type, max_workers=max_workers_per_job, probe=probe
+    )
+    state.syncs += 1
+    state.last_completed_build_number = job.last_completed_build_number
+    return True
+
+
+def _reschedule(
+    state: JobWatchState,
+    had_new_builds: bool,
+    min_interval_seconds: float,
+    max_interval_seconds: float,
+):
+    if had_new_builds:
+        state.base_interval_seconds = _get_base_interval_seconds(
+            state.job_name, min_interval_seconds, max_interval_seconds
+        )
+        state.interval_seconds = state.base_interval_seconds
+    else:
+        state.interval_seconds = min(state.interval_seconds * IDLE_BACKOFF_FACTOR, max_interval_seconds)
+
+
+def watch_jobs(
+    jobs: Dict[str, Optional[type[JobRun]]],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    max_workers_per_job: int = DEFAULT_MAX_WORKERS_PER_JOB,
+    min_interval_seconds: float = DEFAULT_MIN_INTERVAL_SECONDS,
+    max_interval_seconds: float = DEFAULT_MAX_INTERVAL_SECONDS,
+    stop_event: Optional[threading.Event] = None,
+) -> Dict[str, JobWatchState]:
+    """
+    Poll jobs on Jenkins until stopped, ingesting new builds of a job as soon as its last completed build moves.
+
+    Every job is synced once when the watch starts, to catch up on anything that was built while it was not running.
+
+    Args:
+        jobs (Dict[str, Optional[type[JobRun]]]): mapping of job name -> type of job run to create (or None to detect
+            it).
+        max_workers (int): The number of jobs polled concurrently.
+        max_workers_per_job (int): The number of job runs of a single job fetched concurrently while it is synced.
+        min_interval_seconds (float): The shortest time between two polls of the same job.
+        max_interval_seconds (float): The longest time between two polls of the same job.
+        stop_event (Optional[threading.Event]): Event that stops the watch once set. Jobs that are being synced are
+            finished first.
+
+    Returns:
+        Dict[str, JobWatchState]: The polling state of every job when the watch stopped.
+    """
+    if min_interval_seconds > max_interval_seconds:
+        raise ValueError("min_interval_seconds must not be greater than max_interval_seconds")
+    db.prepare_db()
+    stop_event = stop_event or threading.Event()
+
+    states: Dict[str, JobWatchState] = {}
+    schedule = []
+    for job_name, job_run_type in jobs.items():
+        base_interval_seconds = _get_base_interval_seconds(job_name, min_interval_seconds, max_interval_seconds)
+        states[job_name] = JobWatchState(
+            job_name=job_name,
+            job_run_type=job_run_type,
+            interval_seconds=base_interval_seconds,
+            base_interval_seconds=base_interval_seconds,
+        )
+        heapq.heappush(schedule, (time.monotonic(), job_name))
+    print(f"Watching {len(states)} job(s)")
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while not stop_event.is_set():
+            while schedule and schedule[0][0] <= time.monotonic() and len(in_flight) < max_workers:
+                _, job_name = heapq.heappop(schedule)
+                in_flight[executor.submit(_poll_job, states[job_name], max_workers_per_job)] = job_name
+
+            timeout = max(schedule[0][0] - time.monotonic(), 0) if schedule else min_interval_seconds
+            if in_flight:
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            else:
+                stop_event.wait(timeout)
+                done = set()
+
+            for future in done:
+                state = states[in_flight.pop(future)]
+                try:
+                    had_new_builds = future.result()
+                except Exception as e:
+                    state.errors += 1
+                    had_new_builds = False
+                    print(f"Failed to poll job: {state.job_name}: {e}")
+                _reschedule(state, had_new_builds, min_interval_seconds, max_interval_seconds)
+                heapq.heappush(schedule, (time.monotonic() + state.interval_seconds, state.job_name))
+
+        wait(in_flight)
+    print(f"Stopped watching {len(states)} job(s)")
+    return states
+
+
+def watch_projects(
+    configs: List[SyncConfig],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    max_workers_per_job: int = DEFAULT_MAX_WORKERS_PER_JOB,
+    min_interval_seconds: float = DEFAULT_MIN_INTERVAL_SECONDS,
+    max_interval_seconds: float = DEFAULT_MAX_INTERVAL_SECONDS,
+    stop_event: Optional[threading.Event] = None,
+) -> Dict[str, JobWatchState]:
+    """
+    Watch every job of the given projects until stopped. See `watch_jobs`.
+
+    Args:
+        configs (List[SyncConfig]): ProjectConfigs, PipelineConfigs, CloudInitPipelineConfigs, or lists of
+            CloudInitPipelineConfigs to watch.
+        max_workers (int): The number of jobs polled concurrently.
+        max_workers_per_job (int): The number of job runs of a single job fetched concurrently while it is synced.
+        min_interval_seconds (float): The shortest time between two polls of the same job.
+        max_interval_seconds (float): The longest time between two polls of the same job.
+        stop_event (Optional[threading.Event]): Event that stops the watch once set.
+
+    Returns:
+        Dict[str, JobWatchState]: The polling state of every job when the watch stopped.
+    """
+    return watch_jobs(
+        get_jobs_to_sync(configs),
+        max_workers=max_workers,
+        max_workers_per_job=max_workers_per_job,
+        min_interval_seconds=min_interval_seconds,
+        max_interval_seconds=max_interval_seconds,
+        stop_event=stop_event,
+    )
@@ -0,0 +1,307 @@
+"""
+Module for distributed collector workers that share a single sync through a work queue in MongoDB.
+
+One process plans the sync and adds every (job, build) to fetch to the work queue. Any number of worker processes,
+possibly on different hosts, then claim work items with a lease, fetch the job runs and save them in batches through
+`db.BulkSaveBuffer`. Leases are renewed by a heartbeat while a worker is busy with an item, until its job run is
+saved. If a worker dies, its leases expire and the items are claimed again by another worker, until they used up
+`db.MAX_BUILD_SYNC_ATTEMPTS` attempts and are marked as failed.
+
+A job run is never saved twice: a worker checks that it still holds the lease right before buffering it for saving,
+job runs are upserted on their job name and build number, and the unique job run index created by `db.prepare_db`
+rejects a duplicate if two workers still race.
+
+Example:
+    # on one host
+    from cpc_jank_db.workers import enqueue_projects
+    enqueue_projects([oracle_project_config, CloudInitPipelineConfig.generate_all_configs()])
+
+    # on every host (or: python -m cpc_jank_db.workers)
+    from cpc_jank_db.workers import run_collector_worker
+    report = run_collector_worker(max_workers=8)
+"""
+
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel, Field
+
+from cpc_jank_db import db, jenkins
+from cpc_jank_db.models import JobRun, MatrixJobRun, TestJobRun, TestMatrixJobRun
+from cpc_jank_db.sync import (
+    DEFAULT_FRESH_BUILDS_PER_JOB,
+    SyncConfig,
+    SyncReport,
+    get_jobs_to_sync,
+    plan_sync_tasks,
+    skip_jobs_not_needing_sync,
+)
+
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_HEARTBEAT_SECONDS = 60
+DEFAULT_POLL_SECONDS = 10
+DEFAULT_MAX_WORKERS = 4
+
+JOB_RUN_TYPES = {cls.__name__: cls for cls in [JobRun, MatrixJobRun, TestJobRun, TestMatrixJobRun]}
+
+
+class LeaseLostError(Exception):
+    """Raised when a worker no longer holds the lease of the work item it is working on."""
+
+
+class WorkerReport(BaseModel):
+    worker_id: str
+    completed: List[str] = Field(default_factory=list)
+    failed: List[str] = Field(default_factory=list)
+    lost_leases: List[str] = Field(default_factory=list)
+
+    def add(self, item_id: str, outcome: str):
+        """Add a work item to the list of its outcome: "completed", "failed" or "lost_lease"."""
+        {"completed": self.completed, "failed": self.failed, "lost_lease": self.lost_leases}[outcome].append(item_id)
+
+
+def _encode_priority(priority: Tuple[int, int, int]) -> str:
+    # mongo sorts arrays by their smallest element, so the priority is stored as a string that sorts the same way
+    # as the tuple: (phase, rank, -timestamp)
+    phase, rank, negative_timestamp = priority
+    return f"{phase}-{rank:010d}-{10**15 + negative_timestamp:016d}"
+
+
+def enqueue_projects(
+    configs: List[SyncConfig],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    fresh_builds_per_job: int = DEFAULT_FRESH_BUILDS_PER_JOB,
+) -> SyncReport:
+    """
+    Plan a sync of the given projects and add every build to fetch to the shared work queue.
+
+    Args:
+        configs (List[SyncConfig]): ProjectConfigs, PipelineConfigs, CloudInitPipelineConfigs, or lists of
+            CloudInitPipelineConfigs to sync.
+        max_workers (int): The number of jobs to plan concurrently.
+        fresh_builds_per_job (int): The number of newest builds of each job to prioritize.
+
+    Returns:
+        SyncReport: Report containing the jobs that were skipped or could not be planned.
+    """
+    db.prepare_db()
+    report = SyncReport()
+    jobs = skip_jobs_not_needing_sync(get_jobs_to_sync(configs), report)
+    tasks = plan_sync_tasks(jobs, report, max_workers=max_workers, fresh_builds_per_job=fresh_builds_per_job)
+    added = db.enqueue_work_items(
+        [
+            {
+                "jobName": task.job_name,
+                "buildNumber": task.build_number,
+                "priority": _encode_priority(task.priority),
+                "jobRunType": task.job_run_type.__name__ if task.job_run_type else None,
+                "jobRunApiJson": task.job_run_api_json,
+            }
+            for task in tasks
+        ]
+    )
+    print(f"Added {added} work item(s) to the work queue ({len(tasks) - added} were already queued)")
+    return report
+
+
+class _LeaseHeartbeat(threading.Thread):
+    """Background thread that keeps renewing the leases of the work items a worker is busy with."""
+
+    def __init__(self, worker_id: str, lease_seconds: float, heartbeat_seconds: float):
+        super().__init__(daemon=True, name=f"lease-heartbeat-{worker_id}")
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.lost: Set[str] = set()
+        self._item_ids: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def add(self, item_id: str):
+        with self._lock:
+            self._item_ids.add(item_id)
+
+    def remove(self, item_id: str):
+        with self._lock:
+            self._item_ids.discard(item_id)
+
+    def run(self):
+        while not self._stopped.wait(self.heartbeat_seconds):
+            with self._lock:
+                item_ids = list(self._item_ids)
+            for item_id in item_ids:
+                try:
+                    if not db.renew_work_item_lease(item_id, self.worker_id, self.lease_seconds):
+                        with self._lock:
+                            self.lost.add(item_id)
+                except Exception as e:
+                    print(f"Failed to renew lease of work item {item_id}: {e}")
+
+    def stop(self):
+        self._stopped.set()
+
+
+def _collect_work_item(item: dict, worker_id: str, lease_seconds: float, heartbeat: _LeaseHeartbeat) -> JobRun:
+    job_run = jenkins.collect_job_run(
+        job_name=item["jobName"],
+        build_number=item["buildNumber"],
+        job_run_type=JOB_RUN_TYPES.get(item.get("jobRunType")),
+        job_run_api_json=item.get("jobRunApiJson"),
+    )
+    # fence the write: never save a job run for an item that another worker may have claimed in the meantime
+    if item["_id"] in heartbeat.lost or not db.renew_work_item_lease(item["_id"], worker_id, lease_seconds):
+        raise LeaseLostError(f"Lost lease of work item {item['_id']} before saving it")
+    return job_run
+
+
+def _finish_work_item(item_id: str, job_name: str, outcome: str, heartbeat: _LeaseHeartbeat, report: WorkerReport):
+    heartbeat.remove(item_id)
+    report.add(item_id, outcome)
+    if outcome != "lost_lease" and db.count_open_work_items(job_name) == 0:
+        db.finish_job_sync(job_name)
+
+
+def _fail_work_item(
+    item_id: str,
+    job_name: str,
+    build_number: int,
+    error: Exception,
+    worker_id: str,
+    heartbeat: _LeaseHeartbeat,
+    report: WorkerReport,
+):
+    jenkins._record_job_run_failure(job_name, build_number, error)
+    outcome = "failed" if db.fail_work_item(item_id, worker_id, error) else "lost_lease"
+    _finish_work_item(item_id, job_name, outcome, heartbeat, report)
+
+
+def _process_work_item(
+    item: dict,
+    worker_id: str,
+    lease_seconds: float,
+    heartbeat: _LeaseHeartbeat,
+    save_buffer: db.BulkSaveBuffer,
+    report: WorkerReport,
+):
+    """
+    Fetch the job run of a claimed work item and buffer it for saving, as long as the worker still holds the lease.
+
+    The lease of the item keeps being renewed until the buffer is flushed, when the outcome of the item is added to
+    the report (see `_on_work_items_saved`). Items that fail before that are added to the report right away.
+    """
+    item_id = item["_id"]
+    job_name, build_number = item["jobName"], item["buildNumber"]
+    try:
+        job_run = _collect_work_item(item, worker_id, lease_seconds, heartbeat)
+    except LeaseLostError as e:
+        print(e)
+        _finish_work_item(item_id, job_name, "lost_lease", heartbeat, report)
+        return
+    except Exception as e:
+        _fail_work_item(item_id, job_name, build_number, e, worker_id, heartbeat, report)
+        return
+    save_buffer.add(job_run)
+
+
+def _on_work_items_saved(
+    results: List[db.SaveResult], worker_id: str, heartbeat: _LeaseHeartbeat, report: WorkerReport
+):
+    """Complete the work items whose job runs were saved in a batch, and release the ones that failed to save."""
+    synced_build_numbers_per_job: Dict[str, List[int]] = {}
+    for result in results:
+        if result.saved:
+            synced_build_numbers_per_job.setdefault(result.job_name, []).append(result.build_number)
+    for job_name, build_numbers in synced_build_numbers_per_job.items():
+        db.record_builds_synced(job_name, build_numbers)
+
+    for result in results:
+        # work items have the same id as the sync journal entry of their build
+        item_id = db._get_build_journal_id(result.job_name, result.build_number)
+        if not result.saved:
+            error = db.SaveError(result.error)
+            _fail_work_item(item_id, result.job_name, result.build_number, error, worker_id, heartbeat, report)
+            continue
+        outcome = "completed" if db.complete_work_item(item_id, worker_id) else "lost_lease"
+        _finish_work_item(item_id, result.job_name, outcome, heartbeat, report)
+
+
+def run_collector_worker(
+    worker_id: Optional[str] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    heartbeat_seconds: float = DEFAULT_HEARTBEAT_SECONDS,
+    poll_seconds: float = DEFAULT_POLL_SECONDS,
+    exit_when_idle: bool = True,
+    stop_event: Optional[threading.Event] = None,
+) -> WorkerReport:
+    """
+    Claim work items from the shared work queue and collect them until there is no work left.
+
+    Args:
+        worker_id (Optional[str]): The unique id of this worker. Defaults to "<hostname>-<pid>-<random>".
+        max_workers (int): The number of work items this worker processes concurrently.
+        lease_seconds (float): How long a claimed work item is held before another worker may claim it, unless
+            the lease is renewed.
+        heartbeat_seconds (float): How often the leases of the work items being processed are renewed. Must be
+            well below `lease_seconds`.
+        poll_seconds (float): How long to wait before checking the queue again when there is no work to claim.
+        exit_when_idle (bool): Whether to return once the queue is empty, instead of waiting for more work.
+        stop_event (Optional[threading.Event]): Event that stops the worker once set. Work items already being
+            processed are finished first.
+
+    Returns:
+        WorkerReport: The ids of the work items that were completed, failed or lost to another worker.
+    """
+    if heartbeat_seconds >= lease_seconds:
+        raise ValueError("heartbeat_seconds must be less than lease_seconds")
+    db.prepare_db()
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    stop_event = stop_event or threading.Event()
+    report = WorkerReport(worker_id=worker_id)
+    heartbeat = _LeaseHeartbeat(worker_id, lease_seconds, heartbeat_seconds)
+    heartbeat.start()
+    save_buffer = db.BulkSaveBuffer(lambda results: _on_work_items_saved(results, worker_id, heartbeat, report))
+
+    in_flight = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                while not stop_event.is_set() and len(in_flight) < max_workers:
+                    item = db.claim_work_item(worker_id, lease_seconds)
+                    if item is None:
+                        break
+                    heartbeat.add(item["_id"])
+                    future = executor.submit(
+                        _process_work_item, item, worker_id, lease_seconds, heartbeat, save_buffer, report
+                    )
+                    in_flight[future] = item["_id"]
+
+                if not in_flight:
+                    # nothing left to fetch for now, so save the partial batch instead of holding its leases
+                    save_buffer.flush()
+                    if exit_when_idle or stop_event.is_set():
+                        break
+                    stop_event.wait(poll_seconds)
+                    continue
+
+                done, _ = wait(in_flight, timeout=poll_seconds, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del in_flight[future]
+                    future.result()
+    finally:
+        save_buffer.flush()
+        heartbeat.stop()
+
+    print(
+        f"Worker {worker_id} completed {len(report.completed)} work item(s), {len(report.failed)} failed, "
+        f"{len(report.lost_leases)} lost to other workers"
+    )
+    return report
+
+
+if __name__ == "__main__":
+    run_collector_worker()
@@ -0,0 +1,47 @@
+"""
+Shared test setup.
+
+`cpc_jank_db.db` connects to MongoDB as soon as it is imported and `cpc_jank_db.jenkins` reads its credentials from the
+environment, so the environment is set and the MongoDB client is replaced by an in-memory mongomock client here,
+before any test module imports them.
+"""
+
+import inspect
+import os
+import tempfile
+
+import mongomock
+import pymongo
+import pytest
+
+os.environ["MONGO_URI"] = "mongodb://localhost:27069/"
+os.environ["MONGO_USERNAME"] = ""
+os.environ["MONGO_PASSWORD"] = ""
+os.environ["MONGO_DB_NAME"] = "test_cpc_jank_db"
+os.environ["JENKINS_API_URL"] = "https://jenkins.test"
+os.environ["JENKINS_SSO_URL"] = "https://jenkins.test"
+os.environ["JENKINS_API_USERNAME"] = "test-user"
+os.environ["JENKINS_API_PASSWORD"] = "test-password"
+os.environ["JENKINS_CACHE_DIR"] = tempfile.mkdtemp(prefix="cpc-jank-db-test-cache-")
+
+pymongo.MongoClient = mongomock.MongoClient
+
+# pymongo >= 4.11 passes a `sort` argument along with every UpdateOne of a bulk write, which mongomock does not accept
+_add_update = mongomock.collection.BulkOperationBuilder.add_update
+if "sort" not in inspect.signature(_add_update).parameters:
+
+    def _add_update_without_sort(self, *args, sort=None, **kwargs):
+        return _add_update(self, *args, **kwargs)
+
+    mongomock.collection.BulkOperationBuilder.add_update = _add_update_without_sort
+
+
+@pytest.fixture
+def mongo():
+    """The `cpc_jank_db.db` module, with every collection emptied again after the test."""
+    from cpc_jank_db import db
+
+    yield db
+    for collection_name in db.db.list_collection_names():
+        if collection_name != db.migration_collection.name:
+            db.db[collection_name].delete_many({})
@@ -0,0 +1,101 @@
+import asyncio
+
+import httpx
+
+from cpc_jank_db import async_jenkins, jenkins, models
+
+HOST = "jenkins.test"
+
+
+def _client(handler) -> async_jenkins.AsyncJenkinsClient:
+    client = async_jenkins.AsyncJenkinsClient(max_concurrency=4, backoff_factor=0.0)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_slot_is_released_before_the_body_is_read():
+    in_flight_while_reading = []
+
+    async def read_body(response: httpx.Response) -> bytes:
+        in_flight_while_reading.append(client.get_concurrency_stats().in_flight)
+        return await response.aread()
+
+    async def main():
+        async with client:
+            return await client._get(f"https://{HOST}/some/url", "fetch data", read_body)
+
+    client = _client(lambda request: httpx.Response(200, content=b"body"))
+    assert asyncio.run(main()) == b"body"
+    assert in_flight_while_reading == [0]
+    assert client.get_stats()["fetch data"].request_count == 1
+
+
+def test_throttled_response_is_retried_and_lowers_the_limit():
+    status_codes = iter([429, 200])
+
+    async def read_body(response: httpx.Response) -> bytes:
+        return await response.aread()
+
+    async def main():
+        async with client:
+            return await client._get(f"https://{HOST}/some/url", "fetch data", read_body)
+
+    client = _client(lambda request: httpx.Response(next(status_codes), content=b"body"))
+    assert asyncio.run(main()) == b"body"
+    stats = client.get_concurrency_stats()
+    assert stats.throttle_events == 1
+    assert stats.in_flight == 0
+    assert client.get_stats()["fetch data"].retry_count == 1
+
+
+def test_job_without_new_builds_does_not_restart_its_sync(mongo, monkeypatch):
+    job = models.Job(url=f"https://{HOST}/job/some-job/api/json", fullDisplayName="some-job", buildNumbers=[1])
+    job.last_completed_build_number = 1
+    client = _client(lambda request: httpx.Response(500))
+
+    async def fetch_and_refresh_job(job_name: str) -> models.Job:
+        return job
+
+    monkeypatch.setattr(client, "_fetch_and_refresh_job", fetch_and_refresh_job)
+    monkeypatch.setattr(jenkins, "_get_build_numbers_to_fetch", lambda job_name, job: [])
+    mongo.start_job_sync("some-job", [], 1)
+    mongo.finish_job_sync("some-job")
+    finished_at = mongo.get_job_sync_journal("some-job")["finishedAt"]
+
+    async def main():
+        async with client:
+            return await client._collect_all_job_runs("some-job", None, 1)
+
+    assert asyncio.run(main()) == (job, [], [])
+    assert mongo.get_job_sync_journal("some-job")["finishedAt"] == finished_at
+
+
+def test_collect_projects_bounds_the_jobs_in_flight(monkeypatch):
+    client = _client(lambda request: httpx.Response(500))
+    in_flight = []
+    in_flight_counts = []
+
+    async def discover_jobs():
+        raise RuntimeError("discovery is not available")
+
+    async def collect_all_job_runs(job_name, job_run_type, max_job_runs_in_flight):
+        in_flight.append(job_name)
+        in_flight_counts.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(job_name)
+        return None, [], []
+
+    monkeypatch.setattr(client, "discover_jobs", discover_jobs)
+    monkeypatch.setattr(client, "_collect_all_job_runs", collect_all_job_runs)
+    monkeypatch.setattr(
+        async_jenkins, "get_jobs_to_sync", lambda configs: {f"job-{index}": None for index in range(10)}
+    )
+
+    async def main():
+        async with client:
+            return await client.collect_projects([], max_jobs_in_flight=3)
+
+    report = asyncio.run(main())
+    assert len(in_flight_counts) == 10
+    assert max(in_flight_counts) == 3
+    assert not report.failed_jobs
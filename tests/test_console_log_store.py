@@ -0,0 +1,71 @@
+from collections import Counter
+
+from cpc_jank_db import models
+
+
+def _job_run_fields(url: str, build_number: int) -> dict:
+    return {
+        "url": url,
+        "fullDisplayName": f"some-matrix-job #{build_number}",
+        "buildNumber": build_number,
+        "timestamp_ms": build_number * 1000,
+        "duration_ms": 1000,
+        "buildParameters": {},
+        "result": "SUCCESS",
+    }
+
+
+def _matrix_job_run(build_number: int, children: int) -> models.MatrixJobRun:
+    base_url = "https://jenkins.test/job/some-matrix-job"
+    return models.MatrixJobRun(
+        **_job_run_fields(f"{base_url}/{build_number}/", build_number),
+        consoleOutput=f"parent {build_number}\n",
+        matrix_runs=[
+            models.MatrixChildRun.from_data(
+                **_job_run_fields(f"{base_url}/arch=arch{child}/{build_number}/", build_number),
+                consoleOutput=f"shared boilerplate\nchild {child} of {build_number}\n",
+            )
+            for child in range(children)
+        ],
+    )
+
+
+def _count_round_trips(monkeypatch, collections) -> Counter:
+    round_trips = Counter()
+    for collection in collections:
+        for method_name in ("find", "find_one", "bulk_write", "update_one"):
+            method = getattr(collection, method_name)
+
+            def counted(*args, method=method, key=(collection.name, method_name), **kwargs):
+                round_trips[key] += 1
+                return method(*args, **kwargs)
+
+            monkeypatch.setattr(collection, method_name, counted)
+    return round_trips
+
+
+def test_console_logs_are_saved_once_and_loaded_back(mongo):
+    log_ids = mongo.save_console_logs(["same log\n", "other log\n", "same log\n"])
+    assert log_ids[0] == log_ids[2] != log_ids[1]
+    assert mongo.console_log_collection.count_documents({}) == 2
+    assert mongo.save_console_logs(["same log\n"]) == [log_ids[0]]
+    assert mongo.get_console_log(log_ids[1]) == "other log\n"
+    assert mongo.save_console_logs([]) == []
+
+
+def test_batch_of_job_runs_saves_its_console_logs_in_a_few_round_trips(mongo, monkeypatch):
+    job_runs = [_matrix_job_run(build_number, children=5) for build_number in range(1, 11)]
+    round_trips = _count_round_trips(monkeypatch, [mongo.console_log_collection, mongo.console_log_chunk_collection])
+    results = mongo.save_many_to_mongo(job_runs)
+    assert all(result.outcome == "inserted" for result in results)
+    assert round_trips == Counter({
+        (mongo.console_log_collection.name, "find"): 1,
+        (mongo.console_log_chunk_collection.name, "bulk_write"): 1,
+        (mongo.console_log_collection.name, "bulk_write"): 1,
+    })
+
+    job_run = mongo.get_job_run_from_db("some-matrix-job", 10, include_console_output=True)
+    assert job_run.console_output == "parent 10\n"
+    assert [run.console_output for run in job_run.matrix_runs] == [
+        f"shared boilerplate\nchild {child} of 10\n" for child in range(5)
+    ]
@@ -0,0 +1,51 @@
+from cpc_jank_db.jenkins import CONSOLE_OUTPUT_TRUNCATION_MARKER, ConsoleOutputWindow
+
+
+def _feed(window: ConsoleOutputWindow, text: str, chunk_size: int) -> str:
+    for start in range(0, len(text), chunk_size):
+        window.feed(text[start : start + chunk_size])
+    return window.finish()
+
+
+def test_short_console_output_is_kept_whole():
+    window = ConsoleOutputWindow(max_chars=100)
+    assert _feed(window, "line 1\nline 2\n", chunk_size=3) == "line 1\nline 2\n"
+    assert window.total_chars == len("line 1\nline 2\n")
+
+
+def test_console_output_of_exactly_max_chars_is_not_truncated():
+    window = ConsoleOutputWindow(max_chars=10)
+    assert _feed(window, "0123456789", chunk_size=4) == "0123456789"
+
+
+def test_long_console_output_keeps_head_and_tail():
+    text = "".join(f"line {i}\n" for i in range(1000))
+    window = ConsoleOutputWindow(max_chars=50)
+    output = _feed(window, text, chunk_size=7)
+    assert output == text[:50] + CONSOLE_OUTPUT_TRUNCATION_MARKER + text[-50:]
+    assert window.total_chars == len(text)
+
+
+def test_tail_is_bounded_while_streaming():
+    window = ConsoleOutputWindow(max_chars=10)
+    for _ in range(1000):
+        window.feed("x" * 3)
+    # the tail keeps just enough chunks to cover the last max_chars characters
+    assert window._tail_chars < 10 + 3
+
+
+def test_line_handlers_see_every_line_of_the_full_output():
+    text = "".join(f"line {i}\n" for i in range(100)) + "last line without newline"
+    lines = []
+    window = ConsoleOutputWindow(max_chars=20, line_handlers=[lines.append])
+    _feed(window, text, chunk_size=5)
+    assert lines == [f"line {i}" for i in range(100)] + ["last line without newline"]
+
+
+def test_empty_chunks_are_ignored():
+    lines = []
+    window = ConsoleOutputWindow(max_chars=20, line_handlers=[lines.append])
+    window.feed("")
+    assert window.finish() == ""
+    assert window.total_chars == 0
+    assert lines == []
@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+from cpc_jank_db.http_client import AdaptiveConcurrencyLimiter
+
+HOST = "jenkins.test"
+
+
+def _fill(limiter: AdaptiveConcurrencyLimiter, host: str = HOST) -> int:
+    taken = 0
+    while limiter.try_acquire(host):
+        taken += 1
+    return taken
+
+
+def test_initial_limit_is_clamped_to_min_and_max():
+    assert AdaptiveConcurrencyLimiter(initial_limit=100, max_limit=8).get_stats().current_limit == 8
+    assert AdaptiveConcurrencyLimiter(initial_limit=0, min_limit=2).get_stats().current_limit == 2
+
+
+def test_try_acquire_stops_at_the_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=3, max_limit=10)
+    assert _fill(limiter) == 3
+    limiter.release(HOST, latency=0.1)
+    assert limiter.try_acquire(HOST)
+    assert limiter.get_stats().in_flight == 3
+
+
+def test_per_host_limits_cap_a_single_host():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=10, max_limit=10, per_host_limit=2, per_host_limits={"b": 1})
+    assert _fill(limiter, "a") == 2
+    assert _fill(limiter, "b") == 1
+    assert _fill(limiter, "c") == 2
+    assert limiter.get_stats().in_flight_per_host == {"a": 2, "b": 1, "c": 2}
+
+
+def test_fast_responses_increase_the_limit_up_to_max_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=4, target_latency=1.0)
+    for _ in range(100):
+        limiter.acquire(HOST)
+        limiter.release(HOST, latency=0.1)
+    assert limiter.get_stats().current_limit == 4
+
+
+@pytest.mark.parametrize(
+    "outcome",
+    [{"throttled": True}, {"failed": True}, {"latency": 10.0}],
+    ids=["throttled", "failed", "slow"],
+)
+def test_bad_responses_decrease_the_limit(outcome):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=8, target_latency=1.0, decrease_factor=0.5)
+    limiter.acquire(HOST)
+    limiter.release(HOST, **{"latency": 0.1, **outcome})
+    stats = limiter.get_stats()
+    assert stats.current_limit == 4
+    assert stats.decrease_events == 1
+
+
+def test_decreases_within_the_cooldown_count_once_and_stop_at_min_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, min_limit=2, max_limit=8, decrease_cooldown=60.0)
+    for _ in range(3):
+        limiter.acquire(HOST)
+        limiter.release(HOST, latency=0.1, throttled=True)
+    stats = limiter.get_stats()
+    assert stats.current_limit == 4
+    assert stats.decrease_events == 1
+    assert stats.throttle_events == 3
+
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, min_limit=2, max_limit=8, decrease_cooldown=0.0)
+    for _ in range(10):
+        limiter.acquire(HOST)
+        limiter.release(HOST, latency=0.1, throttled=True)
+    assert limiter.get_stats().current_limit == 2
+
+
+def test_slot_releases_with_the_reported_outcome():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=4)
+    with limiter.slot(HOST) as outcome:
+        assert limiter.get_stats().in_flight == 1
+        outcome["throttled"] = True
+    stats = limiter.get_stats()
+    assert stats.in_flight == 0
+    assert stats.throttle_events == 1
+    assert stats.current_limit == 2
+
+
+def test_slot_is_released_when_the_request_raises():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1)
+    with pytest.raises(RuntimeError):
+        with limiter.slot(HOST):
+            raise RuntimeError("request failed")
+    assert limiter.get_stats().in_flight == 0
+    assert limiter.try_acquire(HOST)
+
+
+def test_acquire_blocks_until_a_slot_is_released():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1)
+    limiter.acquire(HOST)
+    acquired = threading.Event()
+
+    def acquire():
+        limiter.acquire(HOST)
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    assert not acquired.wait(0.1)
+    limiter.release(HOST, latency=0.1)
+    assert acquired.wait(5)
+    thread.join()
@@ -0,0 +1,39 @@
+from cpc_jank_db import jenkins
+
+FOLDER_CLASS = "com.cloudbees.hudson.plugins.folder.Folder"
+MULTIBRANCH_CLASS = "org.jenkinsci.plugins.workflow.multibranch.WorkflowMultiBranchProject"
+
+
+def _job(name: str, last_build_number: int) -> dict:
+    return {
+        "_class": "hudson.model.FreeStyleProject",
+        "name": name,
+        "url": f"https://jenkins.test/job/{name}/",
+        "lastBuild": {"number": last_build_number},
+        "lastCompletedBuild": {"number": last_build_number - 1},
+    }
+
+
+def test_jobs_in_folders_are_named_by_their_path():
+    data = {
+        "jobs": [
+            _job("top-level-job", 3),
+            {
+                "_class": FOLDER_CLASS,
+                "name": "folder",
+                "jobs": [{"_class": MULTIBRANCH_CLASS, "name": "project", "jobs": [_job("main", 2)]}],
+            },
+            # folders without jobs are still folders, not jobs without builds
+            {"_class": FOLDER_CLASS, "name": "empty-folder", "jobs": []},
+        ]
+    }
+    snapshots = jenkins._parse_job_snapshots(data)
+    assert sorted(snapshots) == ["folder/job/project/job/main", "top-level-job"]
+    assert snapshots["top-level-job"].last_build_number == 3
+    assert snapshots["top-level-job"].last_completed_build_number == 2
+
+
+def test_folders_deeper_than_the_discovery_are_skipped():
+    # the jobs of folders at the maximum depth are not fetched, so the folders come without a jobs field
+    data = {"jobs": [_job("some-job", 1), {"_class": FOLDER_CLASS, "name": "too-deep"}]}
+    assert list(jenkins._parse_job_snapshots(data)) == ["some-job"]
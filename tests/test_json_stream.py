@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from cpc_jank_db import json_stream
+from cpc_jank_db.json_stream import DROP, StreamingJSONBuilder
+
+TEST_REPORT = {
+    "duration": 1.5,
+    "suites": [
+        {
+            "name": "suite-1",
+            "cases": [
+                {"name": "test_a", "status": "PASSED", "duration": 0.5},
+                {"name": "test_b", "status": "FAILED", "duration": 1.0, "errorDetails": "assert 1 == 2"},
+            ],
+        },
+        {"name": "suite-2", "cases": [{"name": "test_c", "status": "SKIPPED", "duration": 0}]},
+    ],
+    "empty": {},
+    "flags": [True, False, None],
+}
+
+
+@pytest.fixture(params=[True, False], ids=["ijson", "buffered"])
+def streaming(request, monkeypatch):
+    """Run the test with ijson, and once more without it as if the optional dependency were not installed."""
+    if request.param:
+        pytest.importorskip("ijson")
+    else:
+        monkeypatch.setattr(json_stream, "ijson", None)
+    return request.param
+
+
+def _build(builder: StreamingJSONBuilder, document, chunk_size: int = 7):
+    data = json.dumps(document).encode()
+    for start in range(0, len(data), chunk_size):
+        builder.feed(data[start : start + chunk_size])
+    return builder.finish()
+
+
+@pytest.mark.usefixtures("streaming")
+@pytest.mark.parametrize("document", [TEST_REPORT, [1, [2, {"a": "b"}]], "text", 42, None])
+def test_document_is_built_unchanged_without_converters(document):
+    assert _build(StreamingJSONBuilder(), document) == document
+
+
+@pytest.mark.usefixtures("streaming")
+def test_converters_are_applied_at_their_path():
+    builder = StreamingJSONBuilder({
+        "suites.item.cases.item": lambda case: DROP if case["status"] == "PASSED" else case["name"],
+        "suites.item": lambda suite: (suite["name"], suite["cases"]),
+    })
+    report = _build(builder, TEST_REPORT)
+    assert report["suites"] == [("suite-1", ["test_b"]), ("suite-2", ["test_c"])]
+    assert report["duration"] == 1.5
+
+
+@pytest.mark.usefixtures("streaming")
+def test_converters_see_children_already_converted():
+    seen = []
+    builder = StreamingJSONBuilder({
+        "suites.item.cases": lambda cases: seen.append(cases) or DROP,
+        "suites.item.cases.item": lambda case: case["name"],
+    })
+    report = _build(builder, TEST_REPORT)
+    assert seen == [["test_a", "test_b"], ["test_c"]]
+    assert report["suites"] == [{"name": "suite-1"}, {"name": "suite-2"}]
+
+
+def test_converted_values_are_released_while_streaming():
+    # the buffered fallback only converts the document once it is finished
+    pytest.importorskip("ijson")
+    converted = []
+    builder = StreamingJSONBuilder({"item": lambda item: converted.append(item["n"]) or DROP})
+    data = json.dumps([{"n": n} for n in range(100)]).encode()
+    builder.feed(data[: len(data) // 2])
+    # the items of the first half were converted (and dropped) before the rest of the document arrived
+    assert 0 < len(converted) < 100
+    builder.feed(data[len(data) // 2 :])
+    assert builder.finish() == []
+    assert converted == list(range(100))
+
+
+@pytest.mark.usefixtures("streaming")
+def test_empty_chunks_are_ignored():
+    builder = StreamingJSONBuilder()
+    builder.feed(b"")
+    builder.feed(b'{"a": 1}')
+    builder.feed(b"")
+    assert builder.finish() == {"a": 1}
+
+
+@pytest.mark.usefixtures("streaming")
+@pytest.mark.parametrize("data", [b'{"suites": [1, 2', b'{"suites": }'], ids=["incomplete", "invalid"])
+def test_invalid_documents_raise_value_error(data):
+    builder = StreamingJSONBuilder()
+    with pytest.raises(ValueError):
+        builder.feed(data)
+        builder.finish()
@@ -0,0 +1,188 @@
+import pytest
+
+from cpc_jank_db import models
+
+JOB_NAME = "some-test-job"
+MATRIX_JOB_NAME = "some-matrix-test-job"
+
+
+def _test_result(statuses):
+    cases = [
+        {
+            "className": "tests.test_something",
+            "name": f"test_{index}",
+            "status": status,
+            "duration": 0.5,
+            "skipped": status == "SKIPPED",
+            "testActions": [{"_class": "some.TestAction"}],
+        }
+        for index, status in enumerate(statuses)
+    ]
+    return {
+        "duration": 1.0,
+        "empty": False,
+        "failCount": sum(status in ("FAILED", "REGRESSION") for status in statuses),
+        "passCount": sum(status in ("PASSED", "FIXED") for status in statuses),
+        "skipCount": sum(status == "SKIPPED" for status in statuses),
+        "testActions": [{"_class": "some.TestResultAction"}],
+        "suites": [
+            {
+                "cases": cases,
+                "duration": 1.0,
+                "id": None,
+                "name": "suite",
+                "nodeId": None,
+                "timestamp": "2024-01-01T00:00:00",
+            }
+        ],
+    }
+
+
+def _job_run_fields(job_name: str, build_number: int) -> dict:
+    return {
+        "url": f"https://jenkins.test/job/{job_name}/{build_number}/",
+        "fullDisplayName": f"{job_name} #{build_number}",
+        "buildNumber": build_number,
+        "timestamp_ms": build_number * 1000,
+        "duration_ms": 1000,
+        "buildParameters": {},
+        "result": "UNSTABLE",
+    }
+
+
+@pytest.fixture
+def saved_test_job_run(mongo):
+    job_run = models.TestJobRun(
+        **_job_run_fields(JOB_NAME, 1),
+        testResults=_test_result(["PASSED", "FAILED", "FIXED", "REGRESSION", "SKIPPED"]),
+        consoleOutput="console output",
+    )
+    mongo.save_to_mongo(job_run)
+    return job_run
+
+
+@pytest.fixture
+def saved_test_matrix_job_run(mongo):
+    child_url = f"https://jenkins.test/job/{MATRIX_JOB_NAME}/arch=amd64,test=smoke/1/"
+    job_run = models.TestMatrixJobRun(
+        **_job_run_fields(MATRIX_JOB_NAME, 1),
+        matrix_runs=[models.MatrixChildRun.from_data(**{**_job_run_fields(MATRIX_JOB_NAME, 1), "url": child_url})],
+        testResults={
+            "failCount": 1,
+            "skipCount": 0,
+            "totalCount": 2,
+            "matrixTestReports": [
+                {
+                    "testConfig": {"arch": "amd64", "instance_type": None, "test": "smoke"},
+                    "testResult": _test_result(["PASSED", "FAILED"]),
+                    "url": child_url,
+                }
+            ],
+        },
+    )
+    mongo.save_to_mongo(job_run)
+    return job_run
+
+
+def _get_case_statuses(test_result) -> list:
+    return [case.status for suite in test_result.suites for case in suite.cases]
+
+
+def test_full_profile_loads_everything_but_the_console_output(mongo, saved_test_job_run):
+    (job_run,) = mongo.get_job_runs_for_job(JOB_NAME, profile="full")
+    assert job_run.test_results == saved_test_job_run.test_results
+    assert "console_output" not in job_run.__dict__
+    assert job_run.console_log_id is not None
+
+
+@pytest.mark.parametrize("profile", ["full", "failures", "summary"])
+def test_console_output_is_loaded_when_accessed(mongo, saved_test_job_run, profile):
+    (job_run,) = mongo.get_job_runs_for_job(JOB_NAME, profile=profile)
+    assert job_run.console_output == "console output"
+
+
+def test_console_output_of_matrix_child_runs_is_loaded_when_accessed(mongo):
+    child_url = f"https://jenkins.test/job/{MATRIX_JOB_NAME}/arch=amd64/1/"
+    mongo.save_to_mongo(
+        models.MatrixJobRun(
+            **_job_run_fields(MATRIX_JOB_NAME, 1),
+            matrix_runs=[
+                models.MatrixChildRun.from_data(
+                    **{**_job_run_fields(MATRIX_JOB_NAME, 1), "url": child_url}, consoleOutput="child output"
+                )
+            ],
+        )
+    )
+    for profile in ("full", "summary"):
+        (job_run,) = mongo.get_job_runs_for_job(MATRIX_JOB_NAME, profile=profile)
+        (matrix_run,) = job_run.matrix_runs
+        assert "console_output" not in matrix_run.__dict__
+        assert matrix_run.console_output == "child output"
+
+
+def test_job_run_loaded_without_its_console_output_is_saved_with_it(mongo, saved_test_job_run):
+    (job_run,) = mongo.get_job_runs_for_job(JOB_NAME, profile="full")
+    job_run.result = "SUCCESS"
+    mongo.save_to_mongo(job_run)
+    (job_run,) = mongo.get_job_runs_for_job(JOB_NAME, include_console_output=True)
+    assert job_run.result == "SUCCESS"
+    assert job_run.console_output == "console output"
+
+
+def test_failures_profile_leaves_out_passed_cases_and_test_actions(mongo, saved_test_job_run):
+    (document,) = mongo.get_job_runs_dict_for_job(JOB_NAME, profile="failures")
+    assert "consoleOutput" not in document
+    suite = document["testResults"]["suites"][0]
+    assert [case["status"] for case in suite["cases"]] == ["FAILED", "REGRESSION", "SKIPPED"]
+    assert all("testActions" not in case for case in suite["cases"])
+    assert "testActions" not in document["testResults"]
+
+    (job_run,) = mongo.get_job_runs_for_job(JOB_NAME, profile="failures")
+    assert _get_case_statuses(job_run.test_results) == ["FAILED", "REGRESSION", "SKIPPED"]
+    assert job_run.test_results.fail_count == 2
+    assert job_run.test_results.test_actions == []
+
+
+def test_job_run_loaded_with_the_failures_profile_is_not_saved(mongo, saved_test_job_run):
+    (job_run,) = mongo.get_job_runs_for_job(JOB_NAME, profile="failures")
+    assert job_run.partial_fields == {"test_results"}
+    with pytest.raises(ValueError):
+        mongo.save_many_to_mongo([job_run])
+    (job_run,) = mongo.get_job_runs_for_job(JOB_NAME, profile="full")
+    assert job_run.test_results == saved_test_job_run.test_results
+
+
+def test_failures_profile_leaves_out_passed_cases_of_matrix_test_reports(mongo, saved_test_matrix_job_run):
+    (job_run,) = mongo.get_job_runs_for_job(MATRIX_JOB_NAME, profile="failures")
+    (report,) = job_run.test_results.matrix_test_reports
+    assert _get_case_statuses(report.test_result) == ["FAILED"]
+    assert report.test_config == saved_test_matrix_job_run.test_results.matrix_test_reports[0].test_config
+    assert len(job_run.matrix_runs) == 1
+
+
+def test_summary_profile_leaves_out_heavy_fields_in_the_database(mongo, saved_test_job_run, saved_test_matrix_job_run):
+    for job_name in (JOB_NAME, MATRIX_JOB_NAME):
+        (document,) = mongo.get_job_runs_dict_for_job(job_name, profile="summary")
+        assert not {"consoleOutput", "testResults", "matrix_runs"} & document.keys()
+
+
+def test_summary_profile_loads_omitted_fields_when_accessed(mongo, saved_test_job_run, saved_test_matrix_job_run):
+    (job_run,) = mongo.get_job_runs_for_job(JOB_NAME, profile="summary")
+    assert "test_results" not in job_run.__dict__
+    assert job_run.test_results == saved_test_job_run.test_results
+
+    (matrix_job_run,) = mongo.get_job_runs_for_job(MATRIX_JOB_NAME, profile="summary")
+    assert [run.url for run in matrix_job_run.matrix_runs] == [run.url for run in saved_test_matrix_job_run.matrix_runs]
+    assert matrix_job_run.test_results == saved_test_matrix_job_run.test_results
+
+
+def test_summary_profile_keeps_fields_assigned_before_they_are_loaded(mongo, saved_test_job_run):
+    (job_run,) = mongo.get_job_runs_for_job(JOB_NAME, profile="summary")
+    job_run.test_results = None
+    assert job_run.model_dump()["test_results"] is None
+
+
+def test_profiles_can_include_the_console_output(mongo, saved_test_job_run):
+    for profile in ("full", "failures", "summary"):
+        (job_run,) = mongo.get_job_runs_for_job(JOB_NAME, include_console_output=True, profile=profile)
+        assert job_run.console_output == "console output"
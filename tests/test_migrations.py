@@ -0,0 +1,56 @@
+import pytest
+
+
+@pytest.fixture
+def unprepared_db(mongo, monkeypatch):
+    monkeypatch.setattr(mongo, "_db_prepared", mongo.threading.Event())
+    mongo.migration_collection.delete_many({})
+    yield mongo
+    mongo.migration_collection.delete_many({})
+
+
+def test_prepare_db_applies_every_migration_once_per_process(unprepared_db, monkeypatch):
+    applied = []
+    monkeypatch.setattr(
+        unprepared_db,
+        "MIGRATIONS",
+        [(name, lambda name=name: applied.append(name)) for name, _ in unprepared_db.MIGRATIONS],
+    )
+    unprepared_db.prepare_db()
+    unprepared_db.prepare_db()
+    assert applied == [name for name, _ in unprepared_db.MIGRATIONS]
+    assert {doc["_id"] for doc in unprepared_db.migration_collection.find()} == set(applied)
+
+
+def test_migrate_db_skips_migrations_already_applied(unprepared_db, monkeypatch):
+    applied = []
+    monkeypatch.setattr(unprepared_db, "MIGRATIONS", [("first", lambda: applied.append("first"))])
+    unprepared_db.migrate_db()
+    monkeypatch.setattr(
+        unprepared_db,
+        "MIGRATIONS",
+        [("first", lambda: applied.append("first")), ("second", lambda: applied.append("second"))],
+    )
+    unprepared_db.migrate_db()
+    assert applied == ["first", "second"]
+
+
+def test_backfill_extracted_fields_updates_job_runs_in_batches(mongo, monkeypatch):
+    mongo.job_run_collection.insert_many([
+        {"jobName": "some-job", "buildNumber": build_number, "consoleOutput": f"Linux version 6.{build_number}\n"}
+        for build_number in range(5)
+    ])
+    monkeypatch.setitem(mongo.extractors.EXTRACTORS, "kernelVersion", lambda line: line.split()[-1])
+    monkeypatch.setattr(mongo, "BACKFILL_BATCH_SIZE", 2)
+    bulk_writes = []
+    bulk_write = mongo.job_run_collection.bulk_write
+    monkeypatch.setattr(
+        mongo.job_run_collection,
+        "bulk_write",
+        lambda operations, **kwargs: bulk_writes.append(len(operations)) or bulk_write(operations, **kwargs),
+    )
+    mongo.backfill_extracted_fields(["kernelVersion"])
+    assert bulk_writes == [2, 2, 1]
+    assert sorted(doc["extractedFields"]["kernelVersion"] for doc in mongo.job_run_collection.find()) == [
+        f"6.{build_number}" for build_number in range(5)
+    ]
@@ -0,0 +1,36 @@
+import pytest
+
+from cpc_jank_db.models import Job, get_job_name_from_url
+
+
+@pytest.mark.parametrize(
+    "url, expected_job_name",
+    [
+        # job urls, as stored on jobs by `jenkins.collect_job`
+        ("https://jenkins.test/job/some-job/api/json", "some-job"),
+        ("https://jenkins.test/job/some-job/api/json/", "some-job"),
+        ("https://jenkins.test/job/some-job/", "some-job"),
+        ("https://jenkins.test/job/folder/job/some-job/api/json", "folder/job/some-job"),
+        # job run urls
+        ("https://jenkins.test/job/some-job/12/", "some-job"),
+        ("https://jenkins.test/job/some-job/12", "some-job"),
+        ("https://jenkins.test/job/some-job/12/api/json", "some-job"),
+        ("https://jenkins.test/job/folder/job/some-job/12/", "folder/job/some-job"),
+        ("https://jenkins.test/job/some%20job/3/", "some job"),
+    ],
+)
+def test_get_job_name_from_url(url, expected_job_name):
+    assert get_job_name_from_url(url) == expected_job_name
+
+
+def test_get_job_name_from_url_without_job():
+    assert get_job_name_from_url("https://jenkins.test/view/all/") is None
+
+
+def test_job_name_of_job_collected_from_api_url():
+    job = Job(
+        url="https://jenkins.test/job/cloud-init-integration-noble-ec2-generic/api/json",
+        fullDisplayName="cloud-init-integration-noble-ec2-generic",
+        buildNumbers=[1, 2],
+    )
+    assert job.job_name == "cloud-init-integration-noble-ec2-generic"
@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+
+from cpc_jank_db.pipeline import Pipeline, Stage
+
+TIMEOUT_SECONDS = 10
+
+
+def _run(pipeline: Pipeline, items, on_error=None) -> list:
+    """Run the pipeline in a thread, failing the test instead of hanging it if the run never returns."""
+    outcome = {}
+
+    def run():
+        outcome["results"] = pipeline.run(items, on_error=on_error)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT_SECONDS)
+    assert not thread.is_alive(), "Pipeline.run did not return"
+    return outcome["results"]
+
+
+def _get_stats(pipeline: Pipeline) -> dict:
+    return {stats.name: stats for stats in pipeline.get_stats()}
+
+
+def test_items_pass_through_every_stage():
+    pipeline = Pipeline(
+        [Stage("double", lambda x: x * 2, workers=3), Stage("increment", lambda x: x + 1, workers=2)], queue_size=2
+    )
+    assert sorted(_run(pipeline, range(100))) == [x * 2 + 1 for x in range(100)]
+    stats = _get_stats(pipeline)
+    assert stats["double"].processed == 100
+    assert stats["increment"].processed == 100
+    assert stats["increment"].wall_seconds > 0
+
+
+def test_run_without_items_returns_no_results():
+    pipeline = Pipeline([Stage("first", lambda x: x, workers=2), Stage("second", lambda x: x, workers=3)])
+    assert _run(pipeline, []) == []
+
+
+def test_failed_items_are_dropped_and_reported_with_their_input_item():
+    def parse(x):
+        if x % 10 == 0:
+            raise ValueError(f"bad item {x}")
+        return x
+
+    errors = []
+    pipeline = Pipeline([Stage("fetch", lambda x: x * 2), Stage("parse", parse, workers=2)])
+    results = _run(pipeline, range(20), on_error=lambda item, stage, e: errors.append((item, stage, str(e))))
+    assert sorted(results) == [x * 2 for x in range(20) if x % 5 != 0]
+    assert sorted(errors) == [(x, "parse", f"bad item {x * 2}") for x in range(0, 20, 5)]
+    stats = _get_stats(pipeline)
+    assert stats["parse"].failed == 4
+    assert stats["parse"].processed == 16
+
+
+def test_run_returns_when_on_error_raises():
+    def on_error(item, stage, e):
+        raise RuntimeError("reporting failed")
+
+    def fail(x):
+        raise ValueError("bad item")
+
+    pipeline = Pipeline([Stage("fetch", lambda x: x, workers=2), Stage("parse", fail, workers=2)], queue_size=1)
+    assert _run(pipeline, range(10), on_error=on_error) == []
+    stats = _get_stats(pipeline)
+    assert stats["parse"].failed == 10
+    assert stats["parse"].unreported_failures == 10
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_next_stage_is_shut_down_when_a_worker_dies():
+    class WorkerKilled(BaseException):
+        pass
+
+    def kill_worker(x):
+        raise WorkerKilled()
+
+    # the only worker of the first stage dies on the first item, which must still shut down the second stage
+    pipeline = Pipeline([Stage("fetch", kill_worker), Stage("parse", lambda x: x, workers=3)])
+    assert _run(pipeline, [1]) == []
+
+
+def test_items_are_consumed_lazily_through_bounded_queues():
+    release = threading.Event()
+    pulled = []
+
+    def items():
+        for x in range(100):
+            pulled.append(x)
+            yield x
+
+    def persist(x):
+        release.wait(TIMEOUT_SECONDS)
+        return x
+
+    pipeline = Pipeline([Stage("fetch", lambda x: x), Stage("persist", persist)], queue_size=2)
+    thread = threading.Thread(target=pipeline.run, args=(items(),), daemon=True)
+    thread.start()
+    # wait for the pipeline to back up behind the blocked last stage
+    for _ in range(100):
+        if len(pulled) > 5:
+            break
+        time.sleep(0.01)
+    time.sleep(0.1)
+    # two queues of two items, one item in each stage and one item waiting to be put in the first queue
+    assert len(pulled) <= 7
+    release.set()
+    thread.join(TIMEOUT_SECONDS)
+    assert not thread.is_alive()
+    assert len(pulled) == 100
+
+
+def test_invalid_pipelines_are_rejected():
+    with pytest.raises(ValueError):
+        Pipeline([])
+    with pytest.raises(ValueError):
+        Stage("fetch", lambda x: x, workers=0)
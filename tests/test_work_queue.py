@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+
+def _expire_lease(db, item_id: str):
+    db.work_queue_collection.update_one(
+        {"_id": item_id}, {"$set": {"leaseExpiresAt": datetime.now() - timedelta(seconds=1)}}
+    )
+
+
+def test_enqueue_work_items_skips_items_already_queued(mongo):
+    items = [{"jobName": "some-job", "buildNumber": 1}, {"jobName": "some-job", "buildNumber": 2}]
+    assert mongo.enqueue_work_items(items) == 2
+    assert mongo.enqueue_work_items(items) == 0
+    assert mongo.count_open_work_items("some-job") == 2
+
+
+def test_claim_work_item_claims_by_priority(mongo):
+    mongo.enqueue_work_items([
+        {"jobName": "some-job", "buildNumber": 1, "priority": "b"},
+        {"jobName": "some-job", "buildNumber": 2, "priority": "a"},
+    ])
+    item = mongo.claim_work_item("worker-1", lease_seconds=60)
+    assert item["buildNumber"] == 2
+    assert item["status"] == "leased"
+    assert item["leaseOwner"] == "worker-1"
+    assert item["attempts"] == 1
+    assert mongo.claim_work_item("worker-2", lease_seconds=60)["buildNumber"] == 1
+    assert mongo.claim_work_item("worker-3", lease_seconds=60) is None
+
+
+def test_leased_item_is_not_claimed_until_its_lease_expires(mongo):
+    mongo.enqueue_work_items([{"jobName": "some-job", "buildNumber": 1}])
+    item = mongo.claim_work_item("worker-1", lease_seconds=60)
+    assert mongo.claim_work_item("worker-2", lease_seconds=60) is None
+
+    _expire_lease(mongo, item["_id"])
+    item = mongo.claim_work_item("worker-2", lease_seconds=60)
+    assert item["leaseOwner"] == "worker-2"
+    assert item["attempts"] == 2
+
+    # the worker that lost the lease can no longer renew, complete or fail the item
+    assert not mongo.renew_work_item_lease(item["_id"], "worker-1", lease_seconds=60)
+    assert not mongo.complete_work_item(item["_id"], "worker-1")
+    assert not mongo.fail_work_item(item["_id"], "worker-1", RuntimeError("too late"))
+    assert mongo.complete_work_item(item["_id"], "worker-2")
+    assert mongo.work_queue_collection.find_one({"_id": item["_id"]})["status"] == "done"
+
+
+def test_renewed_lease_is_not_claimed(mongo):
+    mongo.enqueue_work_items([{"jobName": "some-job", "buildNumber": 1}])
+    item = mongo.claim_work_item("worker-1", lease_seconds=60)
+    _expire_lease(mongo, item["_id"])
+    assert mongo.renew_work_item_lease(item["_id"], "worker-1", lease_seconds=60)
+    assert mongo.claim_work_item("worker-2", lease_seconds=60) is None
+
+
+def test_failed_item_is_retried_until_it_used_up_its_attempts(mongo):
+    mongo.enqueue_work_items([{"jobName": "some-job", "buildNumber": 1}])
+    for _ in range(2):
+        item = mongo.claim_work_item("worker-1", lease_seconds=60)
+        assert mongo.fail_work_item(item["_id"], "worker-1", RuntimeError("boom"), max_attempts=2)
+    item = mongo.work_queue_collection.find_one({"_id": item["_id"]})
+    assert item["status"] == "failed"
+    assert item["lastError"] == "RuntimeError: boom"
+    assert mongo.claim_work_item("worker-1", lease_seconds=60, max_attempts=2) is None
+
+
+def test_item_whose_lease_expired_on_its_last_attempt_is_failed(mongo):
+    mongo.enqueue_work_items([{"jobName": "some-job", "buildNumber": 1}])
+    for _ in range(2):
+        item = mongo.claim_work_item("worker-1", lease_seconds=60, max_attempts=2)
+        _expire_lease(mongo, item["_id"])
+    assert mongo.claim_work_item("worker-2", lease_seconds=60, max_attempts=2) is None
+    item = mongo.work_queue_collection.find_one({"_id": item["_id"]})
+    assert item["status"] == "failed"
+    assert item["leaseOwner"] is None
+    assert mongo.count_open_work_items() == 0